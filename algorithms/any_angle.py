@@ -0,0 +1,374 @@
+from heapq import heappush, heappop
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from attr import attrs, attrib
+
+from algorithms.astar import AStar, AStarHeuristics, SQRT_2, _xy_heuristic
+from algorithms.costmap import Costmap, EasyGIFWriter, Location, generate_random_costmap
+from algorithms.utils import Items, NEIGHBOR_OFFSETS
+
+# Targets checked per vectorized line-of-sight batch while shortcutting
+_SHORTCUT_CHUNK = 64
+
+
+def _line_coordinates(x0: int, y0: int, dx: 'Array[N]', dy: 'Array[N]', t: 'Array[N]', n: 'Array[N]') -> Tuple['Array[N]', 'Array[N]']:
+    """
+    Cell t of the Bresenham lines from (x0, y0) by (dx, dy), which are n = max(|dx|, |dy|)
+    steps long. The major axis advances one cell per step and the minor one rounds half up.
+    """
+    denominator = 2 * np.maximum(n, 1)
+    xs = x0 + np.sign(dx) * ((2 * t * np.abs(dx) + n) // denominator)
+    ys = y0 + np.sign(dy) * ((2 * t * np.abs(dy) + n) // denominator)
+    return xs, ys
+
+
+def line_cells(a: Location, b: Location) -> Tuple['Array[N]', 'Array[N]']:
+    """
+    Cells of the Bresenham line from a to b, both included. Consecutive cells are 8-connected
+    neighbors, so a clear line is also a valid grid walk.
+    :return: x and y coordinate arrays
+    """
+    dx = b.x - a.x
+    dy = b.y - a.y
+    n = max(abs(dx), abs(dy))
+    return _line_coordinates(a.x, a.y, dx, dy, np.arange(n + 1), n)
+
+
+def _line_clear(passable: 'Array[M,N]', x0: int, y0: int, x1: int, y1: int) -> bool:
+    dx = x1 - x0
+    dy = y1 - y0
+    n = max(abs(dx), abs(dy))
+    if n <= 1:
+        return bool(passable[y1, x1])
+    xs, ys = _line_coordinates(x0, y0, dx, dy, np.arange(n + 1), n)
+    return bool(passable[ys, xs].all())
+
+
+def line_of_sight(passable: 'Array[M,N]', a: Location, b: Location) -> bool:
+    """
+    Whether every cell of the Bresenham line from a to b is passable
+    :param passable: boolean grid, e.g. costmap.get_data() != Items.OBSTACLE
+    """
+    return _line_clear(passable, a.x, a.y, b.x, b.y)
+
+
+def visible_from(passable: 'Array[M,N]', origin: Location, xs: 'Array[K]', ys: 'Array[K]') -> 'Array[K]':
+    """
+    Line of sight from origin to many targets at once: all the lines are laid out in one
+    flat array of cells and checked with a single gather and reduction
+    :return: boolean array, one entry per target
+    """
+    dx = np.asarray(xs, dtype=np.int64) - origin.x
+    dy = np.asarray(ys, dtype=np.int64) - origin.y
+    n = np.maximum(np.abs(dx), np.abs(dy))
+    lengths = n + 1
+    starts = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    line = np.repeat(np.arange(len(lengths)), lengths)
+    t = np.arange(lengths.sum()) - starts[line]
+    cell_xs, cell_ys = _line_coordinates(origin.x, origin.y, dx[line], dy[line], t, n[line])
+    blocked = ~passable[cell_ys, cell_xs]
+    return np.add.reduceat(blocked, starts) == 0
+
+
+def path_length(start: Location, path: Sequence[Location]) -> float:
+    """
+    Euclidean length of a path, whose consecutive points need not be neighbors
+    """
+    xs = np.array([start.x] + [loc.x for loc in path], dtype=np.float64)
+    ys = np.array([start.y] + [loc.y for loc in path], dtype=np.float64)
+    return float(np.hypot(np.diff(xs), np.diff(ys)).sum())
+
+
+def remove_collinear(start: Location, path: Sequence[Location]) -> List[Location]:
+    """
+    Drop the points where a path goes straight on, keeping the turns and the goal; the
+    length of the result is the number of waypoints a controller has to follow
+    """
+    waypoints = []
+    previous = start
+    for i, loc in enumerate(path):
+        if i + 1 < len(path):
+            following = path[i + 1]
+            ax, ay = loc.x - previous.x, loc.y - previous.y
+            bx, by = following.x - loc.x, following.y - loc.y
+            if ax * by == ay * bx and ax * bx + ay * by > 0:
+                continue
+        waypoints.append(loc)
+        previous = loc
+    return waypoints
+
+
+def expand_path(start: Location, waypoints: Sequence[Location]) -> List[Location]:
+    """
+    Turn a waypoint path back into a cell-by-cell path along the Bresenham lines
+    :return: path from (excluding) start to (including) the last waypoint
+    """
+    path = []
+    previous = start
+    for waypoint in waypoints:
+        xs, ys = line_cells(previous, waypoint)
+        path.extend(Location(x, y) for x, y in zip(xs[1:].tolist(), ys[1:].tolist()))
+        previous = waypoint
+    return path
+
+
+def shortcut_path(costmap: Costmap, path: Sequence[Location], start: Optional[Location] = None) -> List[Location]:
+    """
+    Greedy string pulling: from each waypoint, jump to the last point of the path before
+    the first one that is out of sight. Visibility to the upcoming points is checked in
+    vectorized batches with visible_from.
+    :param path: path from (excluding) start to (including) the goal, as the planners return it
+    :param start: start of the path, defaults to the costmap robot
+    :return: waypoints from (excluding) start to (including) the goal, each in line of sight
+        of the previous one
+    """
+    start = start or costmap.robot
+    points = [start] + list(path)
+    if len(points) < 3:
+        return list(path)
+    passable = costmap.get_data() != Items.OBSTACLE
+    xs = np.array([loc.x for loc in points])
+    ys = np.array([loc.y for loc in points])
+    last = len(points) - 1
+
+    waypoints = []
+    anchor = 0
+    while anchor < last:
+        farthest = anchor + 1
+        low = anchor + 2
+        while low <= last:
+            high = min(low + _SHORTCUT_CHUNK, last + 1)
+            hidden = np.flatnonzero(~visible_from(passable, points[anchor], xs[low:high], ys[low:high]))
+            if hidden.size:
+                farthest = low + int(hidden[0]) - 1
+                break
+            farthest = high - 1
+            low = high
+        waypoints.append(points[farthest])
+        anchor = farthest
+    return waypoints
+
+
+@attrs(auto_attribs=True)
+class ThetaStar(object):
+    """
+    Any-angle A* (Theta*, Nash et al. 2007). A node reached from a cell whose own parent
+    can see it takes that parent as its parent, so paths run along straight lines in any
+    direction instead of the 8 grid directions. Costs are Euclidean lengths and lines of
+    sight are Bresenham lines, which may pass diagonally between two obstacles just like
+    the grid planners' diagonal moves.
+
+    lazy=True (Lazy Theta*, Nash et al. 2010) assumes line of sight when a node is
+    generated and checks it once when the node is expanded, falling back to the best
+    expanded neighbor; this needs far fewer checks for nearly the same paths.
+
+    Returned paths list only the waypoints (from excluding the start to including the
+    goal); expand_path converts them back to cells. line_checks counts the line-of-sight
+    checks and nodes_expanded the expanded nodes.
+    """
+    _costmap: Costmap
+    _heuristic: Callable[[Location, Location], float] = AStarHeuristics.euclidean
+    _lazy: bool = True
+    _start: Optional[Location] = None
+    _goal: Optional[Location] = None
+    _visualize: bool = True
+
+    _heap: List[Tuple[float, int]] = attrib(init=False, factory=list)
+
+    def __attrs_post_init__(self):
+        costmap = self._costmap
+        start = self._start or costmap.robot
+        goal = self._goal or costmap.goal
+        self._rows = costmap.rows
+        self._cols = costmap.cols
+        data = costmap.get_data()
+        self._flat = data.reshape(-1)
+        self._passable = data != Items.OBSTACLE
+        self._passable_flat = self._passable.reshape(-1)
+        # Expanded nodes and obstacles
+        self._closed = ~self._passable_flat
+        self._g = np.full(data.size, np.inf)
+        self._parent = np.full(data.size, -1, dtype=np.int64)
+        self._h = _xy_heuristic(self._heuristic, goal)
+
+        self._robot_index = costmap.robot.y * self._cols + costmap.robot.x
+        self._start_index = start.y * self._cols + start.x
+        self._goal_index = goal.y * self._cols + goal.x
+        self.nodes_expanded = 0
+        self.line_checks = 0
+
+        self._closed[self._start_index] = False
+        self._g[self._start_index] = 0
+        self._parent[self._start_index] = self._start_index
+        heappush(self._heap, (self._h(start.x, start.y), self._start_index))
+
+    def _line_of_sight(self, a: int, b: int) -> bool:
+        self.line_checks += 1
+        y0, x0 = divmod(a, self._cols)
+        y1, x1 = divmod(b, self._cols)
+        return _line_clear(self._passable, x0, y0, x1, y1)
+
+    def _distance(self, a: int, b: int) -> float:
+        y0, x0 = divmod(a, self._cols)
+        y1, x1 = divmod(b, self._cols)
+        return ((x1 - x0) ** 2 + (y1 - y0) ** 2) ** 0.5
+
+    def _set_vertex(self, node: int, x: int, y: int) -> None:
+        """
+        Lazy Theta*: if the assumed parent cannot see node, re-parent it to the best expanded neighbor
+        """
+        parent = int(self._parent[node])
+        if parent == node or self._line_of_sight(parent, node):
+            return
+        best_cost = np.inf
+        best_parent = parent
+        for dx, dy in NEIGHBOR_OFFSETS:
+            nx = x + dx
+            ny = y + dy
+            if nx < 0 or ny < 0 or nx >= self._cols or ny >= self._rows:
+                continue
+            n = ny * self._cols + nx
+            if self._closed[n] and self._passable_flat[n]:
+                cost = self._g[n] + (SQRT_2 if dx and dy else 1)
+                if cost < best_cost:
+                    best_cost = cost
+                    best_parent = n
+        self._g[node] = best_cost
+        self._parent[node] = best_parent
+
+    def _mark(self, index: int, value: int) -> None:
+        """
+        Visualization write; goes through set_value only when someone listens to the costmap
+        """
+        if self._costmap.has_listeners():
+            self._costmap.set_value(Location(index % self._cols, index // self._cols), value)
+        else:
+            self._flat[index] = value
+
+    def step(self) -> Optional[Sequence[Location]]:
+        heap = self._heap
+        closed = self._closed
+        g = self._g
+        parents = self._parent
+        rows = self._rows
+        cols = self._cols
+
+        while heap:
+            _, current = heappop(heap)
+            if closed[current]:
+                # Stale duplicate of an already expanded node
+                continue
+            closed[current] = True
+            y, x = divmod(current, cols)
+            if self._lazy:
+                self._set_vertex(current, x, y)
+            if current == self._goal_index:
+                return self._build_path()
+
+            self.nodes_expanded += 1
+            if self._visualize and current != self._robot_index:
+                self._mark(current, Items.VISITED)
+
+            parent = int(parents[current])
+            parent_cost = float(g[parent])
+            current_cost = float(g[current])
+            for dx, dy in NEIGHBOR_OFFSETS:
+                nx = x + dx
+                ny = y + dy
+                if nx < 0 or ny < 0 or nx >= cols or ny >= rows:
+                    continue
+                n = ny * cols + nx
+                if closed[n]:
+                    continue
+
+                if self._lazy or self._line_of_sight(parent, n):
+                    candidate = parent
+                    new_cost = parent_cost + self._distance(parent, n)
+                else:
+                    candidate = current
+                    new_cost = current_cost + (SQRT_2 if dx and dy else 1)
+                if new_cost < g[n]:
+                    g[n] = new_cost
+                    parents[n] = candidate
+                    heappush(heap, (new_cost + self._h(nx, ny), n))
+
+                    # Mark costmap value for visualization
+                    if self._visualize and n != self._goal_index:
+                        self._mark(n, Items.CURRENT)
+            return None
+
+        raise Exception("Path does not exist!")
+
+    def solve(self, start: Optional[Location] = None, goal: Optional[Location] = None) -> Sequence[Location]:
+        """
+        Headless search that leaves the costmap untouched
+        :param start: start location, defaults to the costmap robot
+        :param goal: goal location, defaults to the costmap goal
+        :return: waypoints from (excluding) start to (including) goal
+        """
+        search = ThetaStar(self._costmap, self._heuristic, self._lazy, start=start, goal=goal, visualize=False)
+        while True:
+            path = search.step()
+            if path is not None:
+                return path
+
+    def _build_path(self) -> Sequence[Location]:
+        cols = self._cols
+        path = []
+        current = self._goal_index
+        while current != self._start_index:
+            path.append(Location(current % cols, current // cols))
+            current = int(self._parent[current])
+        path.reverse()
+
+        if self._visualize:
+            start = Location(self._start_index % cols, self._start_index // cols)
+            for loc in expand_path(start, path)[:-1]:
+                self._mark(loc.y * cols + loc.x, Items.PARENT)
+        return path
+
+
+@attrs(auto_attribs=True)
+class Shortcut(object):
+    """
+    Wraps a planner and passes its path through shortcut_path; otherwise behaves like the
+    wrapped planner (step(), solve() and its attributes)
+    """
+    _costmap: Costmap
+    _planner: Any
+
+    def step(self) -> Optional[Sequence[Location]]:
+        path = self._planner.step()
+        if path is None:
+            return None
+        return shortcut_path(self._costmap, path)
+
+    def solve(self, start: Optional[Location] = None, goal: Optional[Location] = None) -> Sequence[Location]:
+        return shortcut_path(self._costmap, self._planner.solve(start, goal), start)
+
+    def __getattr__(self, name: str) -> Any:
+        # Own fields are looked up normally; anything reaching here without them set is missing
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._planner, name)
+
+
+if __name__ == "__main__":
+    costmap = generate_random_costmap(40, 60, 0.2)
+
+    grid_path = AStar(costmap, AStarHeuristics.octile).solve()
+    smoothed = shortcut_path(costmap, grid_path)
+    any_angle_path = ThetaStar(costmap).solve()
+    for name, path in (("AStar", grid_path), ("AStar + shortcut", smoothed), ("Lazy Theta*", any_angle_path)):
+        print(f"{name:>16}: {len(remove_collinear(costmap.robot, path)):3d} waypoints, "
+              f"length {path_length(costmap.robot, path):.2f}")
+
+    with EasyGIFWriter("theta_star.gif", scale_factor=10) as gif_writer:
+        search = ThetaStar(costmap)
+        while True:
+            path = search.step()
+            gif_writer.write(costmap.draw(show=False))
+            if path is not None:
+                break
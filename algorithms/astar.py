@@ -1,10 +1,24 @@
-from queue import PriorityQueue
-from typing import Dict, Tuple, Callable, Optional, Sequence
+from collections import OrderedDict
+from heapq import heappush, heappop
+from time import perf_counter
+from typing import Dict, Tuple, Callable, Optional, Sequence, List, Set, Iterator
 
+import numpy as np
 from attr import attrs, attrib
 
-from algorithms.costmap import Costmap, generate_random_costmap, EasyGIFWriter, generate_vertical_wall_costmap, Location
-from algorithms.utils import Items
+from algorithms.costmap import Costmap, generate_random_costmap, EasyGIFWriter, generate_vertical_wall_costmap, Location, \
+    trace_index_path
+from algorithms.open_list import OpenList, OpenListStats
+from algorithms.path import trace_packed_path
+from algorithms.stats import SearchStats, StepHook
+from algorithms.utils import Items, NEIGHBOR_OFFSETS, NEIGHBOR_MASK_OFFSETS
+
+# Cost of a penalized (checkerboard) move, computed exactly as _compute_movement_cost does
+_PENALIZED_MOVEMENT_COST = 1 + 0.001 * 1
+
+SQRT_2 = 2 ** 0.5
+
+INF = float("inf")
 
 
 def _compute_movement_cost(from_loc: Location, to_loc: Location) -> float:
@@ -45,28 +59,349 @@ class AStarHeuristics:
         dy = abs(diff.y)
         return dx + dy - min(dx, dy)
 
+    @staticmethod
+    def octile(a: Location, b: Location):
+        # Exact distance on an open grid where diagonal moves cost sqrt(2)
+        diff = a - b
+        dx = abs(diff.x)
+        dy = abs(diff.y)
+        return dx + dy + (SQRT_2 - 2) * min(dx, dy)
+
+
+class AStarBackends:
+    DICT = "dict"
+    ARRAY = "array"
+
+
+def _xy_heuristic(heuristic: Callable[[Location, Location], float], goal: Location) -> Callable[[int, int], float]:
+    """
+    Specialize a Location-based heuristic to plain integer coordinates for a fixed goal.
+    The built-in heuristics are inlined so no Location is allocated per generated node
+    """
+    gx, gy = goal.x, goal.y
+    if heuristic is AStarHeuristics.manhattan:
+        return lambda x, y: abs(x - gx) + abs(y - gy)
+    if heuristic is AStarHeuristics.euclidean:
+        return lambda x, y: ((x - gx) ** 2 + (y - gy) ** 2) ** 0.5
+    if heuristic is AStarHeuristics.chebyshev:
+        def chebyshev(x, y):
+            dx = abs(x - gx)
+            dy = abs(y - gy)
+            return dx + dy - min(dx, dy)
+        return chebyshev
+    if heuristic is AStarHeuristics.octile:
+        def octile(x, y):
+            dx = abs(x - gx)
+            dy = abs(y - gy)
+            return dx + dy + (SQRT_2 - 2) * min(dx, dy)
+        return octile
+    return lambda x, y: heuristic(Location(x, y), goal)
+
+
+def evaluate_heuristic(
+        heuristic: Callable[[Location, Location], float],
+        xs: 'Array[...]',
+        ys: 'Array[...]',
+        goal: Location
+) -> 'Array[...]':
+    """
+    Evaluate a heuristic for whole arrays of (broadcastable) x and y coordinates at once.
+    The built-in heuristics run as NumPy expressions that give the same values as the
+    scalar versions; any other callable is called once per coordinate pair.
+    """
+    xs, ys = np.broadcast_arrays(np.asarray(xs), np.asarray(ys))
+    dx = np.abs(xs - goal.x)
+    dy = np.abs(ys - goal.y)
+    if heuristic is AStarHeuristics.manhattan:
+        return (dx + dy).astype(np.float64)
+    if heuristic is AStarHeuristics.euclidean:
+        return ((dx ** 2 + dy ** 2) ** 0.5).astype(np.float64)
+    if heuristic is AStarHeuristics.chebyshev:
+        return (dx + dy - np.minimum(dx, dy)).astype(np.float64)
+    if heuristic is AStarHeuristics.octile:
+        return dx + dy + (SQRT_2 - 2) * np.minimum(dx, dy)
+    values = [heuristic(Location(int(x), int(y)), goal) for x, y in zip(xs.reshape(-1), ys.reshape(-1))]
+    return np.array(values, dtype=np.float64).reshape(xs.shape)
+
+
+@attrs(auto_attribs=True)
+class HeuristicCache(object):
+    """
+    LRU cache of full heuristic grids, one per (heuristic, goal, map shape). Planners given
+    a cache look the heuristic up with one array index instead of computing it per
+    generated node, so repeated queries to the same goal share the work. Grids cost 8
+    bytes per cell each.
+    """
+    _max_grids: int = 8
+
+    hits: int = attrib(init=False, default=0)
+    misses: int = attrib(init=False, default=0)
+    _grids: 'OrderedDict[Tuple, Array[M,N]]' = attrib(init=False, factory=OrderedDict)
+
+    def grid(self, heuristic: Callable[[Location, Location], float], goal: Location, rows: int, cols: int) -> 'Array[M,N]':
+        """
+        :return: read-only float64 grid of heuristic(Location(x, y), goal) indexed [y, x]
+        """
+        key = (heuristic, goal, rows, cols)
+        grid = self._grids.get(key)
+        if grid is not None:
+            self.hits += 1
+            self._grids.move_to_end(key)
+            return grid
+
+        self.misses += 1
+        grid = evaluate_heuristic(heuristic, np.arange(cols)[None, :], np.arange(rows)[:, None], goal)
+        grid.flags.writeable = False
+        self._grids[key] = grid
+        if len(self._grids) > self._max_grids:
+            self._grids.popitem(last=False)
+        return grid
+
+
+@attrs(auto_attribs=True)
+class ArrayAStar(object):
+    """
+    A* that keeps its g-costs, parents and closed flags in flat NumPy arrays indexed by
+    y * cols + x and orders its heap on integer node keys. Produces the same paths as the
+    dict-based search without allocating a Location per generated node.
+
+    With visualize=False the costmap is only read: obstacles are the only blocked cells
+    and all search state lives in this object's scratch arrays, so one costmap can serve
+    any number of searches, including concurrent ones.
+    """
+    _costmap: Costmap
+    _heuristic: Callable[[Location, Location], float] = AStarHeuristics.euclidean
+    _start: Optional[Location] = None
+    _goal: Optional[Location] = None
+    _visualize: bool = True
+    _weight: float = 1.0
+    _heuristic_cache: Optional[HeuristicCache] = None
+    # Return paths as PackedPath instead of lists of Locations
+    _packed: bool = False
+
+    _heap: List[Tuple[float, int]] = attrib(init=False, factory=list)
+    _g: 'Array[N]' = attrib(init=False)
+    _parent: 'Array[N]' = attrib(init=False)
+    _closed: 'Array[N]' = attrib(init=False)
+
+    def __attrs_post_init__(self):
+        costmap = self._costmap
+        start = self._start or costmap.robot
+        goal = self._goal or costmap.goal
+        self._rows = costmap.rows
+        self._cols = costmap.cols
+        data = costmap.get_data()
+        self._flat = data.reshape(-1)
+        masks = costmap.get_neighbor_index()
+        # Passable-neighbor bitmasks spare the bounds checks when the costmap has an index
+        self._masks = masks.reshape(-1) if masks is not None else None
+        self._g = np.full(data.size, np.inf)
+        self._parent = np.full(data.size, -1, dtype=np.int64)
+        if self._visualize:
+            # Same cells get_open_neighbors refuses to return
+            self._closed = np.isin(data, (Items.OBSTACLE, Items.ROBOT, Items.VISITED)).reshape(-1)
+        else:
+            self._closed = (data == Items.OBSTACLE).reshape(-1)
+        costs = costmap.get_cost_layer()
+        # Terrain costs of entering each cell; impassable (inf) cells start closed
+        self._costs = costs.reshape(-1) if costs is not None else None
+        if costs is not None:
+            self._closed |= ~np.isfinite(self._costs)
+
+        self._robot_index = self._index(costmap.robot)
+        self._start_index = self._index(start)
+        self._goal_index = self._index(goal)
+        self._h = _xy_heuristic(self._heuristic, goal)
+        if self._heuristic_cache is not None:
+            grid = self._heuristic_cache.grid(self._heuristic, goal, self._rows, self._cols)
+            if self._weight != 1:
+                grid = grid * self._weight
+            self._h_table = grid.reshape(-1)
+        else:
+            self._h_table = None
+        if self._weight != 1:
+            h = self._h
+            weight = self._weight
+            self._h = lambda x, y: weight * h(x, y)
+        self.nodes_expanded = 0
+        self.open_list_stats = OpenListStats(pushes=1)
+
+        self._closed[self._start_index] = False
+        self._g[self._start_index] = 0
+        heappush(self._heap, (0, self._key(start.x, start.y)))
+
+    def _index(self, loc: Location) -> int:
+        return loc.y * self._cols + loc.x
+
+    def _key(self, x: int, y: int) -> int:
+        # Heap keys sort like Location (x first, then y) so ties break exactly as in AStar
+        return x * self._rows + y
+
+    def _mark(self, index: int, value: int) -> None:
+        """
+        Visualization write; goes through set_value only when someone listens to the costmap
+        """
+        if self._costmap.has_listeners():
+            self._costmap.set_value(Location(index % self._cols, index // self._cols), value)
+        else:
+            self._flat[index] = value
+
+    def step(self) -> Optional[Sequence[Location]]:
+        heap = self._heap
+        closed = self._closed
+        g = self._g
+        rows = self._rows
+        cols = self._cols
+        visualize = self._visualize
+        masks = self._masks
+        costs = self._costs
+        h_table = self._h_table
+        stats = self.open_list_stats
+
+        while heap:
+            _, key = heappop(heap)
+            x, y = divmod(key, rows)
+            current = y * cols + x
+            if current == self._goal_index:
+                stats.pops += 1
+                return self._build_path(current)
+            if closed[current]:
+                # Stale duplicate of an already expanded node
+                stats.stale_pops += 1
+                continue
+            stats.pops += 1
+
+            # Mark position as visited (closed list)
+            closed[current] = True
+            self.nodes_expanded += 1
+            if visualize and current != self._robot_index:
+                self._mark(current, Items.VISITED)
+
+            current_cost = float(g[current])
+            odd = (x + y) % 2
+            offsets = NEIGHBOR_OFFSETS if masks is None else NEIGHBOR_MASK_OFFSETS[masks[current]]
+            for dx, dy in offsets:
+                nx = x + dx
+                ny = y + dy
+                if masks is None and (nx < 0 or ny < 0 or nx >= cols or ny >= rows):
+                    continue
+                n = ny * cols + nx
+                if closed[n]:
+                    continue
+
+                if costs is None:
+                    penalized = dy if odd else dx
+                    new_cost = current_cost + (_PENALIZED_MOVEMENT_COST if penalized else 1)
+                else:
+                    new_cost = current_cost + costs[n] * (SQRT_2 if dx and dy else 1)
+                if new_cost < g[n]:
+                    # Parent first: a cell with a finite g always has a parent to trace
+                    self._parent[n] = current
+                    g[n] = new_cost
+                    if h_table is None:
+                        heappush(heap, (new_cost + self._h(nx, ny), nx * rows + ny))
+                    else:
+                        # item() yields a plain float, which the heap compares faster than a NumPy scalar
+                        heappush(heap, (new_cost + h_table.item(n), nx * rows + ny))
+                    stats.pushes += 1
+
+                    # Mark costmap value for visualization
+                    if visualize and n != self._goal_index:
+                        self._mark(n, Items.CURRENT)
+            return None
+
+        raise Exception("Path does not exist!")
+
+    def solve(self) -> Sequence[Location]:
+        """
+        Run the search to completion and return the path
+        """
+        while True:
+            path = self.step()
+            if path is not None:
+                return path
+
+    def partial_path(self) -> Optional[Sequence[Location]]:
+        """
+        Best effort for a search stopped early: the path to the reached cell that the
+        heuristic puts closest to the goal
+        :return: path from (excluding) the start, None if nothing but the start was reached
+        """
+        reached = np.flatnonzero(np.isfinite(self._g))
+        ys, xs = np.divmod(reached, self._cols)
+        goal = Location(self._goal_index % self._cols, self._goal_index // self._cols)
+        best = int(reached[np.argmin(evaluate_heuristic(self._heuristic, xs, ys, goal))])
+        if best == self._start_index:
+            return None
+        return trace_index_path(self._parent, self._start_index, best, self._cols)
+
+    def _build_path(self, goal: int) -> Sequence[Location]:
+        trace = trace_packed_path if self._packed else trace_index_path
+        path = trace(self._parent, self._start_index, goal, self._cols)
+        if self._visualize:
+            for loc in path[:-1]:
+                self._mark(self._index(loc), Items.PARENT)
+        return path
+
 
 @attrs(auto_attribs=True)
 class AStar(object):
     _costmap: Costmap
     _heuristic: Callable[[Location, Location], float] = AStarHeuristics.euclidean
+    _backend: str = AStarBackends.DICT
+    # Weighted A*: priority g + weight * h; with an admissible heuristic the path costs at
+    # most weight times the optimum
+    _weight: float = 1.0
+    # Optional instrumentation (dict backend); both are skipped entirely when None
+    stats: Optional[SearchStats] = None
+    _on_step: Optional[StepHook] = None
+    # Optional shared per-goal heuristic grids, looked up instead of calling the heuristic
+    _heuristic_cache: Optional[HeuristicCache] = None
 
     _parent_map: Dict[Tuple, Tuple] = attrib(init=False, factory=dict)
-    _queue: PriorityQueue = attrib(init=False, factory=lambda: PriorityQueue())
+    _queue: OpenList = attrib(init=False, factory=OpenList)
     _cost_so_far: Dict[Location, float] = attrib(init=False, factory=dict)
+    _engine: Optional[ArrayAStar] = attrib(init=False, default=None)
 
     def __attrs_post_init__(self):
+        if self._backend == AStarBackends.ARRAY:
+            if self.stats is not None or self._on_step is not None:
+                raise ValueError("Search stats and step hooks need the dict A* backend")
+            self._engine = ArrayAStar(
+                self._costmap, self._heuristic, weight=self._weight, heuristic_cache=self._heuristic_cache
+            )
+            return
+        if self._backend != AStarBackends.DICT:
+            raise ValueError(f"Unknown A* backend: {self._backend}")
+
+        self._costs = self._costmap.get_cost_layer()
+
         # Append robot position as the starting node
-        self._queue.put((0, self._costmap.robot))
+        self._queue.push(self._costmap.robot, 0)
         self._goal = self._costmap.goal
         self._cost_so_far[self._costmap.robot] = 0
+        if self._heuristic_cache is not None:
+            grid = self._heuristic_cache.grid(self._heuristic, self._goal, self._costmap.rows, self._costmap.cols)
+            self._h = lambda loc: grid.item(loc.y, loc.x)
+        else:
+            heuristic = self._heuristic
+            goal = self._goal
+            self._h = lambda loc: heuristic(loc, goal)
 
     def step(self) -> Optional[Sequence[Location]]:
+        if self._engine is not None:
+            return self._engine.step()
+
+        stats = self.stats
+        if stats is not None:
+            step_start = perf_counter()
 
-        if self._queue.qsize() == 0:
+        if len(self._queue) == 0:
             raise Exception("Path does not exist!")
 
-        current_pos: Location = self._queue.get()[1]
+        current_pos: Location = self._queue.pop()
+        if stats is not None:
+            stats.queue_time += perf_counter() - step_start
         current_value = self._costmap.get_value(current_pos)
 
         if current_pos == self._goal:
@@ -79,19 +414,45 @@ class AStar(object):
                 path.append(curr)
                 curr = self._parent_map[curr]
             path.reverse()
+            if stats is not None:
+                stats.step_time += perf_counter() - step_start
             return path
 
         # Mark position as visited (closed list)
         if current_value != Items.ROBOT:
             self._costmap.set_value(current_pos, Items.VISITED)
 
+        self._expand(current_pos, stats)
+        if stats is not None:
+            stats.step_time += perf_counter() - step_start
+
+        if self._on_step is not None:
+            self._on_step(current_pos, stats)
+        return None
+
+    def _expand(self, current_pos: Location, stats: Optional[SearchStats] = None) -> None:
         # Compute cost to move to new neighbor.
         # If the neighbor is newly visited or the cost is lower than the
         # previous visit, add the neighbor to the queue
+        if stats is not None:
+            neighbor_start = perf_counter()
         neighbors = self._costmap.get_open_neighbors(current_pos)
+        if stats is not None:
+            stats.neighbor_time += perf_counter() - neighbor_start
+        costs = self._costs
+        x = current_pos.x
+        y = current_pos.y
         for n in neighbors:
             # Cost to move from current position to neighbor
-            dist_cost = _compute_movement_cost(current_pos, n)
+            if costs is None:
+                dist_cost = _compute_movement_cost(current_pos, n)
+            else:
+                # Terrain cost of entering n, inlined; diagonal moves are sqrt(2) long
+                dist_cost = costs.item(n.y, n.x)
+                if dist_cost == INF:
+                    continue
+                if n.x != x and n.y != y:
+                    dist_cost *= SQRT_2
 
             # Update base cost with cost to move to neighbor
             new_cost = self._cost_so_far[current_pos] + dist_cost
@@ -99,12 +460,22 @@ class AStar(object):
             # If there is no cost for this neighbor or the current cost is
             # lower than the cost during a previous visit, update the queue with the neighbor
             if n not in self._cost_so_far or new_cost < self._cost_so_far[n]:
+                if stats is not None:
+                    stats.nodes_generated += 1
+                    if n in self._cost_so_far:
+                        stats.nodes_requeued += 1
+                    heuristic_start = perf_counter()
                 # Save or update current cost
                 self._cost_so_far[n] = new_cost
                 # f = g + h
-                priority = new_cost + self._heuristic(n, self._costmap.goal)
+                priority = new_cost + self._weight * self._h(n)
+                if stats is not None:
+                    queue_start = perf_counter()
+                    stats.heuristic_time += queue_start - heuristic_start
                 # Add to queue
-                self._queue.put((priority, n))
+                self._queue.push(n, priority)
+                if stats is not None:
+                    stats.queue_time += perf_counter() - queue_start
                 # Save parents-to-child map so that the path can be extracted
                 self._parent_map[n] = current_pos
 
@@ -112,7 +483,195 @@ class AStar(object):
                 if self._costmap.get_value(n) != Items.GOAL:
                     self._costmap.set_value(n, Items.CURRENT)
 
-        return None
+        if stats is not None:
+            stats.nodes_expanded += 1
+            stats.open_list_peak = max(stats.open_list_peak, len(self._queue))
+
+    @property
+    def open_list_stats(self) -> OpenListStats:
+        """
+        Pushes, pops and stale (superseded) pops of this search's open list
+        """
+        if self._engine is not None:
+            return self._engine.open_list_stats
+        return self._queue.stats
+
+    def solve(
+            self,
+            start: Optional[Location] = None,
+            goal: Optional[Location] = None,
+            packed: bool = False
+    ) -> Sequence[Location]:
+        """
+        Headless search that leaves the costmap untouched
+        :param start: start location, defaults to the costmap robot
+        :param goal: goal location, defaults to the costmap goal
+        :param packed: return the path as a PackedPath
+        :return: path from (excluding) start to (including) goal
+        """
+        return ArrayAStar(
+            self._costmap, self._heuristic, start=start, goal=goal, visualize=False, weight=self._weight,
+            heuristic_cache=self._heuristic_cache, packed=packed
+        ).solve()
+
+    def solve_anytime(
+            self,
+            deadline: Optional[float] = None,
+            start: Optional[Location] = None,
+            goal: Optional[Location] = None,
+            initial_weight: float = 3.0,
+            weight_step: float = 0.5,
+            heuristic: Callable[[Location, Location], float] = AStarHeuristics.chebyshev
+    ) -> Optional[Sequence[Location]]:
+        """
+        Headless anytime search (see AnytimeAStar) on this planner's costmap. It takes its own
+        heuristic rather than this planner's: the final weight-1 path is only optimal with an
+        admissible one, and of the built-ins only chebyshev is admissible under these move costs
+        :param deadline: time.perf_counter() value to stop improving at; None runs down to weight 1
+        :return: the best path found by the deadline, None if there was no time for a first one
+        """
+        return AnytimeAStar(
+            self._costmap, heuristic, initial_weight, weight_step, start=start, goal=goal
+        ).solve(deadline)
+
+
+@attrs(auto_attribs=True)
+class AnytimeAStar(object):
+    """
+    Anytime Repairing A* (ARA*, Likhachev, Gordon & Thrun, 2003). Runs weighted A* with a
+    large weight to find a first path quickly, then lowers the weight by weight_step and
+    repairs the search instead of restarting it: only the states whose cost improved since
+    they were expanded are re-queued. Each published path comes with a suboptimality bound
+    computed from the open states, which reaches 1 once the path is optimal. The bound only
+    holds for an admissible heuristic. Straight and diagonal moves both cost about 1 here, so
+    that means chebyshev, the default; euclidean and octile overestimate diagonal distances.
+
+    Moves cost and tie-break as in AStar. The search is headless: only obstacles block and
+    the costmap is left untouched. improve() and solve() can be called again after a
+    deadline to keep improving from where the search stopped.
+    """
+    _costmap: Costmap
+    _heuristic: Callable[[Location, Location], float] = AStarHeuristics.chebyshev
+    _initial_weight: float = 3.0
+    _weight_step: float = 0.5
+    _start: Optional[Location] = None
+    _goal: Optional[Location] = None
+
+    path: Optional[Sequence[Location]] = attrib(init=False, default=None)
+    bound: float = attrib(init=False, default=INF)
+    nodes_expanded: int = attrib(init=False, default=0)
+    _g: Dict[Location, float] = attrib(init=False, factory=dict)
+    _parent_map: Dict[Location, Location] = attrib(init=False, factory=dict)
+    _queue: OpenList = attrib(init=False, factory=OpenList)
+    _closed: Set[Location] = attrib(init=False, factory=set)
+    _inconsistent: Set[Location] = attrib(init=False, factory=set)
+    _published: bool = attrib(init=False, default=False)
+
+    def __attrs_post_init__(self):
+        self._start = self._start or self._costmap.robot
+        self._goal = self._goal or self._costmap.goal
+        self._data = self._costmap.get_data()
+        self._weight = self._initial_weight
+        self._g[self._start] = 0
+        self._queue.push(self._start, self._priority(self._start))
+
+    @property
+    def weight(self) -> float:
+        return self._weight
+
+    def _priority(self, loc: Location) -> float:
+        return self._g[loc] + self._weight * self._heuristic(loc, self._goal)
+
+    def _neighbors(self, loc: Location) -> List[Location]:
+        neighbors = []
+        for dx, dy in NEIGHBOR_OFFSETS:
+            x = loc.x + dx
+            y = loc.y + dy
+            if 0 <= x < self._costmap.cols and 0 <= y < self._costmap.rows and self._data[y, x] != Items.OBSTACLE:
+                neighbors.append(Location(x, y))
+        return neighbors
+
+    def _improve_path(self, deadline: Optional[float]) -> bool:
+        """
+        Weighted A* until the goal's cost is no larger than the smallest open priority
+        :return: False if the deadline passed first
+        """
+        queue = self._queue
+        g = self._g
+        while len(queue) > 0:
+            loc, priority = queue.peek()
+            if g.get(self._goal, INF) <= priority:
+                return True
+            if deadline is not None and self.nodes_expanded % 64 == 0 and perf_counter() >= deadline:
+                return False
+
+            queue.pop()
+            self._closed.add(loc)
+            self.nodes_expanded += 1
+            for n in self._neighbors(loc):
+                new_cost = g[loc] + _compute_movement_cost(loc, n)
+                if new_cost < g.get(n, INF):
+                    g[n] = new_cost
+                    self._parent_map[n] = loc
+                    if n in self._closed:
+                        # Expanded with a worse cost this iteration; re-queued by the next one
+                        self._inconsistent.add(n)
+                    else:
+                        queue.push(n, self._priority(n))
+        return True
+
+    def _lower_weight(self) -> None:
+        self._weight = max(1.0, self._weight - self._weight_step)
+        queue = OpenList()
+        for loc in list(self._queue) + list(self._inconsistent):
+            queue.push(loc, self._priority(loc))
+        queue.stats = self._queue.stats
+        self._queue = queue
+        self._inconsistent.clear()
+        self._closed.clear()
+
+    def _suboptimality_bound(self) -> float:
+        lower_bound = min(
+            (self._g[loc] + self._heuristic(loc, self._goal) for loc in list(self._queue) + list(self._inconsistent)),
+            default=INF
+        )
+        return min(self._weight, max(1.0, self._g[self._goal] / lower_bound)) if lower_bound > 0 else self._weight
+
+    def improve(self, deadline: Optional[float] = None) -> Iterator[Tuple[Sequence[Location], float]]:
+        """
+        Yield (path, suboptimality bound) after every search iteration, until the path is
+        provably optimal (bound 1) or the deadline (a time.perf_counter() value) passes
+        """
+        while True:
+            if self._published:
+                if self._weight <= 1 or self.bound <= 1:
+                    return
+                self._lower_weight()
+                self._published = False
+
+            if not self._improve_path(deadline):
+                return
+            if self._goal not in self._g:
+                raise Exception("Path does not exist!")
+
+            path = []
+            curr = self._goal
+            while curr != self._start:
+                path.append(curr)
+                curr = self._parent_map[curr]
+            path.reverse()
+            self.path = path
+            self.bound = self._suboptimality_bound()
+            self._published = True
+            yield self.path, self.bound
+
+    def solve(self, deadline: Optional[float] = None) -> Optional[Sequence[Location]]:
+        """
+        Improve until the deadline and return the best path found, None if none was found in time
+        """
+        for _ in self.improve(deadline):
+            pass
+        return self.path
 
 
 if __name__ == "__main__":
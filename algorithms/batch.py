@@ -0,0 +1,235 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heappop
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from attr import attrs, attrib
+
+from algorithms.astar import AStarHeuristics, _xy_heuristic, _PENALIZED_MOVEMENT_COST
+from algorithms.costmap import Costmap, Location, generate_random_costmap, trace_index_path
+from algorithms.path import index_dtype, trace_packed_path
+from algorithms.utils import Items, NEIGHBOR_OFFSETS
+
+Query = Tuple[Location, Location]
+
+# Movement cost per neighbor direction for cells with an even and an odd (x + y),
+# matching the checkerboard penalty of astar._compute_movement_cost
+_DIRECTION_COSTS = (
+    tuple(_PENALIZED_MOVEMENT_COST if dx else 1 for dx, dy in NEIGHBOR_OFFSETS),
+    tuple(_PENALIZED_MOVEMENT_COST if dy else 1 for dx, dy in NEIGHBOR_OFFSETS),
+)
+
+
+def build_neighbor_table(data: 'Array[M,N]') -> 'Array[M*N,8]':
+    """
+    For every cell (indexed by y * cols + x), the flat index of each of its 8 neighbors
+    in NEIGHBOR_OFFSETS order, or -1 where the neighbor is off the map or an obstacle.
+    Indices are int32 unless the map has too many cells for it (see path.index_dtype).
+    """
+    rows, cols = data.shape
+    dtype = index_dtype(rows, cols)
+    indices = np.arange(rows * cols, dtype=dtype).reshape(rows, cols)
+    passable = data != Items.OBSTACLE
+    table = np.full((rows, cols, len(NEIGHBOR_OFFSETS)), -1, dtype=dtype)
+    for k, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+        # Destination window [y0:y1, x0:x1] of cells whose neighbor (x + dx, y + dy) is on the map
+        y0, y1 = max(0, -dy), rows - max(0, dy)
+        x0, x1 = max(0, -dx), cols - max(0, dx)
+        neighbor_indices = indices[y0 + dy:y1 + dy, x0 + dx:x1 + dx]
+        neighbor_passable = passable[y0 + dy:y1 + dy, x0 + dx:x1 + dx]
+        table[y0:y1, x0:x1, k] = np.where(neighbor_passable, neighbor_indices, -1)
+    return table.reshape(rows * cols, len(NEIGHBOR_OFFSETS))
+
+
+@attrs(auto_attribs=True)
+class BatchPlanner(object):
+    """
+    Answers many A* queries against one static costmap. Passability and the neighbor
+    table are computed once, and the search arrays are reused between queries with only
+    the touched entries reset. Paths match AStar.solve for the same start and goal.
+    With packed=True they are returned as PackedPath.
+    """
+    _costmap: Costmap
+    _heuristic: Callable[[Location, Location], float] = AStarHeuristics.euclidean
+    _packed: bool = False
+    # Prebuilt build_neighbor_table of the costmap grid (e.g. in shared memory), built when None
+    _neighbors: Optional['Array[N,8]'] = None
+
+    _g: 'Array[N]' = attrib(init=False)
+    _parent: 'Array[N]' = attrib(init=False)
+    _closed: 'Array[N]' = attrib(init=False)
+
+    def __attrs_post_init__(self):
+        data = self._costmap.get_data()
+        if self._neighbors is None:
+            self._neighbors = build_neighbor_table(data)
+        self._g = np.full(data.size, np.inf)
+        self._parent = np.full(data.size, -1, dtype=np.int64)
+        self._closed = np.zeros(data.size, dtype=bool)
+
+    def plan(self, start: Location, goal: Location) -> Optional[Sequence[Location]]:
+        """
+        :return: path from (excluding) start to (including) goal, or None if there is none
+        """
+        rows = self._costmap.rows
+        cols = self._costmap.cols
+        neighbors = self._neighbors
+        g = self._g
+        parent = self._parent
+        closed = self._closed
+        h = _xy_heuristic(self._heuristic, goal)
+
+        start_index = start.y * cols + start.x
+        goal_index = goal.y * cols + goal.x
+        touched = [start_index]
+        g[start_index] = 0
+        # Heap keys sort like Location (x first, then y) so ties break exactly as in AStar
+        heap = [(0, start.x * rows + start.y)]
+        path = None
+        try:
+            while heap:
+                _, key = heappop(heap)
+                x, y = divmod(key, rows)
+                current = y * cols + x
+                if current == goal_index:
+                    trace = trace_packed_path if self._packed else trace_index_path
+                    path = trace(parent, start_index, goal_index, cols)
+                    break
+                if closed[current]:
+                    continue
+                closed[current] = True
+
+                current_cost = float(g[current])
+                costs = _DIRECTION_COSTS[(x + y) % 2]
+                for k, n in enumerate(neighbors[current].tolist()):
+                    if n < 0 or closed[n]:
+                        continue
+                    new_cost = current_cost + costs[k]
+                    if new_cost < g[n]:
+                        if g[n] == np.inf:
+                            touched.append(n)
+                        g[n] = new_cost
+                        parent[n] = current
+                        ny, nx = divmod(n, cols)
+                        heappush(heap, (new_cost + h(nx, ny), nx * rows + ny))
+        finally:
+            g[touched] = np.inf
+            parent[touched] = -1
+            closed[touched] = False
+        return path
+
+    def plan_many(self, queries: Sequence[Query]) -> List[Optional[Sequence[Location]]]:
+        """
+        :param queries: (start, goal) pairs
+        :return: one path (or None) per query, in input order
+        """
+        return [self.plan(start, goal) for start, goal in queries]
+
+
+def plan_many(
+        costmap: Costmap,
+        queries: Sequence[Query],
+        heuristic: Callable[[Location, Location], float] = AStarHeuristics.euclidean,
+        packed: bool = False
+) -> List[Optional[Sequence[Location]]]:
+    """
+    Plan every (start, goal) pair against one costmap, sharing the precomputed tables
+    :param packed: return the paths as PackedPath
+    :return: one path (or None when unreachable) per query, in input order
+    """
+    return BatchPlanner(costmap, heuristic, packed).plan_many(queries)
+
+
+# Per-process state of plan_many_parallel workers, set up once by _init_worker
+_worker_memory: List[shared_memory.SharedMemory] = []
+_worker_planner: Optional[BatchPlanner] = None
+
+
+def _init_worker(
+        memory_name: str,
+        neighbors_name: str,
+        rows: int,
+        cols: int,
+        robot: Location,
+        goal: Location,
+        heuristic: Callable[[Location, Location], float],
+        packed: bool
+) -> None:
+    global _worker_memory, _worker_planner
+    # Attach to the parent's grid and neighbor table instead of receiving pickled copies
+    # or building a table per worker
+    memory = shared_memory.SharedMemory(name=memory_name)
+    neighbors_memory = shared_memory.SharedMemory(name=neighbors_name)
+    _worker_memory = [memory, neighbors_memory]
+    data = np.ndarray((rows, cols), dtype=np.uint8, buffer=memory.buf)
+    neighbors = np.ndarray(
+        (rows * cols, len(NEIGHBOR_OFFSETS)), dtype=index_dtype(rows, cols), buffer=neighbors_memory.buf
+    )
+    costmap = Costmap(rows=rows, cols=cols, robot=robot, goal=goal, data=data)
+    _worker_planner = BatchPlanner(costmap, heuristic, packed, neighbors)
+
+
+def _plan_chunk(queries: Sequence[Query]) -> List[Optional[Sequence[Location]]]:
+    return _worker_planner.plan_many(queries)
+
+
+def plan_many_parallel(
+        costmap: Costmap,
+        queries: Sequence[Query],
+        heuristic: Callable[[Location, Location], float] = AStarHeuristics.euclidean,
+        max_workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        packed: bool = False
+) -> List[Optional[Sequence[Location]]]:
+    """
+    plan_many fanned out over a process pool. The costmap grid and its neighbor table are
+    built once and placed in shared memory, and every worker builds its BatchPlanner on
+    them, so only the queries and the resulting paths are pickled.
+    :param max_workers: number of worker processes, defaults to the CPU count
+    :param chunk_size: queries sent to a worker per task, defaults to about four tasks per worker
+    :param packed: return the paths as PackedPath, which also makes sending them back much cheaper
+    :return: one path (or None when unreachable) per query, in input order
+    """
+    if not queries:
+        return []
+    max_workers = max_workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, math.ceil(len(queries) / (4 * max_workers)))
+    chunks = [queries[i:i + chunk_size] for i in range(0, len(queries), chunk_size)]
+
+    data = costmap.get_data()
+    neighbors = build_neighbor_table(data)
+    memory = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    try:
+        neighbors_memory = shared_memory.SharedMemory(create=True, size=neighbors.nbytes)
+        try:
+            np.ndarray(data.shape, dtype=np.uint8, buffer=memory.buf)[:] = data
+            np.ndarray(neighbors.shape, dtype=neighbors.dtype, buffer=neighbors_memory.buf)[:] = neighbors
+            del neighbors
+            init_args = (
+                memory.name, neighbors_memory.name, costmap.rows, costmap.cols, costmap.robot, costmap.goal,
+                heuristic, packed
+            )
+            with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=init_args) as executor:
+                # map yields results in submission order regardless of completion order
+                paths = []
+                for chunk_paths in executor.map(_plan_chunk, chunks):
+                    paths.extend(chunk_paths)
+            return paths
+        finally:
+            neighbors_memory.close()
+            neighbors_memory.unlink()
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+if __name__ == "__main__":
+    costmap = generate_random_costmap(50, 50, 0.2)
+    free = np.argwhere(costmap.get_data() == Items.OPEN)
+    pairs = free[np.random.choice(len(free), size=(10, 2))]
+    queries = [(Location(int(s[1]), int(s[0])), Location(int(g[1]), int(g[0]))) for s, g in pairs]
+    for (start, goal), path in zip(queries, plan_many(costmap, queries)):
+        print(start, goal, None if path is None else len(path))
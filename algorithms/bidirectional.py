@@ -0,0 +1,225 @@
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Set
+
+from attr import attrs, attrib
+
+from algorithms.astar import AStarHeuristics, _compute_movement_cost
+from algorithms.costmap import Costmap, EasyGIFWriter, Location, generate_random_costmap
+from algorithms.open_list import OpenList
+from algorithms.utils import Items, NEIGHBOR_OFFSETS
+
+INF = float("inf")
+
+
+def _passable_neighbors(costmap: Costmap, loc: Location) -> List[Location]:
+    """
+    Neighbors that are on the map and not an obstacle. Bidirectional searches keep their
+    own closed sets, since each side must see the cells the other side has visited.
+    """
+    data = costmap.get_data()
+    neighbors = []
+    for dx, dy in NEIGHBOR_OFFSETS:
+        x = loc.x + dx
+        y = loc.y + dy
+        if 0 <= x < costmap.cols and 0 <= y < costmap.rows and data[y, x] != Items.OBSTACLE:
+            neighbors.append(Location(x, y))
+    return neighbors
+
+
+def _mark(costmap: Costmap, loc: Location, value: Items) -> None:
+    if loc != costmap.robot and loc != costmap.goal:
+        costmap.set_value(loc, value)
+
+
+def _join_paths(
+        costmap: Costmap,
+        forward_parents: Dict[Location, Optional[Location]],
+        backward_parents: Dict[Location, Optional[Location]],
+        meeting: Location
+) -> List[Location]:
+    """
+    Chain the robot-side tree up to the meeting cell with the goal-side tree beyond it
+    :return: path from (excluding) the robot to (including) the goal
+    """
+    path = []
+    curr = meeting
+    while curr != costmap.robot:
+        path.append(curr)
+        curr = forward_parents[curr]
+    path.reverse()
+
+    curr = backward_parents[meeting]
+    while curr is not None:
+        path.append(curr)
+        curr = backward_parents[curr]
+
+    for loc in path:
+        _mark(costmap, loc, Items.PARENT)
+    return path
+
+
+@attrs(auto_attribs=True)
+class BidirectionalBFS(object):
+    """
+    Breadth first search grown from both the robot and the goal. Each step() expands one
+    node of the side with the smaller frontier, a whole BFS layer at a time, and the search
+    stops at the end of the first layer in which the two frontiers met, returning the
+    shortest path through the meeting cells. nodes_expanded counts the expanded nodes.
+    """
+    _costmap: Costmap
+
+    nodes_expanded: int = attrib(init=False, default=0)
+    _parents: List[Dict[Location, Optional[Location]]] = attrib(init=False, factory=list)
+    _depths: List[Dict[Location, int]] = attrib(init=False, factory=list)
+    _frontiers: List[Deque[Location]] = attrib(init=False, factory=list)
+    _next_frontiers: List[List[Location]] = attrib(init=False, factory=list)
+    _meeting: Optional[Location] = attrib(init=False, default=None)
+    _meeting_length: float = attrib(init=False, default=INF)
+
+    def __attrs_post_init__(self):
+        # Side 0 searches from the robot, side 1 from the goal
+        for root in (self._costmap.robot, self._costmap.goal):
+            self._parents.append({root: None})
+            self._depths.append({root: 0})
+            self._frontiers.append(deque([root]))
+            self._next_frontiers.append([])
+        if self._costmap.robot == self._costmap.goal:
+            self._meeting = self._costmap.robot
+            self._frontiers[0].clear()
+        self._side = 0
+
+    def step(self) -> Optional[Sequence[Location]]:
+        if not self._frontiers[self._side]:
+            # The active side finished a layer
+            if self._meeting is not None:
+                return _join_paths(self._costmap, self._parents[0], self._parents[1], self._meeting)
+            self._frontiers[self._side] = deque(self._next_frontiers[self._side])
+            self._next_frontiers[self._side] = []
+            if not self._frontiers[self._side]:
+                raise Exception("Path does not exist!")
+            self._side = 0 if len(self._frontiers[0]) <= len(self._frontiers[1]) else 1
+
+        side = self._side
+        parents = self._parents[side]
+        depths = self._depths[side]
+        other_depths = self._depths[1 - side]
+
+        current_pos = self._frontiers[side].popleft()
+        self.nodes_expanded += 1
+        _mark(self._costmap, current_pos, Items.VISITED)
+
+        for n in _passable_neighbors(self._costmap, current_pos):
+            if n in parents:
+                continue
+            parents[n] = current_pos
+            depths[n] = depths[current_pos] + 1
+            self._next_frontiers[side].append(n)
+            _mark(self._costmap, n, Items.CURRENT)
+
+            if n in other_depths:
+                # Moves from the robot to n plus moves from n to the goal
+                length = depths[n] + other_depths[n]
+                if length < self._meeting_length:
+                    self._meeting = n
+                    self._meeting_length = length
+
+        return None
+
+
+@attrs(auto_attribs=True)
+class BidirectionalAStar(object):
+    """
+    A* grown from both the robot and the goal, with the same movement costs as AStar.
+
+    Both sides use the balanced potential p(v) = (h(v, goal) - h(v, robot)) / 2: the robot
+    side orders its open list by g + p and the goal side by g - p. The two searches then
+    see the same reduced edge costs, so the search can stop as soon as the two smallest
+    keys add up to the cost of the best path found through a cell both sides reached.
+    Each step() expands the side with the smaller key. With a consistent heuristic (e.g.
+    chebyshev, the default) the path is optimal. nodes_expanded counts the expanded nodes.
+    """
+    _costmap: Costmap
+    _heuristic: Callable[[Location, Location], float] = AStarHeuristics.chebyshev
+
+    nodes_expanded: int = attrib(init=False, default=0)
+    _parents: List[Dict[Location, Optional[Location]]] = attrib(init=False, factory=list)
+    _costs: List[Dict[Location, float]] = attrib(init=False, factory=list)
+    _queues: List[OpenList] = attrib(init=False, factory=list)
+    _closed: List[Set[Location]] = attrib(init=False, factory=list)
+    _meeting: Optional[Location] = attrib(init=False, default=None)
+    _meeting_cost: float = attrib(init=False, default=INF)
+
+    def __attrs_post_init__(self):
+        # Side 0 searches from the robot, side 1 from the goal
+        for side, root in enumerate((self._costmap.robot, self._costmap.goal)):
+            self._parents.append({root: None})
+            self._costs.append({root: 0})
+            queue = OpenList()
+            queue.push(root, self._potential(root, side))
+            self._queues.append(queue)
+            self._closed.append(set())
+        if self._costmap.robot == self._costmap.goal:
+            self._meeting = self._costmap.robot
+            self._meeting_cost = 0
+
+    def _potential(self, loc: Location, side: int) -> float:
+        potential = (self._heuristic(loc, self._costmap.goal) - self._heuristic(loc, self._costmap.robot)) / 2
+        return potential if side == 0 else -potential
+
+    def step(self) -> Optional[Sequence[Location]]:
+        if len(self._queues[0]) == 0 or len(self._queues[1]) == 0:
+            if self._meeting is None:
+                raise Exception("Path does not exist!")
+            return _join_paths(self._costmap, self._parents[0], self._parents[1], self._meeting)
+
+        forward_key = self._queues[0].peek()[1]
+        backward_key = self._queues[1].peek()[1]
+        if forward_key + backward_key >= self._meeting_cost:
+            # No unexplored path can be cheaper than the best meeting
+            return _join_paths(self._costmap, self._parents[0], self._parents[1], self._meeting)
+
+        side = 0 if forward_key <= backward_key else 1
+        costs = self._costs[side]
+        other_costs = self._costs[1 - side]
+
+        current_pos = self._queues[side].pop()
+        self._closed[side].add(current_pos)
+        self.nodes_expanded += 1
+        _mark(self._costmap, current_pos, Items.VISITED)
+
+        for n in _passable_neighbors(self._costmap, current_pos):
+            if n in self._closed[side]:
+                continue
+            # The goal side walks the edges backwards
+            if side == 0:
+                dist_cost = _compute_movement_cost(current_pos, n)
+            else:
+                dist_cost = _compute_movement_cost(n, current_pos)
+            new_cost = costs[current_pos] + dist_cost
+
+            if n not in costs or new_cost < costs[n]:
+                costs[n] = new_cost
+                self._queues[side].push(n, new_cost + self._potential(n, side))
+                self._parents[side][n] = current_pos
+                _mark(self._costmap, n, Items.CURRENT)
+
+                if n in other_costs and new_cost + other_costs[n] < self._meeting_cost:
+                    self._meeting = n
+                    self._meeting_cost = new_cost + other_costs[n]
+
+        return None
+
+
+if __name__ == "__main__":
+    costmap = generate_random_costmap(20, 30, 0.3)
+
+    with EasyGIFWriter("bidirectional_astar.gif", scale_factor=10) as gif_writer:
+        search = BidirectionalAStar(costmap)
+        while True:
+            path = search.step()
+            im = costmap.draw(show=False)
+            gif_writer.write(im)
+            if path is not None:
+                break
+
+    print(path, search.nodes_expanded)
@@ -1,14 +1,22 @@
+from collections import deque
+from time import perf_counter
 from typing import List, Dict, Tuple, Sequence, Optional
 
+import numpy as np
 from attr import attrs, attrib
 
-from algorithms.costmap import Costmap, generate_random_costmap, EasyGIFWriter, Location
-from algorithms.utils import Items
+from algorithms.costmap import Costmap, generate_random_costmap, EasyGIFWriter, Location, trace_index_path
+from algorithms.path import trace_packed_path
+from algorithms.stats import SearchStats, StepHook
+from algorithms.utils import Items, NEIGHBOR_OFFSETS, NEIGHBOR_MASK_OFFSETS
 
 
 @attrs(auto_attribs=True)
 class BFS(object):
     _costmap: Costmap
+    # Optional instrumentation; both are skipped entirely when None
+    stats: Optional[SearchStats] = None
+    _on_step: Optional[StepHook] = None
 
     _parent_map: Dict[Tuple, Tuple] = attrib(init=False, factory=dict)
     _queue: List[Location] = attrib(init=False, factory=list)
@@ -19,11 +27,16 @@ class BFS(object):
         self._goal = self._costmap.goal
 
     def step(self) -> Optional[Sequence[Location]]:
+        stats = self.stats
+        if stats is not None:
+            step_start = perf_counter()
 
         if len(self._queue) == 0:
             raise Exception("Path does not exist!")
 
         current_pos = self._queue.pop(0)
+        if stats is not None:
+            stats.queue_time += perf_counter() - step_start
         current_value = self._costmap.get_value(current_pos)
 
         if current_value == Items.GOAL:
@@ -36,6 +49,8 @@ class BFS(object):
                 path.append(curr)
                 curr = self._parent_map[curr]
             path.reverse()
+            if stats is not None:
+                stats.step_time += perf_counter() - step_start
             return path
 
         # Mark visited node
@@ -43,19 +58,88 @@ class BFS(object):
             self._costmap.set_value(current_pos, Items.VISITED)
 
         # Add neighbors to list, add to parent list
+        if stats is not None:
+            neighbor_start = perf_counter()
         neighbors = self._costmap.get_open_neighbors(current_pos)
+        if stats is not None:
+            stats.neighbor_time += perf_counter() - neighbor_start
         for n in neighbors:
             if self._costmap.get_value(n) == Items.CURRENT:
                 continue
 
             if n != self._goal:
                 self._costmap.set_value(n, Items.CURRENT)
+            if stats is not None:
+                stats.nodes_generated += 1
+                if n in self._parent_map:
+                    stats.nodes_requeued += 1
             self._queue.append(n)
             # Save parents-to-child map so that the path can be extracted
             self._parent_map[n] = current_pos
 
+        if stats is not None:
+            stats.nodes_expanded += 1
+            stats.open_list_peak = max(stats.open_list_peak, len(self._queue))
+            stats.step_time += perf_counter() - step_start
+        if self._on_step is not None:
+            self._on_step(current_pos, stats)
         return None
 
+    def solve(
+            self,
+            start: Optional[Location] = None,
+            goal: Optional[Location] = None,
+            packed: bool = False
+    ) -> Sequence[Location]:
+        """
+        Headless search that leaves the costmap untouched. Visits nodes in the same order
+        as step(), but keeps the visited/current state in its own scratch arrays
+        :param start: start location, defaults to the costmap robot
+        :param goal: goal location, defaults to the costmap goal
+        :param packed: return the path as a PackedPath
+        :return: path from (excluding) start to (including) goal
+        """
+        start = start or self._costmap.robot
+        goal = goal or self._costmap.goal
+        rows = self._costmap.rows
+        cols = self._costmap.cols
+        data = self._costmap.get_data()
+        masks = self._costmap.get_neighbor_index()
+        if masks is not None:
+            masks = masks.reshape(-1)
+
+        # Obstacles plus every node that has been queued or visited
+        seen = (data == Items.OBSTACLE).reshape(-1)
+        parents = np.full(data.size, -1, dtype=np.int64)
+        start_index = start.y * cols + start.x
+        goal_index = goal.y * cols + goal.x
+        seen[start_index] = True
+
+        queue = deque([start_index])
+        while queue:
+            current = queue.popleft()
+            if current == goal_index:
+                trace = trace_packed_path if packed else trace_index_path
+                return trace(parents, start_index, goal_index, cols)
+
+            y, x = divmod(current, cols)
+            offsets = NEIGHBOR_OFFSETS if masks is None else NEIGHBOR_MASK_OFFSETS[masks[current]]
+            for dx, dy in offsets:
+                nx = x + dx
+                ny = y + dy
+                if masks is None and (nx < 0 or ny < 0 or nx >= cols or ny >= rows):
+                    continue
+                n = ny * cols + nx
+                if seen[n]:
+                    continue
+                if n != goal_index:
+                    seen[n] = True
+                queue.append(n)
+                # Save parents-to-child map so that the path can be extracted
+                parents[n] = current
+
+        raise Exception("Path does not exist!")
+
 
 if __name__ == "__main__":
     costmap = generate_random_costmap(20, 30, 0.4)
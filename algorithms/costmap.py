@@ -1,13 +1,28 @@
+import io
+import json
 import random
-from typing import Tuple, Optional, Sequence, Dict, Any, List, Union
+import struct
+from collections import deque
+from contextlib import contextmanager
+from typing import Tuple, Optional, Sequence, Dict, Any, List, Union, Callable, Iterator, Deque
 
 import imageio
 import matplotlib.pyplot as plt
 import numpy as np
 from attr import attrs, attrib
 from matplotlib.colors import Colormap, Normalize
+from PIL import Image
 
-from algorithms.utils import Items, Colors, clamp, Color
+from algorithms.utils import Items, Colors, clamp, Color, NEIGHBOR_OFFSETS, NEIGHBOR_MASK_OFFSETS
+
+# On-disk costmap format: fixed header, JSON item mapping, padding, then the raw uint8 grid
+COSTMAP_FILE_MAGIC = b"CMAP"
+COSTMAP_FILE_VERSION = 1
+_COSTMAP_FILE_HEADER = struct.Struct("<4sHHqqqqqqI")
+_COSTMAP_FILE_ALIGNMENT = 64
+
+# Obstacle edits remembered for Costmap.changes_since
+CHANGE_LOG_SIZE = 4096
 
 ITEMS_TO_COLOR_MAPPING = {
     Items.OPEN: Colors.WHITE,
@@ -49,6 +64,16 @@ class Costmap(object):
     _cmap: Colormap = attrib(init=False)
     _norm: Normalize = attrib(init=False)
 
+    _neighbor_index: Optional['Array[M,N]'] = attrib(init=False, default=None)
+    _listeners: List[Callable[[Location, int, int], None]] = attrib(init=False, factory=list)
+    _version: int = attrib(init=False, default=0)
+    _cost_layer: Optional['Array[M,N]'] = attrib(init=False, default=None)
+    # (version, cell) per obstacle toggle, (version, None) per change not tied to a cell
+    _change_log: Deque[Tuple[int, Optional[Location]]] = attrib(
+        init=False, factory=lambda: deque(maxlen=CHANGE_LOG_SIZE)
+    )
+    _change_log_floor: int = attrib(init=False, default=0)
+
     @classmethod
     def create_map(
             cls,
@@ -75,12 +100,76 @@ class Costmap(object):
             data=costmap
         )
 
+    def save(self, file_path: str) -> None:
+        """
+        Write the costmap in the binary costmap format that Costmap.load memory-maps
+        """
+        item_mapping = json.dumps(_item_mapping()).encode("utf-8")
+        header = _COSTMAP_FILE_HEADER.pack(
+            COSTMAP_FILE_MAGIC, COSTMAP_FILE_VERSION, 0,
+            self.rows, self.cols, self.robot.x, self.robot.y, self.goal.x, self.goal.y,
+            len(item_mapping)
+        )
+        header_size = len(header) + len(item_mapping)
+        padding = -header_size % _COSTMAP_FILE_ALIGNMENT
+        with open(file_path, "wb") as costmap_file:
+            costmap_file.write(header)
+            costmap_file.write(item_mapping)
+            costmap_file.write(b"\0" * padding)
+            np.ascontiguousarray(self._data, dtype=np.uint8).tofile(costmap_file)
+
+    @classmethod
+    def load(cls, file_path: str, mode: str = "c") -> 'Costmap':
+        """
+        Open a costmap written by Costmap.save with its grid memory-mapped, so processes that
+        load the same file share one page-cached copy
+        :param mode: np.memmap mode: "c" keeps writes private to this process (default),
+            "r+" writes them through to the file, "r" makes the grid read-only (headless solve only)
+        """
+        with open(file_path, "rb") as costmap_file:
+            header = costmap_file.read(_COSTMAP_FILE_HEADER.size)
+            if len(header) < _COSTMAP_FILE_HEADER.size:
+                raise ValueError(f"{file_path} is not a costmap file")
+            magic, version, _, rows, cols, robot_x, robot_y, goal_x, goal_y, mapping_size = \
+                _COSTMAP_FILE_HEADER.unpack(header)
+            if magic != COSTMAP_FILE_MAGIC:
+                raise ValueError(f"{file_path} is not a costmap file")
+            if version != COSTMAP_FILE_VERSION:
+                raise ValueError(f"Unsupported costmap file version: {version}")
+            item_mapping = json.loads(costmap_file.read(mapping_size).decode("utf-8"))
+            if item_mapping != _item_mapping():
+                raise ValueError(f"{file_path} was written with a different item mapping: {item_mapping}")
+
+        header_size = _COSTMAP_FILE_HEADER.size + mapping_size
+        offset = header_size + -header_size % _COSTMAP_FILE_ALIGNMENT
+        data = np.memmap(file_path, dtype=np.uint8, mode=mode, offset=offset, shape=(rows, cols))
+        return Costmap(
+            rows=rows,
+            cols=cols,
+            robot=Location(robot_x, robot_y),
+            goal=Location(goal_x, goal_y),
+            data=data
+        )
+
     def get_data(self) -> 'Array[M,N]':
         return self._data
 
     def get_value(self, location) -> Union[int, float]:
         return self._data[location.y, location.x]
 
+    def build_neighbor_index(self) -> 'Array[M,N]':
+        """
+        Build (or rebuild) the passable-neighbor index: one bitmask per cell whose bit k is
+        set when the neighbor at NEIGHBOR_OFFSETS[k] is on the map and not an obstacle.
+        set_value, set_robot and set_goal keep it up to date; rebuild it after writing to
+        get_data() directly.
+        """
+        self._neighbor_index = compute_neighbor_masks(self._data)
+        return self._neighbor_index
+
+    def get_neighbor_index(self) -> Optional['Array[M,N]']:
+        return self._neighbor_index
+
     def get_open_neighbors(self, loc: Location) -> Optional[Sequence[Location]]:
         """
         Get a list of the open neighbors that are not an obstacle, robot, or visited
@@ -90,6 +179,14 @@ class Costmap(object):
         col = loc.x
         row = loc.y
         neighbors = []
+        if self._neighbor_index is not None:
+            # Bounds and obstacles are already folded into the mask
+            for dx, dy in NEIGHBOR_MASK_OFFSETS[self._neighbor_index[row, col]]:
+                value = self._data[row + dy, col + dx]
+                if value != Items.ROBOT and value != Items.VISITED:
+                    neighbors.append(Location(x=col + dx, y=row + dy))
+            return neighbors
+
         min_row = clamp(row - 1, 0, self.rows - 1)
         max_row = clamp(row + 1, 0, self.rows - 1)
         min_col = clamp(col - 1, 0, self.cols - 1)
@@ -103,21 +200,146 @@ class Costmap(object):
         return neighbors
 
     def set_robot(self, robot: Location) -> None:
+        self._bump(robot)
         # reset robot costmap location
         if self.get_value(robot) != Items.GOAL:
-            self._data[self.robot.y, self.robot.x] = Items.OPEN
+            self._write(self.robot, Items.OPEN)
         self.robot = robot
-        self._data[robot.y, robot.x] = Items.ROBOT
+        self._write(robot, Items.ROBOT)
 
     def set_goal(self, goal: Location) -> None:
+        self._bump(goal)
         # reset goal costmap location
         if self.get_value(goal) != Items.ROBOT:
-            self._data[self.goal.y, self.goal.x] = Items.OPEN
+            self._write(self.goal, Items.OPEN)
         self.goal = goal
-        self._data[goal.y, goal.x] = Items.GOAL
+        self._write(goal, Items.GOAL)
 
     def set_value(self, loc: Location, value: Items) -> None:
+        self._write(loc, value)
+
+    def add_listener(self, listener: Callable[[Location, int, int], None]) -> None:
+        """
+        Register a callback invoked as listener(location, old_value, new_value) after every
+        write through set_value, set_robot or set_goal. Writes to get_data() are not reported.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Location, int, int], None]) -> None:
+        self._listeners.remove(listener)
+
+    def has_listeners(self) -> bool:
+        return bool(self._listeners)
+
+    @property
+    def version(self) -> int:
+        """
+        Map version, bumped by every write that adds or removes an obstacle, by set_robot,
+        set_goal, bulk_edit and cost layer changes. Search markings (CURRENT, VISITED,
+        PARENT) do not change it, so results cached per version stay valid while a step()
+        search runs; they must only be written on passable cells.
+        """
+        return self._version
+
+    def get_cost_layer(self) -> Optional['Array[M,N]']:
+        """
+        Per-cell float64 terrain costs, or None for uniform costs. Entering a cell costs its
+        value times the move length (1, or sqrt(2) for diagonals); inf makes a cell
+        impassable. AStar (both backends) honors the layer; BFS, DFS and JPS ignore it.
+        Costs below 1 make the built-in heuristics overestimate.
+        """
+        return self._cost_layer
+
+    def set_cost_layer(self, costs: Optional['Array[M,N]']) -> None:
+        """
+        Attach (a float64 copy of) a cost layer, or remove it with None. Edit the returned
+        layer in place through algorithms.terrain, or call bump_version() after doing so.
+        """
+        if costs is not None:
+            costs = np.array(costs, dtype=np.float64)
+            if costs.shape != (self.rows, self.cols):
+                raise ValueError(f"Cost layer shape {costs.shape} does not match the {self.rows}x{self.cols} costmap")
+            if np.any(costs < 0) or np.any(np.isnan(costs)):
+                raise ValueError("Terrain costs must be non-negative numbers")
+        self._cost_layer = costs
+        self._bump(None)
+
+    def bump_version(self) -> None:
+        """
+        Invalidate version-keyed caches after editing get_data() directly
+        """
+        self._bump(None)
+
+    def changes_since(self, version: int) -> Optional[List[Location]]:
+        """
+        Cells where an obstacle was added or removed, or the robot or goal was placed, after
+        version, oldest first, or None when that cannot be told: a change not tied to a cell
+        (bump_version, bulk_edit, cost layer) happened, or the edits are too old to be remembered
+        """
+        if version < self._change_log_floor:
+            return None
+        cells = []
+        for change_version, loc in reversed(self._change_log):
+            if change_version <= version:
+                break
+            if loc is None:
+                return None
+            cells.append(loc)
+        if len(cells) != self._version - version:
+            # Every bump is logged, so this only guards against an unexplained gap
+            return None
+        cells.reverse()
+        return cells
+
+    def _bump(self, loc: Optional[Location]) -> None:
+        self._version += 1
+        if len(self._change_log) == self._change_log.maxlen:
+            self._change_log_floor = self._change_log[0][0]
+        self._change_log.append((self._version, loc))
+
+    @contextmanager
+    def bulk_edit(self) -> Iterator['Array[M,N]']:
+        """
+        Edit the grid directly, e.g. with NumPy slicing, and have the version bumped and the
+        neighbor index rebuilt once on exit. Listeners are not told about the edited cells.
+
+            with costmap.bulk_edit() as data:
+                data[10:20, 5] = Items.OBSTACLE
+        """
+        try:
+            yield self._data
+        finally:
+            self._bump(None)
+            if self._neighbor_index is not None:
+                self.build_neighbor_index()
+
+    def _write(self, loc: Location, value: Items) -> None:
+        if value >= Items.CURRENT and not self._listeners:
+            # Fast path for step() visualization: search markings go on passable cells only,
+            # so they never add or remove an obstacle
+            self._data[loc.y, loc.x] = value
+            return
+        old_value = self._data.item(loc.y, loc.x)
         self._data[loc.y, loc.x] = value
+        if (old_value == Items.OBSTACLE) != (value == Items.OBSTACLE):
+            x = loc.x % self.cols
+            y = loc.y % self.rows
+            self._bump(Location(x, y))
+            if self._neighbor_index is not None:
+                self._update_neighbor_index(x, y, value != Items.OBSTACLE)
+        for listener in self._listeners:
+            listener(loc, old_value, value)
+
+    def _update_neighbor_index(self, x: int, y: int, passable: bool) -> None:
+        # Cell (x, y) is neighbor k of the cell at (x - dx, y - dy)
+        for k, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+            nx = x - dx
+            ny = y - dy
+            if 0 <= nx < self.cols and 0 <= ny < self.rows:
+                if passable:
+                    self._neighbor_index[ny, nx] |= 1 << k
+                else:
+                    self._neighbor_index[ny, nx] &= ~(1 << k) & 0xFF
 
     def print(self) -> None:
         """
@@ -140,30 +362,95 @@ class Costmap(object):
 
         return display_image
 
-    def _colorize_costmap(self) -> 'Array[M,N,3]':
-        colorized_costmap = np.zeros((self.rows, self.cols, 3), dtype=np.uint8)
+    def get_color_lookup(self) -> 'Array[256,3]':
+        """
+        RGB color of every possible cell value; values without a color are black
+        """
+        lookup = np.zeros((256, 3), dtype=np.uint8)
         for item, color in self._items_to_colors_mapping.items():
-            mask = self._data == item
-            colorized_costmap[mask] = color
+            lookup[item] = color
+        return lookup
 
-        return colorized_costmap
+    def _colorize_costmap(self) -> 'Array[M,N,3]':
+        return self.get_color_lookup()[self._data]
 
 
 @attrs(auto_attribs=True, slots=True)
 class EasyGIFWriter(object):
+    """
+    Context-managed GIF writer.
+
+    By default every frame is kept until exit and written in one go. With streaming=True
+    each frame is upscaled into a reusable buffer and encoded to the open file as the next
+    one arrives, and the last frame is held with a longer frame duration instead of
+    duplicate frames, so memory stays flat however long the search runs. Each frame is
+    encoded as a one-frame GIF with Pillow's public Image.save and its blocks are spliced
+    into the file (see _gif_frame_blocks); imageio's GIF writers and Pillow's
+    save(append_images=...) hold every frame until the file is closed.
+    """
     _file_path: str
     _frames_per_second: int = 18
-    _frame_list: List['Array[M,N,3]'] = list()
+    _frame_list: List['Array[M,N,3]'] = attrib(factory=list)
     _scale_factor: int = 1
     _hold_last_frame_time: float = 2
+    _streaming: bool = False
+
+    _file: Any = attrib(init=False, default=None)
+    _pending_frame: Optional['Array[M,N,3]'] = attrib(init=False, default=None)
+    _upscale_buffer: Optional['Array[M,N,3]'] = attrib(init=False, default=None)
+    _frame_count: int = attrib(init=False, default=0)
 
     def __enter__(self):
+        if self._streaming:
+            self._file = open(self._file_path, 'wb')
         return self
 
     def write(self, image: 'Array[M,N,3]') -> None:
-        self._frame_list.append(image)
+        if not self._streaming:
+            self._frame_list.append(image)
+            return
+
+        # Hold one frame back: only at exit is it known which frame is the last
+        if self._pending_frame is not None:
+            self._encode(self._pending_frame, 1000 / self._frames_per_second)
+        self._pending_frame = np.array(image, dtype=np.uint8)
+
+    def _upscale(self, image: 'Array[M,N,3]') -> 'Array[M,N,3]':
+        if self._scale_factor == 1:
+            return image
+        rows, cols, channels = image.shape
+        scale = self._scale_factor
+        shape = (rows * scale, cols * scale, channels)
+        if self._upscale_buffer is None or self._upscale_buffer.shape != shape:
+            self._upscale_buffer = np.empty(shape, dtype=np.uint8)
+        # NN upsampling by broadcasting into a (rows, scale, cols, scale) view of the buffer
+        self._upscale_buffer.reshape(rows, scale, cols, scale, channels)[...] = image[:, None, :, None, :]
+        return self._upscale_buffer
+
+    def _encode(self, image: 'Array[M,N,3]', duration_ms: float) -> None:
+        frame = Image.fromarray(self._upscale(image)).convert("P", palette=Image.Palette.ADAPTIVE)
+        encoded = io.BytesIO()
+        if self._frame_count == 0:
+            # The first frame's file, trailer aside, is the header (with the loop extension) and frame
+            frame.save(encoded, format="GIF", duration=duration_ms, loop=0)
+            self._file.write(encoded.getvalue()[:-1])
+        else:
+            frame.save(encoded, format="GIF", duration=duration_ms)
+            self._file.write(_gif_frame_blocks(encoded.getvalue()))
+        self._frame_count += 1
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._streaming:
+            try:
+                assert self._pending_frame is not None, "The number of GIF frames is 0"
+                frame_time = 1000 / self._frames_per_second
+                self._encode(self._pending_frame, max(frame_time, 1000 * self._hold_last_frame_time))
+                self._file.write(b";")  # GIF trailer
+            finally:
+                self._file.close()
+                self._pending_frame = None
+            return
+
         assert len(self._frame_list) > 0, "The number of GIF frames is 0"
         if self._scale_factor != 1:
             frame_buffer = []
@@ -185,6 +472,90 @@ class EasyGIFWriter(object):
             imageio.mimwrite(video_file, frame_buffer, "GIF", fps=self._frames_per_second)
 
 
+def _gif_frame_blocks(gif: bytes) -> bytes:
+    """
+    The frame blocks of a one-frame GIF89a file, to append to an animation: its graphic
+    control extension (frame duration) and image, with the file's global color table moved
+    into the image as a local one. Other extensions are dropped.
+    """
+    # Header (6 bytes), then the logical screen descriptor (7 bytes) whose packed byte tells
+    # whether a global color table of 3 * 2 ** (size + 1) bytes follows
+    flags = gif[10]
+    position = 13
+    color_table = b""
+    if flags & 0x80:
+        table_size = 3 * 2 ** ((flags & 0x07) + 1)
+        color_table = gif[position:position + table_size]
+        position += table_size
+
+    blocks = []
+    while gif[position] != 0x3B:  # trailer
+        if gif[position] == 0x21:  # extension: introducer, label, data sub-blocks
+            start = position
+            position = _skip_gif_sub_blocks(gif, position + 2)
+            if gif[start + 1] == 0xF9:  # graphic control
+                blocks.append(gif[start:position])
+            continue
+
+        # Image descriptor (10 bytes), optional local color table, LZW code size, data sub-blocks
+        descriptor = bytearray(gif[position:position + 10])
+        position += 10
+        image_flags = descriptor[9]
+        if image_flags & 0x80:
+            local_table_size = 3 * 2 ** ((image_flags & 0x07) + 1)
+            local_table = gif[position:position + local_table_size]
+            position += local_table_size
+        else:
+            descriptor[9] = (image_flags & 0x78) | 0x80 | (flags & 0x07)
+            local_table = color_table
+        start = position
+        position = _skip_gif_sub_blocks(gif, position + 1)
+        blocks.extend((bytes(descriptor), local_table, gif[start:position]))
+    return b"".join(blocks)
+
+
+def _skip_gif_sub_blocks(gif: bytes, position: int) -> int:
+    """
+    :return: position after the data sub-blocks starting at position, terminator included
+    """
+    while gif[position] != 0:
+        position += gif[position] + 1
+    return position + 1
+
+
+def _item_mapping() -> Dict[str, int]:
+    return {name: value for name, value in vars(Items).items() if not name.startswith("_")}
+
+
+def compute_neighbor_masks(data: 'Array[M,N]') -> 'Array[M,N]':
+    """
+    Per-cell uint8 bitmask of passable neighbors, bit k for NEIGHBOR_OFFSETS[k]
+    """
+    rows, cols = data.shape
+    passable = data != Items.OBSTACLE
+    masks = np.zeros((rows, cols), dtype=np.uint8)
+    for k, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+        # Cells [y0:y1, x0:x1] whose neighbor (x + dx, y + dy) is on the map
+        y0, y1 = max(0, -dy), rows - max(0, dy)
+        x0, x1 = max(0, -dx), cols - max(0, dx)
+        masks[y0:y1, x0:x1] |= passable[y0 + dy:y1 + dy, x0 + dx:x1 + dx].astype(np.uint8) << k
+    return masks
+
+
+def trace_index_path(parents: 'Array[N]', start: int, goal: int, cols: int) -> List[Location]:
+    """
+    Follow a flat parent array (indexed by y * cols + x) back from goal to start
+    :return: path from (excluding) start to (including) goal
+    """
+    path = []
+    current = goal
+    while current != start:
+        path.append(Location(current % cols, current // cols))
+        current = int(parents[current])
+    path.reverse()
+    return path
+
+
 def generate_random_location(max_row: int, max_col: int) -> Location:
     return Location(x=random.randint(0, max_col - 1), y=random.randint(0, max_row - 1))
 
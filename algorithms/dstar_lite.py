@@ -0,0 +1,170 @@
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from attr import attrs, attrib
+
+from algorithms.astar import AStarHeuristics, _compute_movement_cost
+from algorithms.costmap import Costmap, Location, generate_random_costmap
+from algorithms.open_list import OpenList
+from algorithms.utils import Items, NEIGHBOR_OFFSETS
+
+INF = float("inf")
+
+Key = Tuple[float, float]
+
+
+@attrs(auto_attribs=True)
+class DStarLite(object):
+    """
+    D* Lite (Koenig & Likhachev, 2002): an incremental planner that searches from the goal
+    back to the robot and keeps its search tree between calls to replan().
+
+    It listens to the costmap for obstacle edits and, on the next replan(), repairs only
+    the vertices whose edge costs changed. Robot moves (Costmap.set_robot) are absorbed
+    through the key modifier instead of a new search. Moves cost the same as in AStar, and
+    the search state lives in this object, so the costmap is never marked for
+    visualization. Changing the costmap goal starts a fresh search.
+    """
+    _costmap: Costmap
+    _heuristic: Callable[[Location, Location], float] = AStarHeuristics.chebyshev
+
+    _g: Dict[Location, float] = attrib(init=False, factory=dict)
+    _rhs: Dict[Location, float] = attrib(init=False, factory=dict)
+    _queue: OpenList = attrib(init=False, factory=OpenList)
+    _changed: Set[Location] = attrib(init=False, factory=set)
+
+    def __attrs_post_init__(self):
+        self._data = self._costmap.get_data()
+        self._reset()
+        self._costmap.add_listener(self._on_cell_changed)
+
+    def detach(self) -> None:
+        """
+        Stop listening to the costmap
+        """
+        self._costmap.remove_listener(self._on_cell_changed)
+
+    def _reset(self) -> None:
+        self._goal = self._costmap.goal
+        self._last_start = self._costmap.robot
+        self._key_modifier = 0
+        self._g.clear()
+        self._rhs.clear()
+        self._queue = OpenList()
+        self._changed.clear()
+        self.nodes_expanded = 0
+
+        self._rhs[self._goal] = 0
+        self._queue.push(self._goal, self._calculate_key(self._goal))
+
+    def _on_cell_changed(self, loc: Location, old_value: int, new_value: int) -> None:
+        if (old_value == Items.OBSTACLE) != (new_value == Items.OBSTACLE):
+            self._changed.add(Location(loc.x % self._costmap.cols, loc.y % self._costmap.rows))
+
+    def _neighbors(self, loc: Location) -> List[Location]:
+        neighbors = []
+        for dx, dy in NEIGHBOR_OFFSETS:
+            x = loc.x + dx
+            y = loc.y + dy
+            if 0 <= x < self._costmap.cols and 0 <= y < self._costmap.rows:
+                neighbors.append(Location(x, y))
+        return neighbors
+
+    def _cost(self, from_loc: Location, to_loc: Location) -> float:
+        if self._data[from_loc.y, from_loc.x] == Items.OBSTACLE or self._data[to_loc.y, to_loc.x] == Items.OBSTACLE:
+            return INF
+        return _compute_movement_cost(from_loc, to_loc)
+
+    def _calculate_key(self, loc: Location) -> Key:
+        best = min(self._g.get(loc, INF), self._rhs.get(loc, INF))
+        return best + self._heuristic(self._costmap.robot, loc) + self._key_modifier, best
+
+    def _update_vertex(self, loc: Location) -> None:
+        if loc != self._goal:
+            self._rhs[loc] = min(
+                (self._cost(loc, n) + self._g.get(n, INF) for n in self._neighbors(loc)),
+                default=INF
+            )
+        if loc in self._queue:
+            self._queue.remove(loc)
+        if self._g.get(loc, INF) != self._rhs.get(loc, INF):
+            self._queue.push(loc, self._calculate_key(loc))
+
+    def _compute_shortest_path(self) -> None:
+        start = self._costmap.robot
+        while len(self._queue) > 0:
+            loc, old_key = self._queue.peek()
+            start_key = self._calculate_key(start)
+            if old_key >= start_key and self._rhs.get(start, INF) == self._g.get(start, INF):
+                return
+
+            self._queue.pop()
+            self.nodes_expanded += 1
+            new_key = self._calculate_key(loc)
+            if old_key < new_key:
+                self._queue.push(loc, new_key)
+            elif self._g.get(loc, INF) > self._rhs.get(loc, INF):
+                # Overconsistent: settle it and propagate to the predecessors
+                self._g[loc] = self._rhs[loc]
+                for n in self._neighbors(loc):
+                    self._update_vertex(n)
+            else:
+                # Underconsistent: raise it and let it and its predecessors repair
+                self._g[loc] = INF
+                self._update_vertex(loc)
+                for n in self._neighbors(loc):
+                    self._update_vertex(n)
+
+    def replan(self) -> Sequence[Location]:
+        """
+        Bring the search up to date with the costmap and return the robot's path.
+        nodes_expanded counts the work this call did.
+        :return: path from (excluding) the robot to (including) the goal
+        """
+        self.nodes_expanded = 0
+        if self._costmap.goal != self._goal:
+            self._reset()
+
+        start = self._costmap.robot
+        if start != self._last_start:
+            self._key_modifier += self._heuristic(self._last_start, start)
+            self._last_start = start
+
+        if self._changed:
+            # A toggled cell changes the cost of every edge into and out of it
+            affected = set()
+            for loc in self._changed:
+                affected.add(loc)
+                affected.update(self._neighbors(loc))
+            self._changed.clear()
+            for loc in affected:
+                self._update_vertex(loc)
+
+        self._compute_shortest_path()
+        return self._extract_path()
+
+    def _extract_path(self) -> Sequence[Location]:
+        current = self._costmap.robot
+        if self._g.get(current, INF) == INF:
+            raise Exception("Path does not exist!")
+
+        path = []
+        while current != self._goal:
+            current = min(
+                self._neighbors(current),
+                key=lambda n: (self._cost(current, n) + self._g.get(n, INF), n)
+            )
+            path.append(current)
+        return path
+
+
+if __name__ == "__main__":
+    costmap = generate_random_costmap(40, 60, 0.2)
+    dstar = DStarLite(costmap)
+    print(dstar.replan(), dstar.nodes_expanded)
+
+    path = dstar.replan()
+    for loc in path[len(path) // 2:len(path) // 2 + 3]:
+        if loc != costmap.goal:
+            costmap.set_value(loc, Items.OBSTACLE)
+    costmap.set_robot(path[0])
+    print(dstar.replan(), dstar.nodes_expanded)
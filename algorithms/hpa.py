@@ -0,0 +1,459 @@
+from heapq import heappush, heappop
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from attr import attrs, attrib
+
+from algorithms.astar import ArrayAStar, AStarHeuristics, SQRT_2
+from algorithms.costmap import Costmap, Location, generate_random_costmap
+from algorithms.jps import JPS
+from algorithms.utils import Items, NEIGHBOR_OFFSETS
+
+ClusterKey = Tuple[int, int]
+# ("v", cx, cy) is the border between clusters (cx, cy) and (cx + 1, cy),
+# ("h", cx, cy) the border between clusters (cx, cy) and (cx, cy + 1)
+BorderKey = Tuple[str, int, int]
+Bounds = Tuple[int, int, int, int]
+
+INF = float("inf")
+# Upper bound on the distance field cells relaxed together in one batch of clusters
+BATCH_CELLS = 1 << 20
+
+
+def _sweep(distances: 'Array[H,W,C,K]', entry_costs: 'Array[H,W,C,1]', reverse: bool) -> None:
+    """
+    Relax every row from the already relaxed row before it (straight and both diagonal
+    moves), so one sweep carries distances across the whole cluster
+    """
+    rows = distances.shape[0]
+    for y in (range(rows - 2, -1, -1) if reverse else range(1, rows)):
+        previous = distances[y + 1 if reverse else y - 1]
+        candidates = previous + 1
+        np.minimum(candidates[1:], previous[:-1] + SQRT_2, out=candidates[1:])
+        np.minimum(candidates[:-1], previous[1:] + SQRT_2, out=candidates[:-1])
+        candidates += entry_costs[y]
+        np.minimum(distances[y], candidates, out=distances[y])
+
+
+def _relax(distances: 'Array[H,W,C,K]', entry_costs: 'Array[H,W,C,1]') -> None:
+    """
+    Exact octile distances inside each cluster, in place. Sweeps down, up, right and left
+    are repeated until nothing improves; only paths that double back need extra rounds.
+    """
+    views = ((distances, entry_costs), (distances.swapaxes(0, 1), entry_costs.swapaxes(0, 1)))
+    while True:
+        previous = distances.copy()
+        for view, entry_view in views:
+            _sweep(view, entry_view, reverse=False)
+            _sweep(view, entry_view, reverse=True)
+        if np.array_equal(distances, previous):
+            return
+
+
+def _descent_steps(distances: 'Array[H,W,C,K]') -> 'Array[H,W,C,K]':
+    """
+    :return: index into NEIGHBOR_OFFSETS of the move that descends each distance field,
+        -1 on the sources and on unreachable cells
+    """
+    height, width = distances.shape[:2]
+    candidates = np.full((len(NEIGHBOR_OFFSETS),) + distances.shape, INF, dtype=distances.dtype)
+    for k, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+        # Cell (x, y) moves to (x + dx, y + dy)
+        np.add(
+            distances[max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0)],
+            SQRT_2 if dx and dy else 1,
+            out=candidates[k, max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)]
+        )
+    steps = candidates.argmin(axis=0).astype(np.int8)
+    steps[(distances == 0) | (distances == INF)] = -1
+    return steps
+
+
+@attrs(auto_attribs=True)
+class HPAStats(object):
+    clusters_rebuilt: int = 0
+    borders_rebuilt: int = 0
+    abstract_nodes_expanded: int = 0
+    fallback_searches: int = 0
+
+
+@attrs(auto_attribs=True)
+class HPAStar(object):
+    """
+    Hierarchical path-finding A* (Botea, Mueller & Schaeffer, 2004).
+
+    The costmap is partitioned into cluster_size x cluster_size clusters. Entrances are
+    found once along every cluster border, and the distance field of every entrance within
+    its cluster is precomputed. Only the descent direction of each field is kept: walking
+    it gives the path to the entrance, so start and goal are connected to the entrances of
+    their clusters and abstract edges are refined without any further search. The abstract
+    graph is searched on integer node ids.
+
+    Moves cost 1 and diagonal moves sqrt(2), as in JPS. Paths are near-optimal: they cross
+    cluster borders only at the chosen entrances. When the abstract graph misses a
+    connection (e.g. a passage that only exists diagonally across a cluster corner), the
+    query falls back to a full JPS search. Obstacle edits through Costmap.set_value mark
+    only the touched cluster and its neighbors for rebuilding on the next query.
+    """
+    _costmap: Costmap
+    _cluster_size: int = 32
+    _max_entrance_width: int = 6
+
+    stats: HPAStats = attrib(init=False, factory=HPAStats)
+    _transitions: Dict[BorderKey, List[Tuple[Location, Location]]] = attrib(init=False, factory=dict)
+    _partners: Dict[Location, Set[Location]] = attrib(init=False, factory=dict)
+    _dirty: Set[ClusterKey] = attrib(init=False, factory=set)
+    # Sorted entrances of each cluster and, per entrance, the descent steps of its distance field
+    _entrances: Dict[ClusterKey, List[Location]] = attrib(init=False, factory=dict)
+    _next_steps: Dict[ClusterKey, 'Array[K,H,W]'] = attrib(init=False, factory=dict)
+    # Abstract graph; an entrance keeps its node id across rebuilds
+    _node_ids: Dict[Location, int] = attrib(init=False, factory=dict)
+    _node_locations: List[Location] = attrib(init=False, factory=list)
+    _node_coordinates: Optional['Array[N,2]'] = attrib(init=False, default=None)
+    _node_slots: List[int] = attrib(init=False, factory=list)
+    _edges: List[List[Tuple[int, float]]] = attrib(init=False, factory=list)
+
+    def __attrs_post_init__(self):
+        self._data = self._costmap.get_data()
+        self._cluster_rows = -(-self._costmap.rows // self._cluster_size)
+        self._cluster_cols = -(-self._costmap.cols // self._cluster_size)
+        self._dirty = {(cx, cy) for cx in range(self._cluster_cols) for cy in range(self._cluster_rows)}
+        self._rebuild()
+        self._costmap.add_listener(self._on_cell_changed)
+
+    def detach(self) -> None:
+        """
+        Stop listening to the costmap
+        """
+        self._costmap.remove_listener(self._on_cell_changed)
+
+    def _on_cell_changed(self, loc: Location, old_value: int, new_value: int) -> None:
+        if (old_value == Items.OBSTACLE) != (new_value == Items.OBSTACLE):
+            x = loc.x % self._costmap.cols
+            y = loc.y % self._costmap.rows
+            self._dirty.add((x // self._cluster_size, y // self._cluster_size))
+
+    def _cluster_of(self, loc: Location) -> ClusterKey:
+        return loc.x // self._cluster_size, loc.y // self._cluster_size
+
+    def _bounds(self, cluster: ClusterKey) -> Bounds:
+        size = self._cluster_size
+        cx, cy = cluster
+        return cx * size, cy * size, min((cx + 1) * size, self._costmap.cols), min((cy + 1) * size, self._costmap.rows)
+
+    def _passable(self, x: int, y: int) -> bool:
+        return self._data[y, x] != Items.OBSTACLE
+
+    def _borders_of(self, cluster: ClusterKey) -> List[BorderKey]:
+        cx, cy = cluster
+        borders = []
+        if cx > 0:
+            borders.append(("v", cx - 1, cy))
+        if cx < self._cluster_cols - 1:
+            borders.append(("v", cx, cy))
+        if cy > 0:
+            borders.append(("h", cx, cy - 1))
+        if cy < self._cluster_rows - 1:
+            borders.append(("h", cx, cy))
+        return borders
+
+    def _neighbor_clusters(self, cluster: ClusterKey) -> List[ClusterKey]:
+        neighbors = []
+        for kind, cx, cy in self._borders_of(cluster):
+            for other in ((cx, cy), (cx + 1, cy) if kind == "v" else (cx, cy + 1)):
+                if other != cluster:
+                    neighbors.append(other)
+        return neighbors
+
+    def _node_id(self, loc: Location) -> int:
+        node = self._node_ids.get(loc)
+        if node is None:
+            node = self._node_ids[loc] = len(self._node_locations)
+            self._node_locations.append(loc)
+            self._node_coordinates = None
+            self._node_slots.append(-1)
+            self._edges.append([])
+        return node
+
+    def _rebuild(self) -> None:
+        """
+        Recompute the entrances and intra-cluster edges invalidated by obstacle edits
+        """
+        if not self._dirty:
+            return
+
+        borders = set()
+        affected = set()
+        for cluster in self._dirty:
+            borders.update(self._borders_of(cluster))
+            affected.add(cluster)
+            affected.update(self._neighbor_clusters(cluster))
+        self._dirty.clear()
+
+        for border in borders:
+            self._build_border(border)
+        self._build_clusters(sorted(affected))
+
+    def _build_border(self, border: BorderKey) -> None:
+        self.stats.borders_rebuilt += 1
+        for a, b in self._transitions.pop(border, []):
+            self._partners[a].discard(b)
+            self._partners[b].discard(a)
+
+        kind, cx, cy = border
+        size = self._cluster_size
+        if kind == "v":
+            # Column x on the left cluster faces column x + 1 on the right cluster
+            x = (cx + 1) * size - 1
+            x0, y0, x1, y1 = self._bounds((cx, cy))
+            pairs = [(Location(x, y), Location(x + 1, y)) for y in range(y0, y1)]
+        else:
+            y = (cy + 1) * size - 1
+            x0, y0, x1, y1 = self._bounds((cx, cy))
+            pairs = [(Location(x, y), Location(x, y + 1)) for x in range(x0, x1)]
+
+        transitions = []
+        run: List[Tuple[Location, Location]] = []
+        for pair in pairs + [None]:
+            if pair is not None and self._passable(pair[0].x, pair[0].y) and self._passable(pair[1].x, pair[1].y):
+                run.append(pair)
+                continue
+            if run:
+                # Narrow entrances get one transition in the middle, wide ones one at each end
+                if len(run) <= self._max_entrance_width:
+                    transitions.append(run[len(run) // 2])
+                else:
+                    transitions.extend((run[0], run[-1]))
+                run = []
+
+        self._transitions[border] = transitions
+        for a, b in transitions:
+            self._partners.setdefault(a, set()).add(b)
+            self._partners.setdefault(b, set()).add(a)
+
+    def _cluster_nodes(self, cluster: ClusterKey) -> Set[Location]:
+        nodes = set()
+        for border in self._borders_of(cluster):
+            for pair in self._transitions.get(border, []):
+                nodes.update(loc for loc in pair if self._cluster_of(loc) == cluster)
+        return nodes
+
+    def _build_clusters(self, clusters: Sequence[ClusterKey]) -> None:
+        """
+        Relax the entrance distance fields of many clusters together; clusters are batched
+        by entrance count so that little padding is relaxed along with them
+        """
+        self.stats.clusters_rebuilt += len(clusters)
+        entrances = {cluster: sorted(self._cluster_nodes(cluster), key=lambda loc: (loc.x, loc.y)) for cluster in clusters}
+        cells = self._cluster_size ** 2
+        batch: List[ClusterKey] = []
+        for cluster in sorted(clusters, key=lambda c: len(entrances[c])):
+            if batch and (len(batch) + 1) * len(entrances[cluster]) * cells > BATCH_CELLS:
+                self._build_batch(batch, entrances)
+                batch = []
+            batch.append(cluster)
+        if batch:
+            self._build_batch(batch, entrances)
+
+    def _build_batch(self, batch: Sequence[ClusterKey], entrances: Dict[ClusterKey, List[Location]]) -> None:
+        size = self._cluster_size
+        # Cluster cells lead so that every row relaxed by a sweep is one contiguous block
+        distances = np.full((size, size, len(batch), max(len(entrances[c]) for c in batch)), INF, dtype=np.float32)
+        # Entering an obstacle, or the padding of a cluster cut off by the map edge, costs INF
+        entry_costs = np.full((size, size, len(batch), 1), INF, dtype=np.float32)
+        for i, cluster in enumerate(batch):
+            x0, y0, x1, y1 = self._bounds(cluster)
+            entry_costs[:y1 - y0, :x1 - x0, i, 0] = np.where(self._data[y0:y1, x0:x1] == Items.OBSTACLE, INF, 0)
+            for k, loc in enumerate(entrances[cluster]):
+                distances[loc.y - y0, loc.x - x0, i, k] = 0
+        _relax(distances, entry_costs)
+        steps = _descent_steps(distances)
+
+        for i, cluster in enumerate(batch):
+            x0, y0, x1, y1 = self._bounds(cluster)
+            locations = entrances[cluster]
+            for loc in self._entrances.get(cluster, []):
+                node = self._node_ids[loc]
+                self._edges[node] = []
+                self._node_slots[node] = -1
+
+            nodes = [self._node_id(loc) for loc in locations]
+            # costs[k][j] is the distance from entrance k to entrance j
+            costs = distances[[loc.y - y0 for loc in locations], [loc.x - x0 for loc in locations], i, :len(locations)]
+            for k, (loc, node, node_costs) in enumerate(zip(locations, nodes, costs.T.tolist())):
+                self._node_slots[node] = k
+                edges = [(other, cost) for other, cost in zip(nodes, node_costs) if other != node and cost < INF]
+                for partner in self._partners.get(loc, ()):
+                    edges.append((self._node_id(partner), SQRT_2 if loc.x != partner.x and loc.y != partner.y else 1))
+                self._edges[node] = edges
+            self._entrances[cluster] = locations
+            self._next_steps[cluster] = np.ascontiguousarray(steps[:y1 - y0, :x1 - x0, i, :len(locations)].transpose(2, 0, 1))
+
+    def _walk(self, cluster: ClusterKey, slot: int, start: Location) -> Optional[Tuple[List[Location], float]]:
+        """
+        Descend the distance field of one entrance of the cluster
+        :return: path from (excluding) start to (including) the entrance and its cost,
+            None if the entrance cannot be reached inside the cluster
+        """
+        steps = self._next_steps[cluster][slot]
+        x0, y0, _, _ = self._bounds(cluster)
+        x, y = start.x - x0, start.y - y0
+        direction = steps.item(y, x)
+        if direction < 0:
+            return ([], 0) if start == self._entrances[cluster][slot] else None
+
+        path = []
+        cost = 0
+        while direction >= 0:
+            dx, dy = NEIGHBOR_OFFSETS[direction]
+            x += dx
+            y += dy
+            cost += SQRT_2 if dx and dy else 1
+            path.append(Location(x + x0, y + y0))
+            direction = steps.item(y, x)
+        return path, cost
+
+    def _cluster_path(self, start: Location, goal: Location, bounds: Bounds) -> List[Location]:
+        """
+        ArrayAStar confined to one cluster; path excludes start and includes goal. A unit
+        cost layer gives the search the octile move costs (1, diagonals sqrt(2)) used here.
+        """
+        x0, y0, x1, y1 = bounds
+        offset = Location(x0, y0)
+        cluster = Costmap(rows=y1 - y0, cols=x1 - x0, robot=start - offset, goal=goal - offset,
+                          data=self._data[y0:y1, x0:x1])
+        cluster.set_cost_layer(np.ones((y1 - y0, x1 - x0)))
+        path = ArrayAStar(cluster, AStarHeuristics.octile, visualize=False).solve()
+        return [Location(loc.x + x0, loc.y + y0) for loc in path]
+
+    def solve(self, start: Optional[Location] = None, goal: Optional[Location] = None) -> Sequence[Location]:
+        """
+        :param start: start location, defaults to the costmap robot
+        :param goal: goal location, defaults to the costmap goal
+        :return: path from (excluding) start to (including) goal
+        """
+        start = start or self._costmap.robot
+        goal = goal or self._costmap.goal
+        if start == goal:
+            return []
+        self._rebuild()
+
+        # Start and goal take the two ids after the entrances for this query
+        start_node = len(self._node_locations)
+        goal_node = start_node + 1
+        start_cluster = self._cluster_of(start)
+        goal_cluster = self._cluster_of(goal)
+        refinements: Dict[Tuple[int, int], List[Location]] = {}
+
+        start_edges = []
+        for slot, loc in enumerate(self._entrances[start_cluster]):
+            walked = self._walk(start_cluster, slot, start)
+            if walked is not None:
+                node = self._node_ids[loc]
+                refinements[start_node, node], cost = walked
+                start_edges.append((node, cost))
+        # Walking from the goal to an entrance and reversing gives the path into the goal
+        goal_edges = {}
+        for slot, loc in enumerate(self._entrances[goal_cluster]):
+            walked = self._walk(goal_cluster, slot, goal)
+            if walked is not None:
+                node = self._node_ids[loc]
+                path, goal_edges[node] = walked
+                refinements[node, goal_node] = ([goal] + path[:-1])[::-1] if path else []
+        if start_cluster == goal_cluster:
+            try:
+                path = self._cluster_path(start, goal, self._bounds(start_cluster))
+            except Exception as e:
+                if str(e) != "Path does not exist!":
+                    raise
+            else:
+                refinements[start_node, goal_node] = path
+                start_edges.append((goal_node, sum(
+                    SQRT_2 if a.x != b.x and a.y != b.y else 1 for a, b in zip([start] + path, path)
+                )))
+
+        abstract_path = self._search_abstract(start, goal, start_edges, goal_edges)
+        if abstract_path is None:
+            self.stats.fallback_searches += 1
+            return JPS(self._costmap, visualize=False).solve(start, goal)
+        return self._refine(abstract_path, refinements)
+
+    def _search_abstract(
+            self,
+            start: Location,
+            goal: Location,
+            start_edges: List[Tuple[int, float]],
+            goal_edges: Dict[int, float]
+    ) -> Optional[List[int]]:
+        """
+        A* over node ids with the octile heuristic
+        :return: node ids from start to goal
+        """
+        start_node = len(self._node_locations)
+        goal_node = start_node + 1
+        if self._node_coordinates is None:
+            self._node_coordinates = np.array([(loc.x, loc.y) for loc in self._node_locations], dtype=float).reshape(-1, 2)
+        # Octile heuristic of every node at once; the start and goal ids come last
+        dx, dy = np.abs(self._node_coordinates - (goal.x, goal.y)).T
+        heuristic = (dx + dy + (SQRT_2 - 2) * np.minimum(dx, dy)).tolist() + [0, 0]
+        all_edges = self._edges
+
+        costs = [INF] * (goal_node + 1)
+        parents = [-1] * (goal_node + 1)
+        closed = bytearray(goal_node + 1)
+        costs[start_node] = 0
+        queue = [(0, start_node)]
+        expanded = 0
+        while queue:
+            _, node = heappop(queue)
+            if node == goal_node:
+                self.stats.abstract_nodes_expanded += expanded
+                path = [node]
+                while node != start_node:
+                    node = parents[node]
+                    path.append(node)
+                path.reverse()
+                return path
+            if closed[node]:
+                continue
+            closed[node] = 1
+            expanded += 1
+
+            if node == start_node:
+                edges = start_edges
+            elif node in goal_edges:
+                edges = all_edges[node] + [(goal_node, goal_edges[node])]
+            else:
+                edges = all_edges[node]
+            cost = costs[node]
+            for n, edge_cost in edges:
+                new_cost = cost + edge_cost
+                if new_cost < costs[n]:
+                    costs[n] = new_cost
+                    parents[n] = node
+                    heappush(queue, (new_cost + heuristic[n], n))
+        self.stats.abstract_nodes_expanded += expanded
+        return None
+
+    def _refine(self, abstract_path: List[int], refinements: Dict[Tuple[int, int], List[Location]]) -> List[Location]:
+        path = []
+        for a, b in zip(abstract_path, abstract_path[1:]):
+            if (a, b) in refinements:
+                path.extend(refinements[a, b])
+                continue
+            previous = self._node_locations[a]
+            node = self._node_locations[b]
+            cluster = self._cluster_of(node)
+            if self._cluster_of(previous) == cluster:
+                path.extend(self._walk(cluster, self._node_slots[b], previous)[0])
+            else:
+                # Transition across a cluster border
+                path.append(node)
+        return path
+
+
+if __name__ == "__main__":
+    costmap = generate_random_costmap(200, 300, 0.2)
+    hpa = HPAStar(costmap, cluster_size=20)
+    path = hpa.solve()
+    print(len(path), hpa.stats)
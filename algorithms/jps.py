@@ -0,0 +1,269 @@
+import re
+from heapq import heappush, heappop
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from attr import attrs, attrib
+
+from algorithms.astar import AStarHeuristics, SQRT_2, _xy_heuristic
+from algorithms.costmap import Costmap, EasyGIFWriter, Location, generate_random_costmap
+from algorithms.utils import Items, NEIGHBOR_OFFSETS
+
+
+# Codes of the straight-line scan tables: keep going, stop at a jump point, or stop at a wall
+_SCAN_OPEN = 0
+_SCAN_JUMP_POINT = 1
+_SCAN_BLOCKED = 2
+_SCAN_STOP = re.compile(bytes([ord("["), _SCAN_JUMP_POINT, _SCAN_BLOCKED, ord("]")]))
+
+
+def _straight_scan_codes(passable: 'Array[M,N]', goal: Location, dx: int) -> 'Array[M,N]':
+    """
+    For a horizontal move in direction dx, whether each cell is a wall, a jump point
+    (the goal or a cell with a forced neighbor) or open. Vertical moves use the transpose.
+    """
+    rows, cols = passable.shape
+    # Pad with walls so the off-map cells read as not walkable
+    padded = np.zeros((rows + 2, cols + 2), dtype=bool)
+    padded[1:-1, 1:-1] = passable
+
+    def shifted(dy: int, dx_: int) -> 'Array[M,N]':
+        return padded[1 + dy:rows + 1 + dy, 1 + dx_:cols + 1 + dx_]
+
+    forced = (~shifted(-1, 0) & shifted(-1, dx)) | (~shifted(1, 0) & shifted(1, dx))
+    forced[goal.y, goal.x] = True
+    codes = np.where(forced, _SCAN_JUMP_POINT, _SCAN_OPEN).astype(np.uint8)
+    codes[~passable] = _SCAN_BLOCKED
+    return codes
+
+
+def _sign(value: int) -> int:
+    return (value > 0) - (value < 0)
+
+
+def _octile_distance(dx: int, dy: int) -> float:
+    dx = abs(dx)
+    dy = abs(dy)
+    return dx + dy + (SQRT_2 - 2) * min(dx, dy)
+
+
+@attrs(auto_attribs=True)
+class JPS(object):
+    """
+    Jump Point Search (Harabor & Grastien, 2011) on the 8-connected grid. Instead of
+    pushing every neighbor, each expansion jumps in a straight line until it reaches a
+    node with a forced neighbor, so symmetric paths through open space are never queued.
+
+    Moves cost 1 and diagonal moves sqrt(2); as in Costmap.get_open_neighbors, diagonal
+    moves may pass between two obstacles. Returned paths are optimal under those costs
+    and list every cell, in the same format as AStar.
+    """
+    _costmap: Costmap
+    _heuristic: Callable[[Location, Location], float] = AStarHeuristics.octile
+    _start: Optional[Location] = None
+    _goal: Optional[Location] = None
+    _visualize: bool = True
+
+    _parent_map: Dict[int, int] = attrib(init=False, factory=dict)
+    _queue: List[Tuple[float, int]] = attrib(init=False, factory=list)
+    _cost_so_far: Dict[int, float] = attrib(init=False, factory=dict)
+    _closed: Set[int] = attrib(init=False, factory=set)
+
+    def __attrs_post_init__(self):
+        costmap = self._costmap
+        start = self._start or costmap.robot
+        goal = self._goal or costmap.goal
+        self._rows = costmap.rows
+        self._cols = costmap.cols
+        # One bytes object per row: fast scalar reads in the jump loops
+        passable = costmap.get_data() != Items.OBSTACLE
+        self._passable_rows = [row.tobytes() for row in passable]
+        # Straight jumps are a regex search over these rows (west and north rows reversed)
+        self._east_rows = [row.tobytes() for row in _straight_scan_codes(passable, goal, 1)]
+        self._west_rows = [row[::-1].tobytes() for row in _straight_scan_codes(passable, goal, -1)]
+        goal_transposed = Location(goal.y, goal.x)
+        self._south_cols = [col.tobytes() for col in _straight_scan_codes(passable.T, goal_transposed, 1)]
+        self._north_cols = [col[::-1].tobytes() for col in _straight_scan_codes(passable.T, goal_transposed, -1)]
+        self._flat = costmap.get_data().reshape(-1)
+        self._h = _xy_heuristic(self._heuristic, goal)
+
+        self._robot_index = costmap.robot.y * self._cols + costmap.robot.x
+        self._start_index = start.y * self._cols + start.x
+        self._goal_xy = (goal.x, goal.y)
+        self._goal_index = goal.y * self._cols + goal.x
+        self.nodes_expanded = 0
+
+        self._cost_so_far[self._start_index] = 0
+        heappush(self._queue, (0, self._start_index))
+
+    def _walkable(self, x: int, y: int) -> bool:
+        return 0 <= x < self._cols and 0 <= y < self._rows and self._passable_rows[y][x]
+
+    def _jump(self, x: int, y: int, dx: int, dy: int) -> Optional[Tuple[int, int]]:
+        """
+        Walk from (x, y) in direction (dx, dy) and return the first jump point, if any
+        """
+        if not dy:
+            if dx > 0:
+                return self._scan(self._east_rows[y], x + 1, x, y, 1, True)
+            return self._scan(self._west_rows[y], self._cols - x, x, y, -1, True)
+        if not dx:
+            if dy > 0:
+                return self._scan(self._south_cols[x], y + 1, x, y, 1, False)
+            return self._scan(self._north_cols[x], self._rows - y, x, y, -1, False)
+
+        walkable = self._walkable
+        while True:
+            x += dx
+            y += dy
+            if not walkable(x, y):
+                return None
+            if (x, y) == self._goal_xy:
+                return x, y
+            if (not walkable(x - dx, y) and walkable(x - dx, y + dy)) or \
+                    (not walkable(x, y - dy) and walkable(x + dx, y - dy)):
+                return x, y
+            # A diagonal step is a jump point when either straight sweep finds one
+            if self._jump(x, y, dx, 0) is not None or self._jump(x, y, 0, dy) is not None:
+                return x, y
+
+    @staticmethod
+    def _scan(line: bytes, position: int, x: int, y: int, direction: int, horizontal: bool) -> Optional[Tuple[int, int]]:
+        match = _SCAN_STOP.search(line, position)
+        if match is None or line[match.start()] == _SCAN_BLOCKED:
+            return None
+        # Distance travelled is the same in the forward and the reversed lines
+        distance = match.start() - position + 1
+        if horizontal:
+            return x + direction * distance, y
+        return x, y + direction * distance
+
+    def _directions(self, x: int, y: int, node: int) -> Sequence[Tuple[int, int]]:
+        """
+        Pruned set of directions to jump in from (x, y), given how it was reached
+        """
+        if node not in self._parent_map:
+            return NEIGHBOR_OFFSETS
+
+        py, px = divmod(self._parent_map[node], self._cols)
+        dx = _sign(x - px)
+        dy = _sign(y - py)
+        walkable = self._walkable
+        if dx and dy:
+            directions = [(0, dy), (dx, 0), (dx, dy)]
+            if not walkable(x - dx, y):
+                directions.append((-dx, dy))
+            if not walkable(x, y - dy):
+                directions.append((dx, -dy))
+        elif dx:
+            directions = [(dx, 0)]
+            if not walkable(x, y + 1):
+                directions.append((dx, 1))
+            if not walkable(x, y - 1):
+                directions.append((dx, -1))
+        else:
+            directions = [(0, dy)]
+            if not walkable(x + 1, y):
+                directions.append((1, dy))
+            if not walkable(x - 1, y):
+                directions.append((-1, dy))
+        return directions
+
+    def _mark(self, index: int, value: int) -> None:
+        """
+        Visualization write; goes through set_value only when someone listens to the costmap
+        """
+        if self._costmap.has_listeners():
+            self._costmap.set_value(Location(index % self._cols, index // self._cols), value)
+        else:
+            self._flat[index] = value
+
+    def step(self) -> Optional[Sequence[Location]]:
+        cols = self._cols
+        while self._queue:
+            _, current = heappop(self._queue)
+            if current == self._goal_index:
+                return self._build_path()
+            if current in self._closed:
+                # Stale duplicate of an already expanded node
+                continue
+
+            self._closed.add(current)
+            self.nodes_expanded += 1
+            if self._visualize and current != self._robot_index:
+                self._mark(current, Items.VISITED)
+
+            y, x = divmod(current, cols)
+            current_cost = self._cost_so_far[current]
+            for dx, dy in self._directions(x, y, current):
+                jump_point = self._jump(x, y, dx, dy)
+                if jump_point is None:
+                    continue
+                jx, jy = jump_point
+                n = jy * cols + jx
+                if n in self._closed:
+                    continue
+                new_cost = current_cost + _octile_distance(jx - x, jy - y)
+                if n not in self._cost_so_far or new_cost < self._cost_so_far[n]:
+                    self._cost_so_far[n] = new_cost
+                    heappush(self._queue, (new_cost + self._h(jx, jy), n))
+                    self._parent_map[n] = current
+
+                    # Mark costmap value for visualization
+                    if self._visualize and n != self._goal_index:
+                        self._mark(n, Items.CURRENT)
+            return None
+
+        raise Exception("Path does not exist!")
+
+    def solve(self, start: Optional[Location] = None, goal: Optional[Location] = None) -> Sequence[Location]:
+        """
+        Headless search that leaves the costmap untouched
+        :param start: start location, defaults to the costmap robot
+        :param goal: goal location, defaults to the costmap goal
+        :return: path from (excluding) start to (including) goal
+        """
+        jps = JPS(self._costmap, self._heuristic, start=start, goal=goal, visualize=False)
+        while True:
+            path = jps.step()
+            if path is not None:
+                return path
+
+    def _build_path(self) -> Sequence[Location]:
+        # Fill in the straight segments between consecutive jump points
+        cols = self._cols
+        path = []
+        current = self._goal_index
+        while current != self._start_index:
+            parent = self._parent_map[current]
+            y, x = divmod(current, cols)
+            py, px = divmod(parent, cols)
+            dx = _sign(px - x)
+            dy = _sign(py - y)
+            while (x, y) != (px, py):
+                path.append(Location(x, y))
+                x += dx
+                y += dy
+            current = parent
+        path.reverse()
+
+        if self._visualize:
+            for loc in path[:-1]:
+                self._mark(loc.y * cols + loc.x, Items.PARENT)
+        return path
+
+
+if __name__ == "__main__":
+    costmap = generate_random_costmap(20, 30, 0.2)
+    costmap.draw()
+
+    with EasyGIFWriter("jps.gif", scale_factor=10) as gif_writer:
+        jps = JPS(costmap)
+        while True:
+            path = jps.step()
+            im = costmap.draw(show=False)
+            gif_writer.write(im)
+            if path:
+                break
+
+    print(path)
@@ -0,0 +1,311 @@
+from heapq import heappush, heappop
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from attr import attrs, attrib
+
+from algorithms.costmap import Costmap, Location, generate_random_costmap
+from algorithms.utils import Items, NEIGHBOR_OFFSETS
+from algorithms.wavefront import UNREACHABLE, Wavefront
+
+# Staying put is an action like the 8 moves; every action takes one time step
+WAIT_AND_NEIGHBOR_OFFSETS = ((0, 0),) + tuple(NEIGHBOR_OFFSETS)
+
+INF = float("inf")
+
+
+@attrs(auto_attribs=True)
+class ReservationTable(object):
+    """
+    Space-time reservations of already planned robots on a grid of `cells` cells. Cells
+    are flat indices (y * cols + x); a cell at time t is stored as the single integer
+    t * cells + cell, and a move into a cell at time t as one integer as well, so the table
+    costs one set entry per robot per time step.
+    """
+    cells: int
+
+    _vertices: Set[int] = attrib(init=False, factory=set)
+    _moves: Set[int] = attrib(init=False, factory=set)
+    # Cell -> time from which a robot that reached its goal occupies it for good
+    _parked: Dict[int, int] = attrib(init=False, factory=dict)
+    # Cell -> last time it is reserved, parking aside
+    _last_reserved: Dict[int, int] = attrib(init=False, factory=dict)
+
+    def is_free(self, cell: int, t: int) -> bool:
+        return t * self.cells + cell not in self._vertices and self._parked.get(cell, INF) > t
+
+    def is_move_free(self, from_cell: int, to_cell: int, t: int) -> bool:
+        """
+        False when another robot makes the opposite move at the same time (a swap)
+        """
+        return (t * self.cells + to_cell) * self.cells + from_cell not in self._moves
+
+    def is_crossing_free(self, a: int, b: int, t: int) -> bool:
+        """
+        False when another robot moves between cells a and b, either way, at time t. A
+        diagonal move must not cross the opposite diagonal of its 2x2 block.
+        """
+        base = t * self.cells
+        return (base + a) * self.cells + b not in self._moves and (base + b) * self.cells + a not in self._moves
+
+    def can_park(self, cell: int, t: int) -> bool:
+        """
+        Whether a robot can stay in cell from time t on without being run into
+        """
+        return self._last_reserved.get(cell, -1) < t and self._parked.get(cell, INF) > t
+
+    def reserve(self, from_cell: int, to_cell: int, t: int) -> None:
+        """
+        Reserve a move (or a wait, with from_cell == to_cell) that arrives at time t
+        """
+        self._vertices.add(t * self.cells + to_cell)
+        self._moves.add((t * self.cells + from_cell) * self.cells + to_cell)
+        if self._last_reserved.get(to_cell, -1) < t:
+            self._last_reserved[to_cell] = t
+
+    def park(self, cell: int, t: int) -> None:
+        self._parked[cell] = min(t, self._parked.get(cell, t))
+
+
+@attrs(auto_attribs=True)
+class CooperativePlanner(object):
+    """
+    Prioritized multi-robot planning with cooperative A* (Silver, 2005). Robots are
+    planned one after another in the given order, each with an A* search in (x, y, t)
+    space that avoids the space-time reservations of the robots planned before it. Every
+    action, a move to one of the 8 neighbors or a wait, takes one time step. Robots may
+    not share a cell at the same time, swap cells or make crossing diagonal moves in the
+    same 2x2 block, and a robot that reaches its goal stays there. A robot without a path
+    stays at its start; when it sits on the path of a robot planned before it, planning
+    starts over with it parked there from the outset.
+
+    The default heuristic is the true number of moves to the goal ignoring other robots,
+    taken from Wavefront distance fields, which are cached per goal across plan() calls so
+    repeated ticks with the same goals only pay for the searches. Any Location heuristic
+    that does not overestimate the number of moves (e.g. AStarHeuristics.chebyshev) can be
+    used instead. A search gives up after max_delay time steps more than the heuristic
+    estimate at the start.
+
+    With a window (WHCA*) robots only plan and reserve the next `window` time steps;
+    call plan() again from the robots' new positions at least every window steps.
+    """
+    _costmap: Costmap
+    _heuristic: Optional[Callable[[Location, Location], float]] = None
+    _window: Optional[int] = None
+    _max_delay: int = 64
+    _max_fields: int = 128
+
+    nodes_expanded: int = attrib(init=False, default=0)
+    _wavefront: Wavefront = attrib(init=False)
+
+    def __attrs_post_init__(self):
+        self._wavefront = Wavefront(self._costmap, max_fields=self._max_fields)
+
+    def plan(
+            self,
+            starts: Sequence[Location],
+            goals: Sequence[Location],
+            start_time: int = 0
+    ) -> List[Optional[List[Location]]]:
+        """
+        :param starts: robot locations at start_time, in priority order
+        :param goals: one goal per robot
+        :param start_time: time of the starting positions
+        :return: per robot, its location at each following time step (waits repeat the
+            location) up to the goal or the end of the window; None for robots without a
+            path, which are then kept at their start
+        """
+        passable = (self._costmap.get_data() != Items.OBSTACLE).reshape(-1)
+        self.nodes_expanded = 0
+        # Robots known to have no path, parked at their starts before anyone plans
+        stuck: Set[int] = set()
+        while True:
+            paths, conflict = self._plan_in_order(passable, starts, goals, start_time, stuck)
+            if conflict is None:
+                return paths
+            stuck.add(conflict)
+
+    def _plan_in_order(
+            self,
+            passable: 'Array[N]',
+            starts: Sequence[Location],
+            goals: Sequence[Location],
+            start_time: int,
+            stuck: Set[int]
+    ) -> Tuple[List[Optional[List[Location]]], Optional[int]]:
+        """
+        :return: the paths, and the first robot found without a path whose start an earlier
+            robot passes through (None if there is none, else the paths are incomplete)
+        """
+        table = ReservationTable(self._costmap.rows * self._costmap.cols)
+        for robot in stuck:
+            table.park(self._cell(starts[robot]), start_time)
+        paths = []
+        for robot, (start, goal) in enumerate(zip(starts, goals)):
+            start_cell = self._cell(start)
+            if robot in stuck:
+                paths.append(None)
+                continue
+            path, parked = self._search(table, passable, start, goal, start_time)
+            if path is None:
+                if not table.can_park(start_cell, start_time):
+                    return paths, robot
+                table.park(start_cell, start_time)
+                paths.append(None)
+                continue
+
+            previous = start_cell
+            for t, loc in enumerate(path, start_time + 1):
+                cell = self._cell(loc)
+                table.reserve(previous, cell, t)
+                previous = cell
+            if parked:
+                table.park(previous, start_time + len(path))
+            paths.append(path)
+        return paths, None
+
+    def _cell(self, loc: Location) -> int:
+        return loc.y * self._costmap.cols + loc.x
+
+    def _heuristic_function(self, goal: Location) -> Callable[[int], float]:
+        """
+        :return: heuristic of a flat cell index, UNREACHABLE where the goal cannot be reached
+        """
+        cols = self._costmap.cols
+        if self._heuristic is None:
+            distances = self._wavefront.distance_field(goal).reshape(-1)
+            return distances.item
+        heuristic = self._heuristic
+        return lambda cell: heuristic(Location(cell % cols, cell // cols), goal)
+
+    def _search(
+            self,
+            table: ReservationTable,
+            passable: 'Array[N]',
+            start: Location,
+            goal: Location,
+            start_time: int
+    ) -> Tuple[Optional[List[Location]], bool]:
+        """
+        :return: the path (None if there is none) and whether it ends parked at the goal
+        """
+        rows = self._costmap.rows
+        cols = self._costmap.cols
+        cells = rows * cols
+        h = self._heuristic_function(goal)
+
+        start_cell = self._cell(start)
+        goal_cell = self._cell(goal)
+        start_h = h(start_cell)
+        if start_h == UNREACHABLE and self._heuristic is None:
+            return None, False
+        max_time = start_time + start_h + self._max_delay
+        window_end = INF if self._window is None else start_time + self._window
+
+        start_state = start_time * cells + start_cell
+        # State (t * cells + cell) -> previous state; the cost of a state is its time, so the
+        # first time a state is reached is the cheapest
+        parents: Dict[int, Optional[int]] = {start_state: None}
+        heap = [(start_h, start_h, start_time, start_cell)]
+        while heap:
+            _, _, t, cell = heappop(heap)
+            at_goal = cell == goal_cell and table.can_park(cell, t)
+            if at_goal or t >= window_end:
+                path = []
+                state = t * cells + cell
+                while state != start_state:
+                    path.append(Location(state % cols, state % cells // cols))
+                    state = parents[state]
+                path.reverse()
+                return path, at_goal
+            if t >= max_time:
+                continue
+            self.nodes_expanded += 1
+
+            y, x = divmod(cell, cols)
+            next_t = t + 1
+            for dx, dy in WAIT_AND_NEIGHBOR_OFFSETS:
+                nx = x + dx
+                ny = y + dy
+                if nx < 0 or ny < 0 or nx >= cols or ny >= rows:
+                    continue
+                n = ny * cols + nx
+                state = next_t * cells + n
+                if state in parents or not passable[n]:
+                    continue
+                if not table.is_free(n, next_t) or not table.is_move_free(cell, n, next_t):
+                    continue
+                if dx and dy and not table.is_crossing_free(y * cols + nx, ny * cols + x, next_t):
+                    continue
+                n_h = h(n)
+                if n_h == UNREACHABLE and self._heuristic is None:
+                    continue
+                parents[state] = t * cells + cell
+                heappush(heap, (next_t - start_time + n_h, n_h, next_t, n))
+
+        return None, False
+
+
+def find_collisions(
+        starts: Sequence[Location],
+        paths: Sequence[Optional[Sequence[Location]]]
+) -> List[Tuple[int, int, int]]:
+    """
+    Check time-indexed paths (as returned by CooperativePlanner.plan) against each other.
+    Robots stay at their last location (their start when the path is None) after their
+    path ends.
+    :return: (time, robot, other robot) for every shared cell, swap or crossing of
+        diagonal moves
+    """
+    trajectories = [[start] + list(path or ()) for start, path in zip(starts, paths)]
+    duration = max(len(trajectory) for trajectory in trajectories)
+
+    def at(trajectory: List[Location], t: int) -> Location:
+        return trajectory[min(t, len(trajectory) - 1)]
+
+    collisions = []
+    for t in range(duration):
+        occupied: Dict[Location, int] = {}
+        moves: Dict[Tuple[Location, Location], int] = {}
+        for robot, trajectory in enumerate(trajectories):
+            loc = at(trajectory, t)
+            if loc in occupied:
+                collisions.append((t, occupied[loc], robot))
+            occupied[loc] = robot
+            if t == 0:
+                continue
+            previous = at(trajectory, t - 1)
+            if previous == loc:
+                continue
+            # The opposite move is a swap; for a diagonal move, either move along the other
+            # diagonal of the 2x2 block crosses it
+            crossing = [(loc, previous)]
+            if previous.x != loc.x and previous.y != loc.y:
+                a = Location(loc.x, previous.y)
+                b = Location(previous.x, loc.y)
+                crossing += [(a, b), (b, a)]
+            for move in crossing:
+                if move in moves:
+                    collisions.append((t, moves[move], robot))
+            moves[(previous, loc)] = robot
+    return collisions
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    costmap = generate_random_costmap(500, 500, 0.2)
+    free = np.argwhere(costmap.get_data() == Items.OPEN)
+    picks = free[np.random.choice(len(free), 200, replace=False)]
+    starts = [Location(int(x), int(y)) for y, x in picks[:100]]
+    goals = [Location(int(x), int(y)) for y, x in picks[100:]]
+
+    planner = CooperativePlanner(costmap, window=32)
+    for tick in range(3):
+        start_time = time.perf_counter()
+        paths = planner.plan(starts, goals)
+        print(f"tick {tick}: {time.perf_counter() - start_time:.3f}s, {planner.nodes_expanded} expanded, "
+              f"{len(find_collisions(starts, paths))} collisions, {sum(path is None for path in paths)} stuck")
+        # Robots follow their plans for half a window before replanning
+        starts = [path[min(15, len(path) - 1)] if path else start for start, path in zip(starts, paths)]
@@ -0,0 +1,82 @@
+from heapq import heappush, heappop
+from typing import Any, Dict, Hashable, Iterator, List, Tuple
+
+from attr import attrs, attrib
+
+
+@attrs(auto_attribs=True)
+class OpenListStats(object):
+    """ Counters of one search's open list """
+    pushes: int = 0
+    pops: int = 0
+    stale_pops: int = 0
+
+
+@attrs(auto_attribs=True)
+class OpenList(object):
+    """
+    Single-threaded priority queue for A*-style open lists, built on heapq.
+
+    Decrease-key is done by lazy deletion: pushing an item that is already queued records
+    its new priority and leaves the old heap entry behind, which pop() discards when it
+    surfaces. Membership tests and the live item count are O(1). Ties on priority are
+    broken by comparing the items themselves, as queue.PriorityQueue does.
+    """
+    _heap: List[Tuple[float, Any]] = attrib(init=False, factory=list)
+    _priorities: Dict[Hashable, float] = attrib(init=False, factory=dict)
+    stats: OpenListStats = attrib(init=False, factory=OpenListStats)
+
+    def push(self, item: Hashable, priority: float) -> None:
+        """
+        Insert the item, or move it to a new priority if it is already queued
+        """
+        self._priorities[item] = priority
+        heappush(self._heap, (priority, item))
+        self.stats.pushes += 1
+
+    def pop(self) -> Hashable:
+        """
+        Remove and return the item with the lowest priority
+        """
+        while self._heap:
+            priority, item = heappop(self._heap)
+            if self._priorities.get(item) == priority:
+                del self._priorities[item]
+                self.stats.pops += 1
+                return item
+            # Superseded by a later push, or already popped
+            self.stats.stale_pops += 1
+        raise IndexError("pop from an empty open list")
+
+    def peek(self) -> Tuple[Hashable, float]:
+        """
+        The item pop() would return next, with its priority, without removing it
+        """
+        while self._heap:
+            priority, item = self._heap[0]
+            if self._priorities.get(item) == priority:
+                return item, priority
+            heappop(self._heap)
+            self.stats.stale_pops += 1
+        raise IndexError("peek at an empty open list")
+
+    def remove(self, item: Hashable) -> None:
+        """
+        Remove a queued item; its heap entry is discarded lazily
+        """
+        del self._priorities[item]
+
+    def priority(self, item: Hashable) -> float:
+        return self._priorities[item]
+
+    def __iter__(self) -> Iterator[Hashable]:
+        """
+        The queued items, in no particular order
+        """
+        return iter(self._priorities)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._priorities
+
+    def __len__(self) -> int:
+        return len(self._priorities)
@@ -0,0 +1,145 @@
+from collections.abc import Sequence as SequenceABC
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from algorithms.costmap import Location
+
+
+def index_dtype(rows: int, cols: int) -> type:
+    """
+    Smallest of int32 / int64 that holds every flat index of a rows x cols map
+    """
+    return np.int32 if rows * cols <= np.iinfo(np.int32).max else np.int64
+
+
+class PackedPath(SequenceABC):
+    """
+    A path stored as one packed y * cols + x integer per cell (int32 unless the map is
+    too large for it) instead of a list of Location objects: 4 bytes per cell rather than
+    about a hundred. It reads like the usual path, a sequence of Locations supporting len,
+    indexing, slicing (which returns a PackedPath view), iteration and equality with lists
+    of Locations, so code written for list paths keeps working.
+
+    The indices are a read-only NumPy array. They are exposed without copying through
+    np.asarray(path), memoryview(path.indices) (or memoryview(path) on Python 3.12+) and
+    pickle protocol 5 out-of-band buffers; PackedPath.frombuffer wraps received bytes
+    without copying them.
+    """
+
+    __slots__ = ("_indices", "cols")
+
+    def __init__(self, indices: Union['Array[N]', Sequence[int]], cols: int):
+        indices = np.asarray(indices)
+        if indices.ndim != 1 or not np.issubdtype(indices.dtype, np.integer):
+            raise ValueError("A packed path needs a 1-D integer index array")
+        # A read-only view, so the caller's array stays writable
+        self._indices = indices.view()
+        self._indices.flags.writeable = False
+        self.cols = cols
+
+    @classmethod
+    def from_locations(cls, locations: Iterable[Location], rows: int, cols: int) -> 'PackedPath':
+        return cls(np.array([loc.y * cols + loc.x for loc in locations], dtype=index_dtype(rows, cols)), cols)
+
+    @classmethod
+    def frombuffer(cls, buffer: Any, cols: int, dtype: type = np.int32) -> 'PackedPath':
+        """
+        Wrap the bytes of PackedPath.indices (e.g. received from another process) without copying
+        """
+        return cls(np.frombuffer(buffer, dtype=dtype), cols)
+
+    @property
+    def indices(self) -> 'Array[N]':
+        return self._indices
+
+    @property
+    def xs(self) -> 'Array[N]':
+        return self._indices % self.cols
+
+    @property
+    def ys(self) -> 'Array[N]':
+        return self._indices // self.cols
+
+    @property
+    def nbytes(self) -> int:
+        return self._indices.nbytes
+
+    def to_array(self) -> 'Array[N,2]':
+        """
+        :return: (N, 2) array of (x, y) rows, same dtype as the indices
+        """
+        return np.stack([self.xs, self.ys], axis=1)
+
+    def tolist(self) -> List[Location]:
+        return list(self)
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[Location, 'PackedPath']:
+        if isinstance(item, slice):
+            return PackedPath(self._indices[item], self.cols)
+        index = int(self._indices[item])
+        return Location(index % self.cols, index // self.cols)
+
+    def __iter__(self) -> Iterator[Location]:
+        cols = self.cols
+        for index in self._indices.tolist():
+            yield Location(index % cols, index // cols)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, PackedPath):
+            return self.cols == other.cols and np.array_equal(self._indices, other._indices)
+        if isinstance(other, SequenceABC) and not isinstance(other, (str, bytes)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"PackedPath({self.tolist()}, cols={self.cols})"
+
+    def __array__(self, dtype: Optional[type] = None, copy: Optional[bool] = None) -> 'Array[N]':
+        if copy or (dtype is not None and dtype != self._indices.dtype):
+            return self._indices.astype(dtype or self._indices.dtype)
+        return self._indices
+
+    def __buffer__(self, flags: int) -> memoryview:
+        # Buffer protocol for Python classes (PEP 688, Python 3.12+)
+        return memoryview(self._indices)
+
+    def __reduce__(self):
+        return PackedPath, (self._indices, self.cols)
+
+
+def trace_packed_path(parents: 'Array[N]', start: int, goal: int, cols: int) -> PackedPath:
+    """
+    trace_index_path producing a PackedPath, without creating a Location per cell
+    :return: path from (excluding) start to (including) goal
+    """
+    indices = []
+    current = goal
+    while current != start:
+        indices.append(current)
+        current = parents.item(current)
+    indices.reverse()
+    return PackedPath(np.array(indices, dtype=index_dtype(len(parents) // cols, cols)), cols)
+
+
+if __name__ == "__main__":
+    import pickle
+    import sys
+
+    from algorithms.astar import AStar
+    from algorithms.costmap import generate_random_costmap
+
+    costmap = generate_random_costmap(1000, 1000, 0.1)
+    costmap.set_robot(Location(0, 0))
+    costmap.set_goal(Location(999, 999))
+    path = AStar(costmap).solve()
+    packed = AStar(costmap).solve(packed=True)
+    assert packed == path
+    print(f"{len(path)} cells: list pickle {len(pickle.dumps(path))} bytes, "
+          f"packed pickle {len(pickle.dumps(packed, protocol=5))} bytes, packed indices {packed.nbytes} bytes")
+    print(sys.getsizeof(path) + sum(sys.getsizeof(loc) for loc in path), "bytes of list and Location objects")
@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from typing import Callable, FrozenSet, Optional, Sequence, Tuple
+
+from attr import attrs, attrib
+
+from algorithms.astar import AStar, AStarHeuristics
+from algorithms.costmap import Costmap, Location, generate_random_costmap
+from algorithms.utils import Items
+
+# (start, goal, planner, heuristic)
+PathKey = Tuple[Location, Location, type, Optional[Callable[[Location, Location], float]]]
+
+
+@attrs(auto_attribs=True, slots=True)
+class _Entry(object):
+    version: int
+    # None when the planner found no path
+    path: Optional[Tuple[Location, ...]]
+    # Start and path cells, for validate=True
+    cells: FrozenSet[Location]
+
+
+@attrs(auto_attribs=True)
+class PathCache(object):
+    """
+    Memoizes headless solve() results of BFS, AStar or any planner built as
+    planner(costmap[, heuristic]) with a solve(start, goal) method, per (Costmap.version,
+    start, goal, planner, heuristic), keeping the max_entries most recently used. Failed
+    searches are cached too and raise again.
+
+    By default a version bump makes every cached result stale. With validate=True a result
+    from an older version is checked against Costmap.changes_since instead: a path is kept
+    when no obstacle appeared on its cells, a failure when no obstacle was removed. Kept
+    paths are collision-free but may no longer be the shortest once an obstacle has been
+    removed. Changes not tied to cells (bulk_edit, bump_version, cost layers) still
+    invalidate everything.
+    """
+    _costmap: Costmap
+    _max_entries: int = 128
+    _validate: bool = False
+
+    hits: int = attrib(init=False, default=0)
+    misses: int = attrib(init=False, default=0)
+    _entries: 'OrderedDict[PathKey, _Entry]' = attrib(init=False, factory=OrderedDict)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def solve(
+            self,
+            planner: type = AStar,
+            start: Optional[Location] = None,
+            goal: Optional[Location] = None,
+            heuristic: Optional[Callable[[Location, Location], float]] = None
+    ) -> Sequence[Location]:
+        """
+        :param planner: planner class, e.g. AStar or BFS
+        :param start: start location, defaults to the costmap robot
+        :param goal: goal location, defaults to the costmap goal
+        :param heuristic: passed to the planner when given; part of the cache key
+        :return: path from (excluding) start to (including) goal
+        """
+        start = start or self._costmap.robot
+        goal = goal or self._costmap.goal
+        key = (start, goal, planner, heuristic)
+        version = self._costmap.version
+
+        entry = self._entries.get(key)
+        if entry is not None and (entry.version == version or self._still_valid(entry)):
+            self.hits += 1
+            entry.version = version
+            self._entries.move_to_end(key)
+            if entry.path is None:
+                raise Exception("Path does not exist!")
+            return list(entry.path)
+
+        self.misses += 1
+        search = planner(self._costmap) if heuristic is None else planner(self._costmap, heuristic)
+        try:
+            path = search.solve(start, goal)
+        except Exception:
+            self._store(key, _Entry(version, None, frozenset()))
+            raise
+        cells = frozenset((start, *path)) if self._validate else frozenset()
+        self._store(key, _Entry(version, tuple(path), cells))
+        return path
+
+    def _still_valid(self, entry: _Entry) -> bool:
+        if not self._validate:
+            return False
+        changed = self._costmap.changes_since(entry.version)
+        if changed is None:
+            return False
+        data = self._costmap.get_data()
+        for loc in changed:
+            is_obstacle = data[loc.y, loc.x] == Items.OBSTACLE
+            if entry.path is None and not is_obstacle:
+                # A removed obstacle may connect what could not be reached before
+                return False
+            if is_obstacle and loc in entry.cells:
+                return False
+        return True
+
+    def _store(self, key: PathKey, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+
+if __name__ == "__main__":
+    import time
+
+    costmap = generate_random_costmap(300, 400, 0.2)
+    cache = PathCache(costmap, validate=True)
+    docks = [Location(0, y) for y in range(0, 300, 60)]
+    shelves = [Location(399, y) for y in range(0, 300, 60)]
+
+    for attempt in range(2):
+        start_time = time.perf_counter()
+        for dock in docks:
+            for shelf in shelves:
+                try:
+                    cache.solve(AStar, dock, shelf, AStarHeuristics.octile)
+                except Exception:
+                    pass
+        print(f"pass {attempt}: {time.perf_counter() - start_time:.3f}s")
+
+    costmap.set_value(Location(200, 150), Items.OBSTACLE)
+    for dock in docks:
+        for shelf in shelves:
+            try:
+                cache.solve(AStar, dock, shelf, AStarHeuristics.octile)
+            except Exception:
+                pass
+    print(f"after an edit: {cache.hits} hits, {cache.misses} misses")
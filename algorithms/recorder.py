@@ -0,0 +1,111 @@
+from typing import Iterator, List, Tuple
+
+import numpy as np
+from attr import attrs, attrib
+
+from algorithms.costmap import Costmap, EasyGIFWriter, Location, generate_random_costmap
+
+# Cells written during one step: flat indices (y * cols + x) and the last item written to each
+Delta = Tuple['Array[K]', 'Array[K]']
+
+
+@attrs(auto_attribs=True)
+class SearchRecorder(object):
+    """
+    Records a search as per-step deltas instead of full redraws.
+
+    The recorder listens to the costmap and repaints only the written cells of one
+    persistent RGB canvas, so capturing a frame costs as much as the cells the planner
+    touched during that step rather than a full colorization of the grid. Each capture()
+    also stores the step's (cell index, new item) delta, which replay() and write_gif()
+    turn back into frames later. Writes made directly to Costmap.get_data() are not seen.
+    """
+    _costmap: Costmap
+
+    deltas: List[Delta] = attrib(init=False, factory=list)
+    _initial_data: 'Array[M,N]' = attrib(init=False)
+    _canvas: 'Array[M,N,3]' = attrib(init=False)
+    _flat_canvas: 'Array[M*N,3]' = attrib(init=False)
+    _colors: 'Array[256,3]' = attrib(init=False)
+    _indices: List[int] = attrib(init=False, factory=list)
+    _items: List[int] = attrib(init=False, factory=list)
+
+    def __attrs_post_init__(self):
+        self._initial_data = self._costmap.get_data().copy()
+        self._colors = self._costmap.get_color_lookup()
+        self._canvas = self._colors[self._initial_data]
+        self._flat_canvas = self._canvas.reshape(-1, 3)
+        self._costmap.add_listener(self._on_cell_changed)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stop listening to the costmap; cells written since the last capture() are kept as a final delta
+        """
+        if self._indices:
+            self._flush()
+        self._costmap.remove_listener(self._on_cell_changed)
+
+    def _on_cell_changed(self, loc: Location, old_value: int, new_value: int) -> None:
+        index = (loc.y % self._costmap.rows) * self._costmap.cols + loc.x % self._costmap.cols
+        self._flat_canvas[index] = self._colors[new_value]
+        self._indices.append(index)
+        self._items.append(new_value)
+
+    def _flush(self) -> None:
+        indices = np.array(self._indices, dtype=np.int64)
+        items = np.array(self._items, dtype=np.uint8)
+        # Keep only the last write to each cell
+        _, last_reversed = np.unique(indices[::-1], return_index=True)
+        keep = np.sort(len(indices) - 1 - last_reversed)
+        self.deltas.append((indices[keep], items[keep]))
+        self._indices.clear()
+        self._items.clear()
+
+    def capture(self) -> 'Array[M,N,3]':
+        """
+        End the current step and return the canvas. The canvas is updated in place by
+        later steps; copy it to keep this frame.
+        """
+        self._flush()
+        return self._canvas
+
+    def replay(self) -> Iterator['Array[M,N,3]']:
+        """
+        Rebuild the captured frames from the initial grid and the deltas. Each yielded frame
+        is the same array, updated in place.
+        """
+        canvas = self._colors[self._initial_data]
+        flat_canvas = canvas.reshape(-1, 3)
+        for indices, items in self.deltas:
+            flat_canvas[indices] = self._colors[items]
+            yield canvas
+
+    def write_gif(self, file_path: str, **writer_kwargs) -> None:
+        """
+        Replay the recording into a streaming EasyGIFWriter
+        """
+        with EasyGIFWriter(file_path, streaming=True, **writer_kwargs) as gif_writer:
+            for frame in self.replay():
+                gif_writer.write(frame)
+
+
+if __name__ == "__main__":
+    from algorithms.astar import AStar
+
+    costmap = generate_random_costmap(200, 300, 0.3)
+    with SearchRecorder(costmap) as recorder:
+        astar = AStar(costmap)
+        while True:
+            path = astar.step()
+            recorder.capture()
+            if path:
+                break
+
+    print(len(recorder.deltas), "steps,", sum(len(indices) for indices, _ in recorder.deltas), "cell writes")
+    recorder.write_gif("astar_replay.gif", scale_factor=2)
@@ -0,0 +1,201 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, Future
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from attr import attrs, attrib
+
+from algorithms.astar import ArrayAStar, AStarHeuristics
+from algorithms.costmap import Costmap, Location, generate_random_costmap
+
+# (Costmap.version, start, goal)
+SearchKey = Tuple[int, Location, Location]
+
+
+class PlanStatus:
+    OK = "ok"
+    NO_PATH = "no_path"
+    TIMEOUT = "timeout"
+
+
+@attrs(auto_attribs=True)
+class PlanResult(object):
+    status: str
+    # The path when OK; on TIMEOUT the partial path towards the goal found so far, if any
+    path: Optional[Sequence[Location]]
+    # Seconds this request waited
+    elapsed: float
+
+
+@attrs(auto_attribs=True)
+class _Search(object):
+    engine: ArrayAStar
+    cancel: threading.Event
+    task: Optional[asyncio.Task] = None
+    waiters: int = 0
+    # Executor mode: the engine belongs to the worker thread while it steps, and partial
+    # paths are requested from it through snapshots (both guarded by lock)
+    lock: threading.Lock = attrib(factory=threading.Lock)
+    stepping: bool = False
+    snapshots: List[Future] = attrib(factory=list)
+
+
+def _answer_snapshots(search: _Search) -> None:
+    with search.lock:
+        snapshots = search.snapshots
+        search.snapshots = []
+    for snapshot in snapshots:
+        try:
+            snapshot.set_result(search.engine.partial_path())
+        except Exception as e:
+            snapshot.set_exception(e)
+
+
+def _step_until_cancelled(search: _Search, steps_per_check: int) -> Optional[Sequence[Location]]:
+    with search.lock:
+        if search.cancel.is_set():
+            return None
+        search.stepping = True
+    try:
+        while not search.cancel.is_set():
+            for _ in range(steps_per_check):
+                path = search.engine.step()
+                if path is not None:
+                    return path
+            _answer_snapshots(search)
+        return None
+    finally:
+        with search.lock:
+            search.stepping = False
+        _answer_snapshots(search)
+
+
+@attrs(auto_attribs=True)
+class PlanningService(object):
+    """
+    Asyncio front end to headless A* searches (ArrayAStar) on one costmap.
+
+    By default a search runs on the event loop and yields to other tasks every
+    steps_per_yield step() calls, so a large search never blocks the loop for long. With an
+    executor (e.g. a ThreadPoolExecutor) it runs there instead and checks for cancellation
+    every steps_per_yield steps; partial paths are then read by that thread between batches.
+
+    Concurrent requests for the same (start, goal) on the same Costmap.version share one
+    search. Each request has its own timeout: a request that runs out of time gets a
+    TIMEOUT result with the partial path found so far, and the search is cancelled once no
+    request is waiting for it. Edit the costmap between searches only; searches read it live.
+    """
+    _costmap: Costmap
+    _heuristic: Callable[[Location, Location], float] = AStarHeuristics.euclidean
+    _steps_per_yield: int = 256
+    _executor: Optional[Executor] = None
+
+    searches_started: int = attrib(init=False, default=0)
+    requests_coalesced: int = attrib(init=False, default=0)
+    _searches: Dict[SearchKey, _Search] = attrib(init=False, factory=dict)
+
+    @property
+    def active_searches(self) -> int:
+        return len(self._searches)
+
+    async def plan(
+            self,
+            start: Optional[Location] = None,
+            goal: Optional[Location] = None,
+            timeout: Optional[float] = None
+    ) -> PlanResult:
+        """
+        :param start: start location, defaults to the costmap robot
+        :param goal: goal location, defaults to the costmap goal
+        :param timeout: seconds to wait for the path, None waits until the search ends
+        """
+        start = start or self._costmap.robot
+        goal = goal or self._costmap.goal
+        begin = perf_counter()
+        key = (self._costmap.version, start, goal)
+        search = self._searches.get(key)
+        if search is None:
+            search = self._start(key, start, goal)
+        else:
+            self.requests_coalesced += 1
+
+        search.waiters += 1
+        try:
+            path = await asyncio.wait_for(asyncio.shield(search.task), timeout)
+            return PlanResult(PlanStatus.OK, path, perf_counter() - begin)
+        except asyncio.TimeoutError:
+            path = await self._partial_path(search)
+            return PlanResult(PlanStatus.TIMEOUT, path, perf_counter() - begin)
+        except Exception as e:
+            if str(e) != "Path does not exist!":
+                raise
+            return PlanResult(PlanStatus.NO_PATH, None, perf_counter() - begin)
+        finally:
+            search.waiters -= 1
+            if search.waiters == 0 and not search.task.done():
+                search.cancel.set()
+                search.task.cancel()
+                self._forget(key, search)
+
+    def _start(self, key: SearchKey, start: Location, goal: Location) -> _Search:
+        engine = ArrayAStar(self._costmap, self._heuristic, start=start, goal=goal, visualize=False)
+        search = _Search(engine, threading.Event())
+        search.task = asyncio.ensure_future(self._run(search))
+        search.task.add_done_callback(lambda task: self._finished(key, search))
+        self._searches[key] = search
+        self.searches_started += 1
+        return search
+
+    async def _run(self, search: _Search) -> Optional[Sequence[Location]]:
+        if self._executor is not None:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, _step_until_cancelled, search, self._steps_per_yield
+            )
+        while True:
+            for _ in range(self._steps_per_yield):
+                path = search.engine.step()
+                if path is not None:
+                    return path
+            await asyncio.sleep(0)
+
+    async def _partial_path(self, search: _Search) -> Optional[Sequence[Location]]:
+        """
+        Partial path of a search that may still be stepping in an executor thread, read by
+        that thread between batches so it never sees a half-updated search state
+        """
+        with search.lock:
+            if not search.stepping:
+                # Not started or done; holding the lock keeps the worker from starting meanwhile
+                return search.engine.partial_path()
+            snapshot = Future()
+            search.snapshots.append(snapshot)
+        return await asyncio.wrap_future(snapshot)
+
+    def _finished(self, key: SearchKey, search: _Search) -> None:
+        self._forget(key, search)
+        if not search.task.cancelled():
+            # Retrieve the exception so an unawaited failure is not logged
+            search.task.exception()
+
+    def _forget(self, key: SearchKey, search: _Search) -> None:
+        if self._searches.get(key) is search:
+            del self._searches[key]
+
+
+if __name__ == "__main__":
+    import random
+
+    async def burst(service: PlanningService, costmap: Costmap) -> None:
+        goals = [Location(random.randrange(costmap.cols), random.randrange(costmap.rows)) for _ in range(10)]
+        # 100 requests over 10 distinct goals
+        requests = [service.plan(goal=random.choice(goals), timeout=0.5) for _ in range(100)]
+        results = await asyncio.gather(*requests)
+        statuses = [result.status for result in results]
+        latencies = sorted(result.elapsed for result in results)
+        print(f"{service.searches_started} searches for {len(results)} requests, "
+              f"{statuses.count(PlanStatus.OK)} ok, {statuses.count(PlanStatus.TIMEOUT)} timed out, "
+              f"p99 latency {latencies[98] * 1000:.0f} ms")
+
+    costmap = generate_random_costmap(300, 300, 0.2)
+    asyncio.run(burst(PlanningService(costmap, AStarHeuristics.octile), costmap))
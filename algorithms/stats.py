@@ -0,0 +1,45 @@
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
+
+import attr
+from attr import attrs
+
+from algorithms.costmap import Location
+
+# Called after every expansion with the expanded location and the search's stats (None
+# when the planner was built without them)
+StepHook = Callable[[Location, Optional['SearchStats']], None]
+
+
+@attrs(auto_attribs=True)
+class SearchStats(object):
+    """
+    Counters and per-phase timings of one step() search. Pass an instance to BFS, DFS or
+    AStar to enable them; planners constructed without one skip all instrumentation.
+    Times are in seconds and measured with time.perf_counter.
+    """
+    nodes_expanded: int = 0
+    # Neighbors pushed onto the open list, including re-pushes
+    nodes_generated: int = 0
+    # Pushes of a node that was already queued (A* decrease-keys, BFS/DFS goal re-pushes). No
+    # node is ever reopened: expanded nodes are closed for good
+    nodes_requeued: int = 0
+    open_list_peak: int = 0
+    neighbor_time: float = 0.0
+    heuristic_time: float = 0.0
+    queue_time: float = 0.0
+    # Whole step() calls; the remainder after the phases is bookkeeping and costmap marking
+    step_time: float = 0.0
+
+    def as_dict(self) -> Dict[str, Union[int, float]]:
+        return attr.asdict(self)
+
+
+def run_search(planner) -> Tuple[Sequence[Location], Optional[SearchStats]]:
+    """
+    Step a planner until it returns a path
+    :return: the path and the planner's stats (None when it was built without them)
+    """
+    while True:
+        path = planner.step()
+        if path is not None:
+            return path, planner.stats
@@ -0,0 +1,143 @@
+from typing import Optional, Union
+
+import numpy as np
+
+from algorithms.costmap import Costmap, generate_random_costmap
+from algorithms.utils import Items
+
+INF = float("inf")
+
+
+def _cost_layer(costmap: Costmap) -> 'Array[M,N]':
+    costs = costmap.get_cost_layer()
+    if costs is None:
+        costmap.set_cost_layer(np.ones((costmap.rows, costmap.cols)))
+        costs = costmap.get_cost_layer()
+    return costs
+
+
+def paint_costs(costmap: Costmap, mask: 'Array[M,N]', cost: Union[float, 'Array[M,N]']) -> None:
+    """
+    Set the terrain cost of every cell in mask, creating a uniform (all 1) layer first if
+    the costmap has none
+    :param mask: boolean array shaped like the costmap
+    :param cost: one cost for all masked cells, or an array shaped like the costmap (e.g. a ramp)
+    """
+    costs = _cost_layer(costmap)
+    np.copyto(costs, cost, where=np.asarray(mask, dtype=bool))
+    costmap.bump_version()
+
+
+def _squared_distance_1d(f: 'Array[M,N]') -> 'Array[M,N]':
+    """
+    Exact 1-D squared distance transform of every row, min over q of (x - q)^2 + f[:, q],
+    as the lower envelope of parabolas (Felzenszwalb & Huttenlocher, 2012). Linear in the
+    row length; the rows are processed together, so the Python loop is over columns only.
+    f must be finite (use a large value for "no obstacle").
+    """
+    rows, cols = f.shape
+    all_rows = np.arange(rows)
+    # Per row: positions of the envelope's parabolas and the boundaries between them
+    v = np.zeros((rows, cols), dtype=np.int64)
+    z = np.empty((rows, cols + 1))
+    z[:, 0] = -INF
+    z[:, 1] = INF
+    k = np.zeros(rows, dtype=np.int64)
+    for q in range(1, cols):
+        fq = f[:, q] + q * q
+        pending = all_rows
+        while len(pending):
+            kp = k[pending]
+            vk = v[pending, kp]
+            s = (fq[pending] - (f[pending, vk] + vk * vk)) / (2 * (q - vk))
+            hidden = s <= z[pending, kp]
+            # The new parabola hides the last one: drop it and intersect with the one before
+            done = pending[~hidden]
+            k[done] += 1
+            v[done, k[done]] = q
+            z[done, k[done]] = s[~hidden]
+            z[done, k[done] + 1] = INF
+            pending = pending[hidden]
+            k[pending] -= 1
+
+    squared = np.empty_like(f)
+    k[:] = 0
+    for x in range(cols):
+        while True:
+            ahead = z[all_rows, k + 1] < x
+            if not ahead.any():
+                break
+            k[ahead] += 1
+        vk = v[all_rows, k]
+        squared[:, x] = (x - vk) ** 2 + f[all_rows, vk]
+    return squared
+
+
+def obstacle_distance(data: 'Array[M,N]', max_distance: Optional[float] = None) -> 'Array[M,N]':
+    """
+    Euclidean distance from every cell to the nearest obstacle cell (0 on obstacles), inf
+    where there is none. Computed separably: a vectorized per-column scan for the vertical
+    distance, then a per-row minimum of dx^2 + dy^2. With max_distance only horizontal shifts
+    up to it are tried (cheap for small radii) and distances beyond it come out as inf;
+    without it the rows get an exact linear-time distance transform.
+    """
+    rows, cols = data.shape
+    obstacles = data == Items.OBSTACLE
+    row_index = np.arange(rows, dtype=np.float64)[:, None]
+
+    # Vertical distance to the nearest obstacle above and below, via running maxima of row indices
+    above = np.maximum.accumulate(np.where(obstacles, row_index, -INF), axis=0)
+    below = np.minimum.accumulate(np.where(obstacles, row_index, INF)[::-1], axis=0)[::-1]
+    vertical = np.minimum(row_index - above, below - row_index)
+    vertical_squared = vertical ** 2
+
+    if max_distance is None:
+        # Columns without obstacles get a finite stand-in larger than any real squared distance
+        far = float((rows + cols) ** 2)
+        squared = _squared_distance_1d(np.minimum(vertical_squared, far))
+        squared[squared >= far] = INF
+        return np.sqrt(squared)
+
+    reach = min(cols - 1, int(np.floor(max_distance)))
+    squared = vertical_squared.copy()
+    for dx in range(1, reach + 1):
+        shifted = vertical_squared[:, dx:] + dx * dx
+        np.minimum(squared[:, :-dx], shifted, out=squared[:, :-dx])
+        shifted = vertical_squared[:, :-dx] + dx * dx
+        np.minimum(squared[:, dx:], shifted, out=squared[:, dx:])
+
+    distances = np.sqrt(squared)
+    distances[distances > max_distance] = INF
+    return distances
+
+
+def inflate_obstacles(costmap: Costmap, robot_radius: float, falloff: float = 0.0, falloff_cost: float = 0.0) -> None:
+    """
+    Make every cell within robot_radius of an obstacle impassable (cost inf) and add a cost
+    that decays linearly from falloff_cost to 0 over the next falloff cells, so paths keep
+    their distance from walls when they can. The robot and goal cells are never made
+    impassable, or no planner could leave or reach them.
+    """
+    distances = obstacle_distance(costmap.get_data(), robot_radius + falloff)
+    costs = _cost_layer(costmap)
+    blocked = distances <= robot_radius
+    for loc in (costmap.robot, costmap.goal):
+        blocked[loc.y, loc.x] = False
+    costs[blocked] = INF
+    if falloff > 0 and falloff_cost > 0:
+        band = (distances > robot_radius) & (distances <= robot_radius + falloff)
+        costs[band] += falloff_cost * (1 - (distances[band] - robot_radius) / falloff)
+    costmap.bump_version()
+
+
+if __name__ == "__main__":
+    from algorithms.astar import AStar
+
+    costmap = generate_random_costmap(40, 60, 0.05)
+    ys, xs = np.mgrid[0:costmap.rows, 0:costmap.cols]
+    # A congested zone in the middle and a ramp whose cost rises to the right
+    paint_costs(costmap, (abs(xs - 30) < 8) & (abs(ys - 20) < 8), 5.0)
+    paint_costs(costmap, ys > 30, 1 + xs / costmap.cols)
+    inflate_obstacles(costmap, robot_radius=1, falloff=2, falloff_cost=2)
+
+    print(AStar(costmap).solve())
@@ -0,0 +1,309 @@
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+from attr import attrs, attrib
+
+from algorithms.costmap import Costmap, Location, generate_random_costmap
+from algorithms.utils import Items, NEIGHBOR_OFFSETS
+
+TileKey = Tuple[int, int]
+
+
+class MemoryTileStore(object):
+    """ Keeps evicted tiles in a dict; all-open tiles are not stored at all """
+
+    def __init__(self):
+        self._tiles: Dict[TileKey, 'Array[T,T]'] = {}
+
+    def load(self, key: TileKey) -> Optional['Array[T,T]']:
+        return self._tiles.get(key)
+
+    def save(self, key: TileKey, tile: Optional['Array[T,T]']) -> None:
+        if tile is None:
+            self._tiles.pop(key, None)
+        else:
+            self._tiles[key] = tile
+
+
+class DirectoryTileStore(object):
+    """ One .npy file per stored tile; all-open tiles have no file """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: TileKey) -> str:
+        return os.path.join(self._directory, f"tile_{key[0]}_{key[1]}.npy")
+
+    def load(self, key: TileKey) -> Optional['Array[T,T]']:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        return np.load(path)
+
+    def save(self, key: TileKey, tile: Optional['Array[T,T]']) -> None:
+        path = self._path(key)
+        if tile is None:
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            np.save(path, tile)
+
+
+TileStore = Union[MemoryTileStore, DirectoryTileStore]
+
+
+@attrs(auto_attribs=True)
+class TileCacheStats(object):
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    write_backs: int = 0
+
+
+@attrs(auto_attribs=True)
+class TiledCostmap(object):
+    """
+    Costmap for maps too large to hold densely. The grid is split into tile_size x tile_size
+    tiles that are loaded lazily from a tile store and kept in an LRU cache of at most
+    cache_size tiles; modified tiles are written back when evicted. Tiles that are entirely
+    open are never stored or allocated.
+
+    It offers the cell interface the planners' step() methods use (get_value, set_value,
+    get_open_neighbors, set_robot, set_goal, listeners), so BFS, DFS and AStar run on it
+    unmodified. The headless solve() paths need a dense grid and do not apply.
+    """
+    rows: int
+    cols: int
+    robot: Location
+    goal: Location
+
+    _tile_size: int = 256
+    _cache_size: int = 64
+    _store: TileStore = attrib(factory=MemoryTileStore)
+
+    stats: TileCacheStats = attrib(init=False, factory=TileCacheStats)
+    # None marks a cached all-open tile that has not been written to
+    _cache: 'OrderedDict[TileKey, Optional[Array[T,T]]]' = attrib(init=False, factory=OrderedDict)
+    _dirty: Set[TileKey] = attrib(init=False, factory=set)
+    _listeners: List[Callable[[Location, int, int], None]] = attrib(init=False, factory=list)
+    _version: int = attrib(init=False, default=0)
+
+    @classmethod
+    def create_map(
+            cls,
+            rows: int,
+            cols: int,
+            robot: Optional[Location] = None,
+            goal: Optional[Location] = None,
+            tile_size: int = 256,
+            cache_size: int = 64,
+            store: Optional[TileStore] = None
+    ) -> 'TiledCostmap':
+        if not robot:
+            robot = Location(0, 0)
+
+        if not goal:
+            goal = Location(cols - 1, rows - 1)
+
+        costmap = TiledCostmap(
+            rows=rows,
+            cols=cols,
+            robot=robot,
+            goal=goal,
+            tile_size=tile_size,
+            cache_size=cache_size,
+            store=store or MemoryTileStore()
+        )
+        costmap._write(robot, Items.ROBOT)
+        costmap._write(goal, Items.GOAL)
+        return costmap
+
+    @classmethod
+    def from_costmap(
+            cls,
+            costmap: Costmap,
+            tile_size: int = 256,
+            cache_size: int = 64,
+            store: Optional[TileStore] = None
+    ) -> 'TiledCostmap':
+        """
+        Split a dense costmap into tiles, skipping the all-open ones
+        """
+        store = store or MemoryTileStore()
+        data = costmap.get_data()
+        for tile_row in range(0, costmap.rows, tile_size):
+            for tile_col in range(0, costmap.cols, tile_size):
+                tile = data[tile_row:tile_row + tile_size, tile_col:tile_col + tile_size]
+                if np.any(tile != Items.OPEN):
+                    padded = np.zeros((tile_size, tile_size), dtype=np.uint8)
+                    padded[:tile.shape[0], :tile.shape[1]] = tile
+                    store.save((tile_row // tile_size, tile_col // tile_size), padded)
+
+        return TiledCostmap(
+            rows=costmap.rows,
+            cols=costmap.cols,
+            robot=costmap.robot,
+            goal=costmap.goal,
+            tile_size=tile_size,
+            cache_size=cache_size,
+            store=store
+        )
+
+    def _locate(self, loc: Location) -> Tuple[TileKey, int, int]:
+        x = loc.x + self.cols if loc.x < 0 else loc.x
+        y = loc.y + self.rows if loc.y < 0 else loc.y
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            raise IndexError(f"{loc} is outside the {self.rows}x{self.cols} costmap")
+        tile_y, row = divmod(y, self._tile_size)
+        tile_x, col = divmod(x, self._tile_size)
+        return (tile_y, tile_x), row, col
+
+    def _get_tile(self, key: TileKey) -> Optional['Array[T,T]']:
+        cache = self._cache
+        if key in cache:
+            self.stats.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+
+        self.stats.misses += 1
+        tile = self._store.load(key)
+        cache[key] = tile
+        if len(cache) > self._cache_size:
+            self._evict()
+        return tile
+
+    def _evict(self) -> None:
+        key, tile = self._cache.popitem(last=False)
+        self.stats.evictions += 1
+        if key in self._dirty:
+            self._dirty.discard(key)
+            self._write_back(key, tile)
+
+    def _write_back(self, key: TileKey, tile: Optional['Array[T,T]']) -> None:
+        self.stats.write_backs += 1
+        if tile is not None and not np.any(tile):
+            # Back to all open: drop it from the store
+            tile = None
+        self._store.save(key, tile)
+
+    def flush(self) -> None:
+        """
+        Write every modified cached tile back to the store
+        """
+        for key in list(self._dirty):
+            self._write_back(key, self._cache[key])
+        self._dirty.clear()
+
+    def get_value(self, loc: Location) -> int:
+        key, row, col = self._locate(loc)
+        tile = self._get_tile(key)
+        if tile is None:
+            return Items.OPEN
+        return tile[row, col]
+
+    def get_open_neighbors(self, loc: Location) -> Optional[Sequence[Location]]:
+        """
+        Get a list of the open neighbors that are not an obstacle, robot, or visited
+        :param loc: the center location to search around for neighbors
+        :return: list of open neighbors
+        """
+        neighbors = []
+        for dx, dy in NEIGHBOR_OFFSETS:
+            x = loc.x + dx
+            y = loc.y + dy
+            if 0 <= x < self.cols and 0 <= y < self.rows:
+                neighbor = Location(x=x, y=y)
+                if self.get_value(neighbor) not in (Items.OBSTACLE, Items.ROBOT, Items.VISITED):
+                    neighbors.append(neighbor)
+        return neighbors
+
+    def set_robot(self, robot: Location) -> None:
+        self._version += 1
+        # reset robot costmap location
+        if self.get_value(robot) != Items.GOAL:
+            self._write(self.robot, Items.OPEN)
+        self.robot = robot
+        self._write(robot, Items.ROBOT)
+
+    def set_goal(self, goal: Location) -> None:
+        self._version += 1
+        # reset goal costmap location
+        if self.get_value(goal) != Items.ROBOT:
+            self._write(self.goal, Items.OPEN)
+        self.goal = goal
+        self._write(goal, Items.GOAL)
+
+    def set_value(self, loc: Location, value: Items) -> None:
+        self._write(loc, value)
+
+    def _write(self, loc: Location, value: Items) -> None:
+        key, row, col = self._locate(loc)
+        tile = self._get_tile(key)
+        if tile is None:
+            if value == Items.OPEN:
+                return
+            tile = np.zeros((self._tile_size, self._tile_size), dtype=np.uint8)
+            self._cache[key] = tile
+        old_value = int(tile[row, col])
+        tile[row, col] = value
+        self._dirty.add(key)
+        if (old_value == Items.OBSTACLE) != (value == Items.OBSTACLE):
+            self._version += 1
+        for listener in self._listeners:
+            listener(loc, old_value, value)
+
+    def add_listener(self, listener: Callable[[Location, int, int], None]) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Location, int, int], None]) -> None:
+        self._listeners.remove(listener)
+
+    def has_listeners(self) -> bool:
+        return bool(self._listeners)
+
+    @property
+    def version(self) -> int:
+        """ Map version, see Costmap.version """
+        return self._version
+
+    def changes_since(self, version: int) -> None:
+        # No change log: callers treat every version bump as a full invalidation
+        return None
+
+    def get_neighbor_index(self) -> None:
+        return None
+
+    def get_cost_layer(self) -> None:
+        # Terrain costs are not tiled; every cell costs as in Costmap without a cost layer
+        return None
+
+    def to_costmap(self) -> Costmap:
+        """
+        Materialize a dense Costmap, e.g. for drawing a small map
+        """
+        data = np.zeros((self.rows, self.cols), dtype=np.uint8)
+        tile_size = self._tile_size
+        for tile_row in range(0, self.rows, tile_size):
+            for tile_col in range(0, self.cols, tile_size):
+                tile = self._get_tile((tile_row // tile_size, tile_col // tile_size))
+                if tile is not None:
+                    window = data[tile_row:tile_row + tile_size, tile_col:tile_col + tile_size]
+                    window[:] = tile[:window.shape[0], :window.shape[1]]
+        return Costmap(rows=self.rows, cols=self.cols, robot=self.robot, goal=self.goal, data=data)
+
+
+if __name__ == "__main__":
+    from algorithms.astar import AStar
+
+    costmap = TiledCostmap.from_costmap(generate_random_costmap(300, 400, 0.2), tile_size=32, cache_size=16)
+    astar = AStar(costmap)
+    while True:
+        path = astar.step()
+        if path:
+            break
+
+    print(path)
+    print(costmap.stats)
@@ -3,6 +3,21 @@ from typing import Tuple
 
 Color = Tuple[int, int, int]
 
+# (dx, dy) offsets of the 8-connected neighbors, in the row-major order that
+# Costmap.get_open_neighbors visits them
+NEIGHBOR_OFFSETS = (
+    (-1, -1), (0, -1), (1, -1),
+    (-1, 0), (1, 0),
+    (-1, 1), (0, 1), (1, 1),
+)
+
+# Neighbor offsets selected by each possible 8-bit passable-direction mask, where
+# bit k corresponds to NEIGHBOR_OFFSETS[k]
+NEIGHBOR_MASK_OFFSETS = tuple(
+    tuple(offset for k, offset in enumerate(NEIGHBOR_OFFSETS) if mask & (1 << k))
+    for mask in range(1 << len(NEIGHBOR_OFFSETS))
+)
+
 
 class Colors:
     WHITE = (255, 255, 255)
@@ -0,0 +1,136 @@
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from attr import attrs, attrib
+
+from algorithms.costmap import Costmap, Location, generate_random_costmap
+from algorithms.utils import Items, NEIGHBOR_OFFSETS
+
+UNREACHABLE = -1
+
+
+def compute_distance_field(data: 'Array[M,N]', goal: Location) -> 'Array[M,N]':
+    """
+    Number of moves from every cell to goal, as BFS counts them (8-connected, only
+    obstacles blocked), or UNREACHABLE. The wavefront is grown one layer at a time as an
+    array of flat indices into an obstacle-padded grid, so each layer is a handful of
+    vectorized operations and every cell is touched once.
+    :return: int32 array shaped like data
+    """
+    rows, cols = data.shape
+    padded_cols = cols + 2
+    # A one-cell obstacle border removes all bounds checks
+    passable = np.zeros((rows + 2, padded_cols), dtype=bool)
+    passable[1:-1, 1:-1] = data != Items.OBSTACLE
+    passable = passable.reshape(-1)
+    distances = np.full(passable.size, UNREACHABLE, dtype=np.int32)
+    offsets = np.array([dy * padded_cols + dx for dx, dy in NEIGHBOR_OFFSETS], dtype=np.int64)
+
+    frontier = np.array([(goal.y + 1) * padded_cols + goal.x + 1], dtype=np.int64)
+    frontier = frontier[passable[frontier]]
+    distances[frontier] = 0
+    passable[frontier] = False
+
+    layer = 0
+    while frontier.size:
+        layer += 1
+        candidates = (frontier[:, None] + offsets).reshape(-1)
+        frontier = np.unique(candidates[passable[candidates]])
+        passable[frontier] = False
+        distances[frontier] = layer
+
+    return distances.reshape(rows + 2, padded_cols)[1:-1, 1:-1].copy()
+
+
+def descend_distance_field(distances: 'Array[M,N]', start: Location) -> List[Location]:
+    """
+    Follow the field downhill from start; each move goes to the first neighbor, in
+    NEIGHBOR_OFFSETS order, that is one move closer to the goal
+    :return: path from (excluding) start to (including) the goal
+    """
+    rows, cols = distances.shape
+    distance = distances[start.y, start.x]
+    if distance == UNREACHABLE:
+        raise Exception("Path does not exist!")
+
+    path = []
+    x, y = start.x, start.y
+    while distance > 0:
+        for dx, dy in NEIGHBOR_OFFSETS:
+            nx = x + dx
+            ny = y + dy
+            if 0 <= nx < cols and 0 <= ny < rows and distances[ny, nx] == distance - 1:
+                break
+        x, y, distance = nx, ny, distance - 1
+        path.append(Location(x, y))
+    return path
+
+
+@attrs(auto_attribs=True)
+class Wavefront(object):
+    """
+    One-goal, many-starts planner. The cost-to-goal field for a goal is computed once with
+    compute_distance_field and cached per (Costmap.version, goal); every start is then
+    answered by descending the field, in O(path length). Paths have as many moves as BFS
+    paths. Obstacle edits bump the costmap version, so stale fields are never reused.
+    """
+    _costmap: Costmap
+    _max_fields: int = 8
+
+    _fields: 'OrderedDict[Tuple[int, Location], Array[M,N]]' = attrib(init=False, factory=OrderedDict)
+
+    def distance_field(self, goal: Optional[Location] = None) -> 'Array[M,N]':
+        """
+        :param goal: goal location, defaults to the costmap goal
+        :return: cached moves-to-goal field (read-only), UNREACHABLE where the goal cannot be reached
+        """
+        goal = goal or self._costmap.goal
+        key = (self._costmap.version, goal)
+        distances = self._fields.get(key)
+        if distances is not None:
+            self._fields.move_to_end(key)
+            return distances
+
+        distances = compute_distance_field(self._costmap.get_data(), goal)
+        distances.flags.writeable = False
+        self._fields[key] = distances
+        if len(self._fields) > self._max_fields:
+            self._fields.popitem(last=False)
+        return distances
+
+    def solve(self, start: Optional[Location] = None, goal: Optional[Location] = None) -> Sequence[Location]:
+        """
+        :param start: start location, defaults to the costmap robot
+        :param goal: goal location, defaults to the costmap goal
+        :return: path from (excluding) start to (including) goal
+        """
+        start = start or self._costmap.robot
+        return descend_distance_field(self.distance_field(goal), start)
+
+    def solve_many(self, starts: Sequence[Location], goal: Optional[Location] = None) -> List[Optional[Sequence[Location]]]:
+        """
+        Paths for many robots heading to one goal; None for starts that cannot reach it
+        """
+        distances = self.distance_field(goal)
+        paths = []
+        for start in starts:
+            if distances[start.y, start.x] == UNREACHABLE:
+                paths.append(None)
+            else:
+                paths.append(descend_distance_field(distances, start))
+        return paths
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    costmap = generate_random_costmap(400, 600, 0.2)
+    wavefront = Wavefront(costmap)
+    starts = [Location(random.randrange(costmap.cols), random.randrange(costmap.rows)) for _ in range(100)]
+
+    start_time = time.perf_counter()
+    paths = wavefront.solve_many(starts)
+    print(f"100 starts: {time.perf_counter() - start_time:.3f}s, "
+          f"{sum(path is not None for path in paths)} reachable")
@@ -0,0 +1,70 @@
+"""
+Queries/second of plan_many and plan_many_parallel against looping AStar.step over one
+costmap copy per query
+
+    python -m benchmarks.bench_batch
+"""
+import random
+import time
+
+import numpy as np
+
+from algorithms.astar import AStar
+from algorithms.batch import plan_many, plan_many_parallel
+from algorithms.costmap import Costmap, Location, generate_random_costmap
+from algorithms.utils import Items
+
+
+def random_queries(costmap: Costmap, count: int):
+    free = np.argwhere(costmap.get_data() == Items.OPEN)
+    pairs = free[np.random.choice(len(free), size=(count, 2))]
+    return [(Location(int(s[1]), int(s[0])), Location(int(g[1]), int(g[0]))) for s, g in pairs]
+
+
+def loop_astar_step(costmap: Costmap, queries):
+    paths = []
+    for start, goal in queries:
+        query_costmap = Costmap(
+            rows=costmap.rows,
+            cols=costmap.cols,
+            robot=costmap.robot,
+            goal=costmap.goal,
+            data=costmap.get_data().copy()
+        )
+        query_costmap.set_robot(start)
+        query_costmap.set_goal(goal)
+        astar = AStar(query_costmap)
+        try:
+            while True:
+                path = astar.step()
+                if path:
+                    break
+        except Exception:
+            path = None
+        paths.append(path)
+    return paths
+
+
+def main(size: int = 200, obstacle_percentage: float = 0.2, count: int = 50, max_workers: int = 4):
+    random.seed(0)
+    np.random.seed(0)
+    costmap = generate_random_costmap(size, size, obstacle_percentage)
+    queries = random_queries(costmap, count)
+
+    def parallel(costmap, queries):
+        return plan_many_parallel(costmap, queries, max_workers=max_workers)
+
+    planners = (
+        ("AStar.step loop", loop_astar_step),
+        ("plan_many", plan_many),
+        (f"parallel x{max_workers}", parallel),
+    )
+    for name, planner in planners:
+        start_time = time.perf_counter()
+        planner(costmap, queries)
+        elapsed = time.perf_counter() - start_time
+        print(f"{name:>16}: {count / elapsed:8.1f} queries/s ({elapsed:.2f}s for {count} queries on {size}x{size})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+HPA* against A* (array engine with a unit cost layer, i.e. the same octile move costs)
+on long queries between opposite corners of large random maps
+
+    python -m benchmarks.bench_hpa
+"""
+import random
+import time
+
+import numpy as np
+
+from algorithms.astar import ArrayAStar, AStarHeuristics
+from algorithms.costmap import Location, generate_random_costmap
+from algorithms.hpa import HPAStar
+from algorithms.utils import Items
+
+QUERIES = 10
+
+
+def octile_length(start, path) -> float:
+    length = 0
+    for a, b in zip([start] + list(path), path):
+        length += 2 ** 0.5 if a.x != b.x and a.y != b.y else 1
+    return length
+
+
+def corner_location(costmap, corner: int) -> Location:
+    """
+    Random free cell within the first (corner 0) or last (corner 1) tenth of both axes
+    """
+    band_rows = max(costmap.rows // 10, 1)
+    band_cols = max(costmap.cols // 10, 1)
+    while True:
+        y = random.randrange(band_rows)
+        x = random.randrange(band_cols)
+        if corner:
+            x, y = costmap.cols - 1 - x, costmap.rows - 1 - y
+        loc = Location(x, y)
+        if costmap.get_value(loc) == Items.OPEN:
+            return loc
+
+
+def run(name: str, costmap, cluster_size: int) -> None:
+    queries = [(corner_location(costmap, 0), corner_location(costmap, 1)) for _ in range(QUERIES)]
+
+    start_time = time.perf_counter()
+    hpa = HPAStar(costmap, cluster_size=cluster_size)
+    build_time = time.perf_counter() - start_time
+
+    astar_time = hpa_time = 0
+    astar_length = hpa_length = 0
+    costmap.set_cost_layer(np.ones((costmap.rows, costmap.cols)))
+    for start, goal in queries:
+        costmap.set_robot(start)
+        costmap.set_goal(goal)
+        start_time = time.perf_counter()
+        path = ArrayAStar(costmap, AStarHeuristics.octile, visualize=False).solve()
+        astar_time += time.perf_counter() - start_time
+        astar_length += octile_length(start, path)
+
+        start_time = time.perf_counter()
+        path = hpa.solve(start, goal)
+        hpa_time += time.perf_counter() - start_time
+        hpa_length += octile_length(start, path)
+    hpa.detach()
+
+    print(f"{name:>16} cluster {cluster_size:3d}: build {build_time * 1000:8.1f} ms  "
+          f"A* {astar_time / QUERIES * 1000:7.1f} ms  HPA* {hpa_time / QUERIES * 1000:7.1f} ms  "
+          f"speedup {astar_time / hpa_time:5.1f}x  length +{hpa_length / astar_length - 1:.1%}  "
+          f"fallbacks {hpa.stats.fallback_searches}")
+
+
+def main():
+    for size in (500, 1000, 2000):
+        for obstacle_percentage in (0.1, 0.2):
+            random.seed(0)
+            np.random.seed(0)
+            costmap = generate_random_costmap(size, size, obstacle_percentage)
+            for cluster_size in (16, 32):
+                run(f"random {size} {obstacle_percentage:.0%}", costmap, cluster_size)
+
+
+if __name__ == "__main__":
+    main()
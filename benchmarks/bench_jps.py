@@ -0,0 +1,56 @@
+"""
+JPS against A* (array engine, headless) on open random maps and vertical wall maps
+
+    python -m benchmarks.bench_jps
+"""
+import random
+import time
+
+import numpy as np
+
+from algorithms.astar import ArrayAStar, AStarHeuristics
+from algorithms.costmap import generate_random_costmap, generate_vertical_wall_costmap
+from algorithms.jps import JPS
+
+
+def octile_length(start, path) -> float:
+    length = 0
+    for a, b in zip([start] + list(path), path):
+        length += 2 ** 0.5 if a.x != b.x and a.y != b.y else 1
+    return length
+
+
+def run(name: str, costmap) -> None:
+    planners = (
+        ("AStar euclidean", lambda: ArrayAStar(costmap, AStarHeuristics.euclidean, visualize=False)),
+        ("AStar octile", lambda: ArrayAStar(costmap, AStarHeuristics.octile, visualize=False)),
+        ("JPS", lambda: JPS(costmap, visualize=False)),
+    )
+    for planner_name, make_planner in planners:
+        planner = make_planner()
+        start_time = time.perf_counter()
+        try:
+            while True:
+                path = planner.step()
+                if path is not None:
+                    break
+        except Exception:
+            path = None
+        elapsed = time.perf_counter() - start_time
+        length = "no path" if path is None else f"{octile_length(costmap.robot, path):9.2f}"
+        print(f"{name:>22} {planner_name:>16}: {elapsed * 1000:9.1f} ms "
+              f"{planner.nodes_expanded:8d} expanded  length {length}")
+
+
+def main():
+    random.seed(0)
+    np.random.seed(0)
+    for size in (100, 300, 1000):
+        for obstacle_percentage in (0.0, 0.1, 0.2):
+            costmap = generate_random_costmap(size, size, obstacle_percentage)
+            run(f"random {size} {obstacle_percentage:.0%}", costmap)
+        run(f"vertical wall {size}", generate_vertical_wall_costmap(size, size))
+
+
+if __name__ == "__main__":
+    main()
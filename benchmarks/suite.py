@@ -0,0 +1,231 @@
+"""
+Benchmark suite: every registered planner, driven through step(), on seeded random maps of
+several sizes and obstacle percentages plus vertical wall worst cases. Reports wall time,
+nodes expanded, peak memory, path cost (Euclidean length) and waypoint count (turns a
+controller has to follow), and writes them as JSON for comparing versions.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --sizes 100 1000 4000 --planners AStar-octile JPS --timeout 600
+    python -m benchmarks.suite --compare baseline.json results.json
+
+Wall time is measured on its own; peak memory (tracemalloc, which includes NumPy buffers)
+is measured on a second, traced run of the same search because tracing slows Python down.
+Searches that exceed --timeout seconds are recorded with status "timeout".
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from algorithms.any_angle import Shortcut, ThetaStar, path_length, remove_collinear
+from algorithms.astar import AStar, AStarBackends, AStarHeuristics
+from algorithms.bidirectional import BidirectionalAStar, BidirectionalBFS
+from algorithms.breadth_first_search import BFS
+from algorithms.costmap import Costmap, Location, generate_random_costmap, generate_vertical_wall_costmap
+from algorithms.depth_first_search import DFS
+from algorithms.jps import JPS
+
+# Planner name -> factory. Register new planners here; anything with a step() method
+# following the planner protocol can be benchmarked.
+PLANNERS: Dict[str, Callable[[Costmap], Any]] = {
+    "BFS": BFS,
+    "DFS": DFS,
+    "AStar-manhattan": lambda costmap: AStar(costmap, AStarHeuristics.manhattan),
+    "AStar-euclidean": lambda costmap: AStar(costmap, AStarHeuristics.euclidean),
+    "AStar-chebyshev": lambda costmap: AStar(costmap, AStarHeuristics.chebyshev),
+    "AStar-octile": lambda costmap: AStar(costmap, AStarHeuristics.octile),
+    "AStar-array-euclidean": lambda costmap: AStar(costmap, AStarHeuristics.euclidean, AStarBackends.ARRAY),
+    "JPS": JPS,
+    "BidirectionalBFS": BidirectionalBFS,
+    "BidirectionalAStar": BidirectionalAStar,
+    "AStar-octile-shortcut": lambda costmap: Shortcut(costmap, AStar(costmap, AStarHeuristics.octile)),
+    "ThetaStar": lambda costmap: ThetaStar(costmap, lazy=False),
+    "LazyThetaStar": ThetaStar,
+}
+
+DEFAULT_SIZES = (100, 300, 1000)
+FULL_SIZES = (100, 300, 1000, 2000, 4000)
+DEFAULT_DENSITIES = (0.0, 0.1, 0.2, 0.3)
+
+
+def copy_costmap(costmap: Costmap) -> Costmap:
+    return Costmap(
+        rows=costmap.rows,
+        cols=costmap.cols,
+        robot=costmap.robot,
+        goal=costmap.goal,
+        data=costmap.get_data().copy()
+    )
+
+
+def generate_maps(sizes: Sequence[int], densities: Sequence[float], seed: int) -> Iterator[Tuple[Dict, Costmap]]:
+    for size in sizes:
+        for obstacle_percentage in densities:
+            random.seed(seed)
+            np.random.seed(seed)
+            costmap = generate_random_costmap(size, size, obstacle_percentage)
+            yield {"map": "random", "rows": size, "cols": size, "obstacle_percentage": obstacle_percentage,
+                   "seed": seed}, costmap
+        yield {"map": "vertical_wall", "rows": size, "cols": size, "obstacle_percentage": None,
+               "seed": None}, generate_vertical_wall_costmap(size, size)
+
+
+def run_search(planner, timeout: float) -> Tuple[str, Optional[Sequence[Location]], int]:
+    """
+    Step the planner to completion
+    :return: status ("ok", "no_path" or "timeout"), path, number of step() calls
+    """
+    deadline = time.perf_counter() + timeout
+    steps = 0
+    try:
+        while True:
+            path = planner.step()
+            steps += 1
+            if path is not None:
+                return "ok", path, steps
+            if steps % 1024 == 0 and time.perf_counter() > deadline:
+                return "timeout", None, steps
+    except Exception:
+        return "no_path", None, steps
+
+
+def benchmark(name: str, costmap: Costmap, timeout: float, measure_memory: bool) -> Dict:
+    search_costmap = copy_costmap(costmap)
+    start_time = time.perf_counter()
+    planner = PLANNERS[name](search_costmap)
+    status, path, steps = run_search(planner, timeout)
+    wall_time = time.perf_counter() - start_time
+
+    peak_memory = None
+    if measure_memory and status != "timeout":
+        search_costmap = copy_costmap(costmap)
+        tracemalloc.start()
+        run_search(PLANNERS[name](search_costmap), timeout)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "planner": name,
+        "status": status,
+        "wall_time_s": wall_time,
+        # Planners without a counter expand one node per step()
+        "nodes_expanded": getattr(planner, "nodes_expanded", steps),
+        "peak_memory_bytes": peak_memory,
+        "path_moves": None if path is None else len(path),
+        # Euclidean length: grid moves cost 1 and sqrt(2), any-angle segments their length
+        "path_cost": None if path is None else path_length(costmap.robot, path),
+        "waypoints": None if path is None else len(remove_collinear(costmap.robot, path)),
+    }
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_suite(
+        sizes: Sequence[int],
+        densities: Sequence[float],
+        planners: Sequence[str],
+        seed: int,
+        timeout: float,
+        measure_memory: bool
+) -> Dict:
+    results = []
+    for map_info, costmap in generate_maps(sizes, densities, seed):
+        for name in planners:
+            record = dict(map_info, **benchmark(name, costmap, timeout, measure_memory))
+            results.append(record)
+            print_record(record)
+    return {"environment": environment(), "results": results}
+
+
+def print_record(record: Dict) -> None:
+    density = "" if record["obstacle_percentage"] is None else f" {record['obstacle_percentage']:.0%}"
+    memory = "" if record["peak_memory_bytes"] is None else f"{record['peak_memory_bytes'] / 2 ** 20:8.1f} MiB"
+    cost = "" if record["path_cost"] is None else \
+        f"cost {record['path_cost']:9.2f} {record['waypoints']:6d} waypoints"
+    print(f"{record['map']:>13} {record['rows']:>5}x{record['cols']:<5}{density:>4} {record['planner']:>22}: "
+          f"{record['status']:>7} {record['wall_time_s'] * 1000:10.1f} ms {record['nodes_expanded']:9d} expanded "
+          f"{memory:>12} {cost}")
+
+
+def _record_key(record: Dict) -> Tuple:
+    return record["map"], record["rows"], record["cols"], record["obstacle_percentage"], record["seed"], \
+        record["planner"]
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[Tuple[Dict, Dict]]:
+    """
+    Print wall time ratios of the runs present in both result files
+    :return: (baseline, current) record pairs that got slower by more than threshold
+    """
+    baseline_records = {_record_key(record): record for record in baseline["results"]}
+    regressions = []
+    for record in current["results"]:
+        old = baseline_records.get(_record_key(record))
+        if old is None or old["status"] != "ok" or record["status"] != "ok":
+            continue
+        ratio = record["wall_time_s"] / max(old["wall_time_s"], 1e-9)
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append((old, record))
+            flag = "  REGRESSION"
+        if record["nodes_expanded"] != old["nodes_expanded"] or record["path_cost"] != old["path_cost"]:
+            flag += "  (search changed)"
+        print(f"{record['map']:>13} {record['rows']:>5}x{record['cols']:<5} {record['planner']:>22}: "
+              f"{ratio:6.2f}x time{flag}")
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=None,
+                        help=f"square map sizes (default {DEFAULT_SIZES}, --full {FULL_SIZES})")
+    parser.add_argument("--full", action="store_true", help="include the 2000 and 4000 maps")
+    parser.add_argument("--densities", type=float, nargs="+", default=DEFAULT_DENSITIES)
+    parser.add_argument("--planners", nargs="+", default=list(PLANNERS), choices=list(PLANNERS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds per search")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced peak-memory runs")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression by --compare")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as baseline_file, open(args.compare[1]) as current_file:
+            regressions = compare(json.load(baseline_file), json.load(current_file), args.threshold)
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        return 1 if regressions else 0
+
+    sizes = args.sizes or (FULL_SIZES if args.full else DEFAULT_SIZES)
+    report = run_suite(sizes, args.densities, args.planners, args.seed, args.timeout, not args.no_memory)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,33 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pickle
+import random
+from heapq import heappush, heappop
+
 import numpy as np
 
-from algorithms.astar import AStar, AStarHeuristics
+from algorithms.any_angle import Shortcut, ThetaStar, expand_path, line_cells, line_of_sight, path_length, \
+    remove_collinear, shortcut_path, visible_from
+from algorithms.astar import AStar, AStarHeuristics, AStarBackends, AnytimeAStar, HeuristicCache, \
+    _compute_movement_cost, evaluate_heuristic
+from algorithms.batch import plan_many, plan_many_parallel
+from algorithms.bidirectional import BidirectionalAStar, BidirectionalBFS
 from algorithms.breadth_first_search import BFS
-from algorithms.costmap import Costmap, generate_random_costmap, Location
+from algorithms.costmap import Costmap, generate_random_costmap, generate_vertical_wall_costmap, Location
 from algorithms.depth_first_search import DFS
+from algorithms.dstar_lite import DStarLite
+from algorithms.hpa import HPAStar
+from algorithms.jps import JPS
+from algorithms.multi_agent import CooperativePlanner, find_collisions
+from algorithms.open_list import OpenList
+from algorithms.path import PackedPath
+from algorithms.path_cache import PathCache
+from algorithms.recorder import SearchRecorder
+from algorithms.service import PlanningService, PlanStatus
+from algorithms.stats import SearchStats, run_search
+from algorithms.terrain import inflate_obstacles, paint_costs
 from algorithms.utils import Items
+from algorithms.wavefront import Wavefront, UNREACHABLE, compute_distance_field
 
 
 def create_test_costmap() -> Costmap:
@@ -38,6 +61,25 @@ def create_test_costmap_with_wall() -> Costmap:
     return costmap
 
 
+def copy_costmap(costmap: Costmap) -> Costmap:
+    copy = Costmap(
+        rows=costmap.rows,
+        cols=costmap.cols,
+        robot=costmap.robot,
+        goal=costmap.goal,
+        data=costmap.get_data().copy()
+    )
+    copy.set_cost_layer(costmap.get_cost_layer())
+    return copy
+
+
+def run_to_path(planner):
+    while True:
+        path = planner.step()
+        if path:
+            return path
+
+
 def test_bfs():
     costmap = create_test_costmap()
     bfs = BFS(costmap)
@@ -138,7 +180,859 @@ def test_astar():
         assert expected_paths[heuristic] == path
 
 
+def test_open_list():
+    open_list = OpenList()
+    open_list.push("a", 5)
+    open_list.push("b", 3)
+    open_list.push("c", 4)
+    open_list.push("a", 1)
+    assert "a" in open_list
+    assert len(open_list) == 3
+    assert open_list.priority("a") == 1
+
+    assert [open_list.pop() for _ in range(3)] == ["a", "b", "c"]
+    assert len(open_list) == 0
+    assert open_list.stats.pushes == 4
+    assert open_list.stats.pops == 3
+    assert open_list.stats.stale_pops == 0
+
+    # The superseded entry of "a" is discarded on the way to the empty error
+    try:
+        open_list.pop()
+        assert False
+    except IndexError:
+        pass
+    assert open_list.stats.stale_pops == 1
+
+    for backend in (AStarBackends.DICT, AStarBackends.ARRAY):
+        astar = AStar(create_test_costmap_with_wall(), backend=backend)
+        run_to_path(astar)
+        stats = astar.open_list_stats
+        assert stats.pops > 0
+        assert stats.pushes >= stats.pops + stats.stale_pops
+
+
+def test_astar_array_backend():
+    heuristics = [
+        AStarHeuristics.manhattan,
+        AStarHeuristics.euclidean,
+        AStarHeuristics.chebyshev
+    ]
+
+    # Searching the same map in turn also checks that the visualization marks match
+    dict_costmap = create_test_costmap_with_wall()
+    array_costmap = create_test_costmap_with_wall()
+    for heuristic in heuristics:
+        expected_path = run_to_path(AStar(dict_costmap, heuristic))
+        path = run_to_path(AStar(array_costmap, heuristic, backend=AStarBackends.ARRAY))
+        assert expected_path == path
+        assert np.all(dict_costmap.get_data() == array_costmap.get_data())
+
+    np.random.seed(7)
+    random.seed(7)
+    for _ in range(20):
+        costmap = generate_random_costmap(30, 40, obstacle_percentage=.25)
+        for heuristic in heuristics:
+            try:
+                expected_path = run_to_path(AStar(copy_costmap(costmap), heuristic))
+            except Exception:
+                expected_path = None
+            try:
+                path = run_to_path(AStar(copy_costmap(costmap), heuristic, backend=AStarBackends.ARRAY))
+            except Exception:
+                path = None
+            assert expected_path == path
+
+
+def test_solve_leaves_costmap_untouched():
+    np.random.seed(3)
+    random.seed(3)
+    for _ in range(20):
+        costmap = generate_random_costmap(25, 35, obstacle_percentage=.25)
+        original = costmap.get_data().copy()
+        for planner in (BFS, DFS, AStar):
+            try:
+                expected_path = run_to_path(planner(copy_costmap(costmap)))
+            except Exception:
+                expected_path = None
+            try:
+                path = planner(costmap).solve()
+            except Exception:
+                path = None
+            assert expected_path == path
+            assert np.all(costmap.get_data() == original)
+
+    # The passable-neighbor index gives the same results
+    costmap = create_test_costmap_with_wall()
+    for planner in (BFS, DFS, AStar):
+        indexed_costmap = copy_costmap(costmap)
+        indexed_costmap.build_neighbor_index()
+        assert planner(indexed_costmap).solve() == planner(costmap).solve()
+        assert run_to_path(planner(indexed_costmap)) == run_to_path(planner(copy_costmap(costmap)))
+
+    # Any start/goal pair can be queried against the same map
+    start = Location(0, 9)
+    goal = Location(9, 9)
+    for planner in (BFS, DFS, AStar):
+        path = planner(costmap).solve(start, goal)
+        assert path[-1] == goal
+        assert Location(5, 0) in path
+
+
+def test_plan_many():
+    np.random.seed(5)
+    random.seed(5)
+    costmap = generate_random_costmap(30, 30, obstacle_percentage=.25)
+    original = costmap.get_data().copy()
+    free = np.argwhere(original != Items.OBSTACLE)
+    pairs = free[np.random.choice(len(free), size=(40, 2))]
+    queries = [(Location(int(s[1]), int(s[0])), Location(int(g[1]), int(g[0]))) for s, g in pairs]
+
+    paths = plan_many(costmap, queries, AStarHeuristics.manhattan)
+    assert len(paths) == len(queries)
+    for (start, goal), path in zip(queries, paths):
+        try:
+            expected_path = AStar(costmap, AStarHeuristics.manhattan).solve(start, goal)
+        except Exception:
+            expected_path = None
+        assert expected_path == path
+    assert np.all(costmap.get_data() == original)
+
+    assert plan_many_parallel(costmap, queries, AStarHeuristics.manhattan, max_workers=2, chunk_size=3) == paths
+
+
+def octile_path_cost(start: Location, path) -> float:
+    cost = 0
+    for a, b in zip([start] + list(path), path):
+        assert max(abs(a.x - b.x), abs(a.y - b.y)) == 1
+        cost += 2 ** 0.5 if a.x != b.x and a.y != b.y else 1
+    return cost
+
+
+def octile_dijkstra_cost(costmap: Costmap, start: Location, goal: Location):
+    data = costmap.get_data()
+    costs = {start: 0}
+    queue = [(0, start)]
+    while queue:
+        cost, loc = heappop(queue)
+        if loc == goal:
+            return cost
+        if cost > costs[loc]:
+            continue
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                n = Location(loc.x + dx, loc.y + dy)
+                if (dx or dy) and 0 <= n.x < costmap.cols and 0 <= n.y < costmap.rows \
+                        and data[n.y, n.x] != Items.OBSTACLE:
+                    new_cost = cost + (2 ** 0.5 if dx and dy else 1)
+                    if new_cost < costs.get(n, float("inf")):
+                        costs[n] = new_cost
+                        heappush(queue, (new_cost, n))
+    return None
+
+
+def test_jps():
+    np.random.seed(13)
+    random.seed(13)
+    for obstacle_percentage in (0.05, 0.2, 0.35):
+        for _ in range(10):
+            costmap = generate_random_costmap(25, 30, obstacle_percentage)
+            expected_cost = octile_dijkstra_cost(costmap, costmap.robot, costmap.goal)
+            try:
+                path = JPS(costmap).solve()
+            except Exception:
+                path = None
+            if expected_cost is None:
+                assert path is None
+                continue
+            assert path[-1] == costmap.goal
+            assert all(costmap.get_value(loc) != Items.OBSTACLE for loc in path)
+            assert abs(octile_path_cost(costmap.robot, path) - expected_cost) < 1e-9
+
+            # step() visualizes the same search
+            assert run_to_path(JPS(copy_costmap(costmap))) == path
+
+    costmap = create_test_costmap_with_wall()
+    path = run_to_path(JPS(costmap))
+    assert Location(5, 0) in path
+    assert costmap.get_value(path[0]) == Items.PARENT
+
+
+def movement_path_cost(start: Location, path) -> float:
+    return sum(_compute_movement_cost(a, b) for a, b in zip([start] + list(path), path))
+
+
+def test_dstar_lite():
+    costmap = create_test_costmap_with_wall()
+    dstar = DStarLite(costmap)
+    path = dstar.replan()
+    assert movement_path_cost(costmap.robot, path) == \
+        movement_path_cost(costmap.robot, AStar(costmap, AStarHeuristics.chebyshev).solve())
+    assert Location(5, 0) in path
+
+    # Opening the wall next to the goal and moving the robot reuses the search tree
+    costmap.set_value(Location(5, 8), Items.OPEN)
+    costmap.set_robot(path[0])
+    path = dstar.replan()
+    assert Location(5, 8) in path
+    assert movement_path_cost(costmap.robot, path) == \
+        movement_path_cost(costmap.robot, AStar(costmap, AStarHeuristics.chebyshev).solve())
+
+    # Closing both the new opening and the gap at the top seals the wall off
+    costmap.set_value(Location(5, 8), Items.OBSTACLE)
+    costmap.set_value(Location(5, 0), Items.OBSTACLE)
+    try:
+        dstar.replan()
+        assert False
+    except Exception as e:
+        assert str(e) == "Path does not exist!"
+
+    np.random.seed(17)
+    random.seed(17)
+    for _ in range(10):
+        costmap = generate_random_costmap(30, 30, obstacle_percentage=.2)
+        dstar = DStarLite(costmap)
+        for _ in range(4):
+            try:
+                expected_path = AStar(costmap, AStarHeuristics.chebyshev).solve()
+            except Exception as e:
+                assert str(e) == "Path does not exist!"
+                try:
+                    dstar.replan()
+                    assert False
+                except Exception as e:
+                    assert str(e) == "Path does not exist!"
+                break
+            path = dstar.replan()
+            assert abs(movement_path_cost(costmap.robot, path) - movement_path_cost(costmap.robot, expected_path)) < 1e-9
+            for loc in path[len(path) // 2:len(path) // 2 + 2]:
+                if loc != costmap.goal:
+                    costmap.set_value(loc, Items.OBSTACLE)
+            if path[0] != costmap.goal:
+                costmap.set_robot(path[0])
+        dstar.detach()
+
+
+def test_search_recorder():
+    for make_planner in (BFS, AStar, lambda costmap: AStar(costmap, backend=AStarBackends.ARRAY), JPS):
+        costmap = create_test_costmap_with_wall()
+        expected_frames = []
+        with SearchRecorder(costmap) as recorder:
+            planner = make_planner(costmap)
+            while True:
+                path = planner.step()
+                frame = recorder.capture()
+                assert np.all(frame == costmap.draw(show=False))
+                expected_frames.append(frame.copy())
+                if path:
+                    break
+
+        assert len(recorder.deltas) == len(expected_frames)
+        for indices, items in recorder.deltas:
+            assert len(np.unique(indices)) == len(indices)
+        for expected_frame, frame in zip(expected_frames, recorder.replay()):
+            assert np.all(expected_frame == frame)
+        assert not costmap.has_listeners()
+
+
+def test_hpa():
+    np.random.seed(17)
+    random.seed(17)
+    for _ in range(10):
+        costmap = generate_random_costmap(40, 50, 0.2)
+        expected_cost = octile_dijkstra_cost(costmap, costmap.robot, costmap.goal)
+        if expected_cost is None:
+            continue
+        path = HPAStar(costmap, cluster_size=8).solve()
+        assert path[-1] == costmap.goal
+        assert all(costmap.get_value(loc) != Items.OBSTACLE for loc in path)
+        # detours stay within about one cluster of the optimum
+        assert octile_path_cost(costmap.robot, path) <= expected_cost + 2 * 8
+
+    # start and goal inside one cluster
+    costmap = create_test_costmap_with_wall()
+    hpa = HPAStar(costmap, cluster_size=4)
+    path = hpa.solve(Location(0, 0), Location(2, 2))
+    assert abs(octile_path_cost(Location(0, 0), path) - 2 * 2 ** 0.5) < 1e-9
+
+    # an obstacle edit only rebuilds the touched cluster and its neighbors
+    path = hpa.solve()
+    assert hpa.solve() == path
+    clusters_rebuilt = hpa.stats.clusters_rebuilt
+    blocked = path[len(path) // 2]
+    costmap.set_value(blocked, Items.OBSTACLE)
+    path = hpa.solve()
+    assert blocked not in path
+    assert octile_path_cost(costmap.robot, path) <= octile_dijkstra_cost(costmap, costmap.robot, costmap.goal) + 2 * 4
+    assert 0 < hpa.stats.clusters_rebuilt - clusters_rebuilt <= 5
+
+
+def test_wavefront():
+    np.random.seed(19)
+    random.seed(19)
+    for _ in range(10):
+        costmap = generate_random_costmap(30, 40, 0.3)
+        wavefront = Wavefront(costmap)
+        distances = wavefront.distance_field()
+        starts = [Location(x, y) for x in range(0, 40, 7) for y in range(0, 30, 5)]
+        for start, path in zip(starts, wavefront.solve_many(starts)):
+            if costmap.get_value(start) == Items.OBSTACLE or distances[start.y, start.x] == UNREACHABLE:
+                assert path is None
+                continue
+            assert len(path) == distances[start.y, start.x]
+            # as short as BFS, which can return one move more when it re-parents the goal
+            assert len(path) <= len(BFS(costmap).solve(start))
+            if path:
+                assert path[-1] == costmap.goal
+                assert all(costmap.get_value(loc) != Items.OBSTACLE for loc in path)
+                for a, b in zip([start] + path, path):
+                    assert max(abs(a.x - b.x), abs(a.y - b.y)) == 1
+
+    # fields are cached per (map version, goal)
+    costmap = create_test_costmap_with_wall()
+    wavefront = Wavefront(costmap)
+    distances = wavefront.distance_field()
+    assert wavefront.distance_field() is distances
+    costmap.set_value(Location(1, 1), Items.VISITED)
+    assert wavefront.distance_field() is distances
+    version = costmap.version
+    costmap.set_value(Location(5, 0), Items.OBSTACLE)
+    assert costmap.version == version + 1
+    distances = wavefront.distance_field()
+    assert distances[costmap.robot.y, costmap.robot.x] == UNREACHABLE
+    try:
+        wavefront.solve()
+        assert False
+    except Exception as e:
+        assert str(e) == "Path does not exist!"
+
+
+def test_bidirectional():
+    np.random.seed(23)
+    random.seed(23)
+    for _ in range(20):
+        costmap = generate_random_costmap(30, 40, 0.25)
+        distance = Wavefront(costmap).distance_field()[costmap.robot.y, costmap.robot.x]
+
+        search = BidirectionalBFS(copy_costmap(costmap))
+        try:
+            path = run_to_path(search)
+        except Exception:
+            path = None
+        if distance == UNREACHABLE:
+            assert path is None
+            continue
+        # as short as the wavefront distance, i.e. a shortest path
+        assert len(path) == distance
+        assert path[-1] == costmap.goal
+        assert all(costmap.get_value(loc) != Items.OBSTACLE for loc in path)
+
+        search = BidirectionalAStar(copy_costmap(costmap))
+        path = run_to_path(search)
+        astar = AStar(copy_costmap(costmap), AStarHeuristics.chebyshev)
+        expected_path = run_to_path(astar)
+        assert abs(movement_path_cost(costmap.robot, path) - movement_path_cost(costmap.robot, expected_path)) < 1e-9
+
+    # On an open map the two frontiers meet halfway, well before BFS reaches the goal
+    costmap = Costmap.create_map(30, 40, Location(0, 0), Location(39, 29))
+    search = BidirectionalBFS(copy_costmap(costmap))
+    run_to_path(search)
+    bfs = BFS(copy_costmap(costmap))
+    bfs_expanded = 0
+    while not bfs.step():
+        bfs_expanded += 1
+    assert search.nodes_expanded < bfs_expanded
+
+    costmap = create_test_costmap_with_wall()
+    path = run_to_path(BidirectionalBFS(costmap))
+    assert Location(5, 0) in path
+    assert costmap.get_value(path[0]) == Items.PARENT
+
+
+def test_search_stats():
+    np.random.seed(29)
+    random.seed(29)
+    costmap = generate_random_costmap(20, 30, 0.2)
+    for make_planner in (BFS, DFS, lambda c, **kw: AStar(c, AStarHeuristics.chebyshev, **kw)):
+        try:
+            expected_path = run_to_path(make_planner(copy_costmap(costmap)))
+        except Exception:
+            continue
+
+        expanded = []
+        stats_costmap = copy_costmap(costmap)
+        planner = make_planner(stats_costmap, stats=SearchStats(), on_step=lambda loc, stats: expanded.append(loc))
+        path, stats = run_search(planner)
+        assert path == expected_path
+        assert stats.nodes_expanded == len(expanded) > 0
+        assert len(set(expanded)) == len(expanded)
+        assert all(stats_costmap.get_value(loc) in (Items.VISITED, Items.PARENT, Items.ROBOT) for loc in expanded)
+        assert stats.nodes_generated >= stats.nodes_expanded - 1
+        assert 0 < stats.open_list_peak <= stats.nodes_generated
+        assert stats.step_time >= stats.neighbor_time + stats.heuristic_time + stats.queue_time > 0
+        assert set(stats.as_dict()) >= {"nodes_expanded", "nodes_requeued", "queue_time"}
+
+    # hooks run without stats too, and the array backend rejects them
+    expanded = []
+    path, stats = run_search(AStar(copy_costmap(costmap), on_step=lambda loc, stats: expanded.append(loc)))
+    assert stats is None and len(expanded) > 0
+    try:
+        AStar(costmap, backend=AStarBackends.ARRAY, stats=SearchStats())
+        assert False
+    except ValueError:
+        pass
+
+
+def test_weighted_and_anytime_astar():
+    np.random.seed(31)
+    random.seed(31)
+    for _ in range(10):
+        costmap = generate_random_costmap(30, 40, 0.25)
+        try:
+            optimal_path = AStar(costmap, AStarHeuristics.chebyshev).solve()
+        except Exception:
+            continue
+        optimal_cost = movement_path_cost(costmap.robot, optimal_path)
+
+        # weighted A*: dict and array engines agree and stay within the weight
+        path = run_to_path(AStar(copy_costmap(costmap), AStarHeuristics.chebyshev, weight=2))
+        assert path == AStar(costmap, AStarHeuristics.chebyshev, weight=2).solve()
+        assert movement_path_cost(costmap.robot, path) <= 2 * optimal_cost + 1e-9
+
+        # anytime: costs never grow, stay within each bound and end optimal (the default
+        # heuristic is the admissible chebyshev)
+        anytime = AnytimeAStar(costmap)
+        costs = []
+        for path, bound in anytime.improve():
+            costs.append(movement_path_cost(costmap.robot, path))
+            assert costs[-1] <= bound * optimal_cost + 1e-9
+        assert costs == sorted(costs, reverse=True)
+        assert abs(costs[-1] - optimal_cost) < 1e-9
+        assert anytime.bound == 1
+
+    # a passed deadline leaves no path; a later call resumes the same search
+    costmap = create_test_costmap_with_wall()
+    optimal_cost = movement_path_cost(costmap.robot, AStar(costmap, AStarHeuristics.chebyshev).solve())
+    anytime = AnytimeAStar(costmap, AStarHeuristics.chebyshev)
+    assert anytime.solve(deadline=0) is None
+    assert abs(movement_path_cost(costmap.robot, anytime.solve()) - optimal_cost) < 1e-9
+    assert AStar(costmap, AStarHeuristics.chebyshev).solve_anytime(deadline=0) is None
+    # The convenience method keeps the admissible default even on a euclidean planner
+    assert abs(movement_path_cost(costmap.robot, AStar(costmap).solve_anytime()) - optimal_cost) < 1e-9
+
+
+def terrain_dijkstra_cost(costmap: Costmap, start: Location, goal: Location):
+    data = costmap.get_data()
+    costs = costmap.get_cost_layer()
+    best = {start: 0}
+    queue = [(0, start)]
+    while queue:
+        cost, loc = heappop(queue)
+        if loc == goal:
+            return cost
+        if cost > best[loc]:
+            continue
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                n = Location(loc.x + dx, loc.y + dy)
+                if (dx or dy) and 0 <= n.x < costmap.cols and 0 <= n.y < costmap.rows \
+                        and data[n.y, n.x] != Items.OBSTACLE and costs[n.y, n.x] != float("inf"):
+                    new_cost = cost + costs[n.y, n.x] * (2 ** 0.5 if dx and dy else 1)
+                    if new_cost < best.get(n, float("inf")):
+                        best[n] = new_cost
+                        heappush(queue, (new_cost, n))
+    return None
+
+
+def terrain_path_cost(costmap: Costmap, path) -> float:
+    costs = costmap.get_cost_layer()
+    return sum(costs[b.y, b.x] * (2 ** 0.5 if a.x != b.x and a.y != b.y else 1)
+               for a, b in zip([costmap.robot] + list(path), path))
+
+
+def test_terrain_costs():
+    np.random.seed(37)
+    random.seed(37)
+    for _ in range(10):
+        costmap = generate_random_costmap(25, 30, 0.1)
+        ys, xs = np.mgrid[0:costmap.rows, 0:costmap.cols]
+        paint_costs(costmap, (xs > 8) & (xs < 20), 4.0)
+        paint_costs(costmap, ys > 15, 1 + xs / 10)
+        inflate_obstacles(costmap, robot_radius=0.5)
+        paint_costs(costmap, (xs == costmap.goal.x) & (ys == costmap.goal.y), 1.0)
+
+        expected_cost = terrain_dijkstra_cost(costmap, costmap.robot, costmap.goal)
+        for planner in (AStar(costmap, AStarHeuristics.octile),
+                        AStar(copy_costmap(costmap), AStarHeuristics.octile, AStarBackends.ARRAY)):
+            if expected_cost is None:
+                try:
+                    planner.solve()
+                    assert False
+                except Exception as e:
+                    assert str(e) == "Path does not exist!"
+                continue
+            for path in (planner.solve(), run_to_path(planner)):
+                assert path[-1] == costmap.goal
+                assert abs(terrain_path_cost(costmap, path) - expected_cost) < 1e-9
+
+
+def test_heuristic_cache():
+    heuristics = [
+        AStarHeuristics.manhattan,
+        AStarHeuristics.euclidean,
+        AStarHeuristics.chebyshev,
+        AStarHeuristics.octile,
+        lambda a, b: abs(a.x - b.x)
+    ]
+
+    # Vectorized values equal the scalar ones exactly, so searches break ties the same way
+    goal = Location(4, 7)
+    ys, xs = np.mgrid[0:9, 0:12]
+    for heuristic in heuristics:
+        values = evaluate_heuristic(heuristic, xs, ys, goal)
+        assert values.shape == xs.shape
+        for x, y in zip(xs.reshape(-1), ys.reshape(-1)):
+            assert values[y, x] == heuristic(Location(int(x), int(y)), goal)
+
+    np.random.seed(41)
+    random.seed(41)
+    cache = HeuristicCache()
+    for _ in range(10):
+        costmap = generate_random_costmap(30, 40, obstacle_percentage=.25)
+        for heuristic in heuristics[:4]:
+            for backend in (AStarBackends.DICT, AStarBackends.ARRAY):
+                try:
+                    expected_path = run_to_path(AStar(copy_costmap(costmap), heuristic, backend))
+                except Exception:
+                    expected_path = None
+                try:
+                    path = run_to_path(AStar(copy_costmap(costmap), heuristic, backend, heuristic_cache=cache))
+                except Exception:
+                    path = None
+                assert expected_path == path
+
+    # Grids are shared between queries to the same goal and are read-only
+    costmap = create_test_costmap_with_wall()
+    cache = HeuristicCache(max_grids=2)
+    planner = AStar(costmap, AStarHeuristics.octile, heuristic_cache=cache)
+    path = planner.solve()
+    assert planner.solve(goal=costmap.goal) == path
+    # Built once for the stepped search, reused by both headless ones
+    assert cache.misses == 1 and cache.hits == 2
+    grid = cache.grid(AStarHeuristics.octile, costmap.goal, costmap.rows, costmap.cols)
+    assert not grid.flags.writeable
+    cache.grid(AStarHeuristics.euclidean, costmap.goal, costmap.rows, costmap.cols)
+    cache.grid(AStarHeuristics.manhattan, costmap.goal, costmap.rows, costmap.cols)
+    assert cache.grid(AStarHeuristics.octile, costmap.goal, costmap.rows, costmap.cols) is not grid
+
+
+def test_path_cache():
+    costmap = create_test_costmap_with_wall()
+    expected_path = AStar(costmap).solve()
+    cache = PathCache(costmap)
+    assert cache.solve(AStar) == expected_path
+    assert cache.solve(AStar, costmap.robot, costmap.goal) == expected_path
+    assert cache.hits == 1 and cache.misses == 1
+    # Planner and heuristic are part of the key
+    assert cache.solve(BFS) == BFS(costmap).solve()
+    assert cache.solve(AStar, heuristic=AStarHeuristics.octile) == AStar(costmap, AStarHeuristics.octile).solve()
+    assert cache.misses == 3 and len(cache) == 3
+
+    # Without validation any edit makes every entry stale
+    costmap.set_value(Location(0, 9), Items.OBSTACLE)
+    assert cache.solve(AStar) == expected_path
+    assert cache.misses == 4
+
+    cache = PathCache(costmap, max_entries=2, validate=True)
+    start = Location(2, 1)
+    goal = Location(7, 8)
+    assert cache.solve(AStar, start, goal) == expected_path
+    # An edit off the path and a robot move keep the entry
+    costmap.set_value(Location(0, 8), Items.OBSTACLE)
+    costmap.set_robot(Location(1, 1))
+    assert cache.solve(AStar, start, goal) == expected_path
+    assert cache.hits == 1
+    # Closing the only gap in the wall drops it, and the failure is cached
+    costmap.set_value(Location(5, 0), Items.OBSTACLE)
+    for _ in range(2):
+        try:
+            cache.solve(AStar, start, goal)
+            assert False
+        except Exception as e:
+            assert str(e) == "Path does not exist!"
+    assert cache.hits == 2 and cache.misses == 2
+    # Reopening it drops the failure
+    costmap.set_value(Location(5, 0), Items.OPEN)
+    assert cache.solve(AStar, start, goal) == expected_path
+    assert cache.misses == 3
+    # Bulk edits cannot be attributed to cells
+    with costmap.bulk_edit() as data:
+        data[9, 0] = Items.OBSTACLE
+    assert cache.solve(AStar, start, goal) == expected_path
+    assert cache.misses == 4
+
+    # LRU eviction
+    cache.solve(BFS, start, goal)
+    cache.solve(DFS, start, goal)
+    assert len(cache) == 2
+    cache.solve(AStar, start, goal)
+    assert cache.misses == 7
+
+
+def test_planning_service():
+    costmap = create_test_costmap_with_wall()
+    expected_path = AStar(costmap).solve()
+
+    async def coalesced(service):
+        results = await asyncio.gather(*[service.plan() for _ in range(5)])
+        other = await service.plan(goal=Location(9, 9), timeout=1)
+        return results, other
+
+    with ThreadPoolExecutor(2) as executor:
+        for service in (PlanningService(costmap, steps_per_yield=4), PlanningService(costmap, executor=executor)):
+            results, other = asyncio.run(coalesced(service))
+            assert all(result.status == PlanStatus.OK and result.path == expected_path for result in results)
+            # One shared search for the five identical requests, one for the other goal
+            assert service.searches_started == 2 and service.requests_coalesced == 4
+            assert other.status == PlanStatus.OK and other.path[-1] == Location(9, 9)
+            assert service.active_searches == 0
+
+    costmap.set_value(Location(5, 0), Items.OBSTACLE)
+    result = asyncio.run(PlanningService(costmap).plan())
+    assert result.status == PlanStatus.NO_PATH and result.path is None
+
+    # A long search keeps the loop responsive and is cancelled at its deadline
+    costmap = generate_vertical_wall_costmap(300, 300)
+
+    async def deadline(service):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker_task = asyncio.ensure_future(ticker())
+        result = await service.plan(timeout=0.02)
+        ticker_task.cancel()
+        return result, ticks
+
+    with ThreadPoolExecutor(1) as executor:
+        for service in (PlanningService(costmap, steps_per_yield=16), PlanningService(costmap, executor=executor)):
+            result, ticks = asyncio.run(deadline(service))
+            assert result.status == PlanStatus.TIMEOUT
+            assert ticks > 1
+            assert service.active_searches == 0
+            # The partial path is a connected walk from the robot, also when the executor
+            # thread was still stepping as the deadline passed
+            assert result.path is not None
+            for a, b in zip([costmap.robot] + list(result.path), result.path):
+                assert max(abs(a.x - b.x), abs(a.y - b.y)) == 1
+
+    # Failures other than a missing path are not reported as NO_PATH
+    def broken_heuristic(a, b):
+        raise ValueError("broken")
+
+    try:
+        asyncio.run(PlanningService(create_test_costmap_with_wall(), broken_heuristic).plan())
+        assert False
+    except ValueError as e:
+        assert str(e) == "broken"
+
+
+def test_cooperative_planner():
+    # A corridor with a single passing bay: the robots can only pass each other there
+    costmap = Costmap.create_map(3, 7, Location(0, 1), Location(6, 1))
+    data = costmap.get_data()
+    data[0, :] = Items.OBSTACLE
+    data[2, :] = Items.OBSTACLE
+    data[2, 3] = Items.OPEN
+    starts = [Location(0, 1), Location(6, 1)]
+    goals = [Location(6, 1), Location(0, 1)]
+    assert find_collisions(starts, [AStar(costmap).solve(s, g) for s, g in zip(starts, goals)])
+    paths = CooperativePlanner(costmap).plan(starts, goals)
+    assert find_collisions(starts, paths) == []
+    assert [path[-1] for path in paths] == goals
+    # The first robot keeps its shortest path, the second steps into the bay
+    assert len(paths[0]) == 6
+    assert Location(3, 2) in paths[1]
+
+    assert find_collisions([Location(0, 0), Location(1, 0)], [[Location(1, 0)], [Location(0, 0)]]) == [(1, 0, 1)]
+    # Diagonal moves crossing in one 2x2 block
+    assert find_collisions([Location(0, 0), Location(1, 0)], [[Location(1, 1)], [Location(0, 1)]]) == [(1, 0, 1)]
+    costmap = Costmap.create_map(2, 2, Location(0, 0), Location(1, 1))
+    starts = [Location(0, 0), Location(1, 0)]
+    goals = [Location(1, 1), Location(0, 1)]
+    paths = CooperativePlanner(costmap).plan(starts, goals)
+    assert find_collisions(starts, paths) == []
+    assert [path[-1] for path in paths] == goals
+
+    # A ring corridor; the second robot sits on the first one's shortest route and its own
+    # goal is walled off, so it stays put and the first robot has to go around
+    costmap = Costmap.create_map(6, 7, Location(0, 1), Location(6, 1))
+    data = costmap.get_data()
+    data[:] = Items.OBSTACLE
+    data[1, :] = Items.OPEN
+    data[3, :] = Items.OPEN
+    data[1:4, 0] = Items.OPEN
+    data[1:4, 6] = Items.OPEN
+    data[5, 3] = Items.OPEN
+    starts = [Location(0, 1), Location(3, 1)]
+    goals = [Location(6, 1), Location(3, 5)]
+    paths = CooperativePlanner(costmap).plan(starts, goals)
+    assert paths[1] is None
+    assert find_collisions(starts, paths) == []
+    assert paths[0][-1] == goals[0] and Location(3, 1) not in paths[0]
+
+    np.random.seed(43)
+    random.seed(43)
+    for _ in range(5):
+        costmap = generate_random_costmap(30, 30, 0.15)
+        free = np.argwhere(costmap.get_data() != Items.OBSTACLE)
+        picks = free[np.random.choice(len(free), 30, replace=False)]
+        starts = [Location(int(x), int(y)) for y, x in picks[:15]]
+        goals = [Location(int(x), int(y)) for y, x in picks[15:]]
+
+        for planner in (CooperativePlanner(costmap), CooperativePlanner(costmap, AStarHeuristics.chebyshev)):
+            paths = planner.plan(starts, goals)
+            assert find_collisions(starts, paths) == []
+            for start, goal, path in zip(starts, goals, paths):
+                distance = compute_distance_field(costmap.get_data(), goal)[start.y, start.x]
+                if distance == UNREACHABLE:
+                    assert path is None
+                elif path is not None:
+                    assert path[-1] == goal
+                    assert len(path) >= distance
+                    for a, b in zip([start] + path, path):
+                        assert max(abs(a.x - b.x), abs(a.y - b.y)) <= 1
+            # The first robot is not held up by anyone
+            if paths[0] is not None:
+                assert len(paths[0]) == compute_distance_field(costmap.get_data(), goals[0])[starts[0].y, starts[0].x]
+
+        # Windowed planning only looks window steps ahead
+        paths = CooperativePlanner(costmap, window=5).plan(starts, goals)
+        assert find_collisions(starts, paths) == []
+        for goal, path in zip(goals, paths):
+            assert path is None or len(path) == 5 or (len(path) < 5 and path[-1] == goal)
+
+
+def test_packed_path():
+    costmap = create_test_costmap_with_wall()
+    for planner in (BFS, DFS, AStar):
+        path = planner(costmap).solve()
+        packed = planner(costmap).solve(packed=True)
+        assert isinstance(packed, PackedPath)
+        assert packed == path and path == packed
+        assert packed.indices.dtype == np.int32
+        assert len(packed) == len(path)
+        assert list(packed) == path and packed.tolist() == path
+        assert packed[0] == path[0] and packed[-1] == path[-1]
+        assert packed[2:5] == path[2:5] and isinstance(packed[2:5], PackedPath)
+        assert path[3] in packed and packed.index(path[3]) == 3
+        assert np.all(packed.to_array() == [[loc.x, loc.y] for loc in path])
+    assert PackedPath.from_locations(path, costmap.rows, costmap.cols) == packed
+    assert packed != path[:-1]
+
+    # The indices are shared, not copied, through the buffer protocol and pickle protocol 5
+    assert np.asarray(packed) is packed.indices
+    try:
+        packed.indices[0] = 0
+        assert False
+    except ValueError:
+        pass
+    received = PackedPath.frombuffer(memoryview(packed.indices), costmap.cols)
+    assert received == packed and np.shares_memory(received.indices, packed.indices)
+    buffers = []
+    data = pickle.dumps(packed, protocol=5, buffer_callback=buffers.append)
+    assert len(buffers) == 1
+    assert pickle.loads(data, buffers=buffers) == packed
+    assert pickle.loads(pickle.dumps(packed)) == packed
+
+    queries = [(Location(0, 0), Location(9, 9)), (Location(2, 1), Location(7, 8))]
+    assert plan_many(costmap, queries, packed=True) == plan_many(costmap, queries)
+
+
+def test_any_angle():
+    # Bresenham lines: exact endpoints, one cell per step of the major axis, 8-connected
+    for a, b in [(Location(0, 0), Location(7, 3)), (Location(5, 9), Location(1, 0)), (Location(3, 3), Location(3, 3))]:
+        xs, ys = line_cells(a, b)
+        assert (xs[0], ys[0], xs[-1], ys[-1]) == (a.x, a.y, b.x, b.y)
+        assert len(xs) == max(abs(b.x - a.x), abs(b.y - a.y)) + 1
+        assert np.all(np.maximum(np.abs(np.diff(xs)), np.abs(np.diff(ys))) == 1)
+
+    costmap = create_test_costmap_with_wall()
+    passable = costmap.get_data() != Items.OBSTACLE
+    assert line_of_sight(passable, Location(0, 0), Location(9, 0))
+    assert not line_of_sight(passable, Location(0, 5), Location(9, 5))
+    xs, ys = np.meshgrid(np.arange(10), np.arange(10))
+    visible = visible_from(passable, Location(2, 1), xs.reshape(-1), ys.reshape(-1))
+    for x, y, seen in zip(xs.reshape(-1), ys.reshape(-1), visible):
+        assert seen == line_of_sight(passable, Location(2, 1), Location(int(x), int(y)))
+
+    def assert_valid(costmap, path):
+        assert path[-1] == costmap.goal
+        for a, b in zip([costmap.robot] + list(path), path):
+            assert line_of_sight(costmap.get_data() != Items.OBSTACLE, a, b)
+
+    np.random.seed(47)
+    random.seed(47)
+    for _ in range(10):
+        costmap = generate_random_costmap(30, 40, 0.2)
+        try:
+            grid_path = AStar(costmap, AStarHeuristics.octile).solve()
+        except Exception:
+            continue
+        grid_length = path_length(costmap.robot, grid_path)
+        grid_waypoints = len(remove_collinear(costmap.robot, grid_path))
+        straight = path_length(costmap.robot, [costmap.goal])
+
+        smoothed = shortcut_path(costmap, grid_path)
+        assert_valid(costmap, smoothed)
+        assert straight - 1e-9 <= path_length(costmap.robot, smoothed) <= grid_length + 1e-9
+        assert len(smoothed) <= grid_waypoints
+        assert Shortcut(costmap, AStar(costmap, AStarHeuristics.octile)).solve() == smoothed
+
+        for lazy in (False, True):
+            path = ThetaStar(costmap, lazy=lazy).solve()
+            assert_valid(costmap, path)
+            assert straight - 1e-9 <= path_length(costmap.robot, path) <= grid_length + 1e-9
+            # Expanded back to cells it is a regular grid path
+            cells = expand_path(costmap.robot, path)
+            assert cells[-1] == costmap.goal
+            for a, b in zip([costmap.robot] + cells, cells):
+                assert max(abs(a.x - b.x), abs(a.y - b.y)) == 1 and costmap.get_value(b) != Items.OBSTACLE
+
+    # Stepping marks the search like the other planners
+    costmap = create_test_costmap_with_wall()
+    search = ThetaStar(costmap)
+    path = run_to_path(search)
+    assert path == ThetaStar(create_test_costmap_with_wall()).solve()
+    assert search.nodes_expanded > 0 and search.line_checks > 0
+    assert np.any(costmap.get_data() == Items.PARENT)
+    assert_valid(costmap, path)
+
+
 if __name__ == '__main__':
     test_bfs()
     test_dfs()
     test_astar()
+    test_open_list()
+    test_astar_array_backend()
+    test_solve_leaves_costmap_untouched()
+    test_plan_many()
+    test_jps()
+    test_dstar_lite()
+    test_search_recorder()
+    test_hpa()
+    test_wavefront()
+    test_bidirectional()
+    test_search_stats()
+    test_weighted_and_anytime_astar()
+    test_terrain_costs()
+    test_heuristic_cache()
+    test_path_cache()
+    test_planning_service()
+    test_cooperative_planner()
+    test_packed_path()
+    test_any_angle()
@@ -1,6 +1,14 @@
+import os
+import random
+import tempfile
+
+import imageio
 import numpy as np
+from PIL import Image
 
-from algorithms.costmap import Costmap, Location
+from algorithms.costmap import Costmap, Location, compute_neighbor_masks, generate_random_costmap, EasyGIFWriter
+from algorithms.terrain import inflate_obstacles, obstacle_distance, paint_costs
+from algorithms.tiled_costmap import TiledCostmap, DirectoryTileStore
 from algorithms.utils import Items
 
 
@@ -71,8 +79,257 @@ def test_get_open_neighbors():
     assert set(open_neighbors) == expected_open_neighbors
 
 
+def test_neighbor_index():
+    np.random.seed(11)
+    random.seed(11)
+    costmap = generate_random_costmap(12, 15, obstacle_percentage=.3)
+    costmap.set_value(Location(7, 5), Items.VISITED)
+    expected = {
+        Location(x, y): costmap.get_open_neighbors(Location(x, y))
+        for y in range(costmap.rows) for x in range(costmap.cols)
+    }
+
+    costmap.build_neighbor_index()
+    for loc, neighbors in expected.items():
+        assert costmap.get_open_neighbors(loc) == neighbors
+
+    # Index follows obstacle edits incrementally
+    for loc in (Location(0, 0), Location(14, 11), Location(6, 6), Location(0, 7)):
+        costmap.set_value(loc, Items.OBSTACLE)
+        assert np.all(costmap.get_neighbor_index() == compute_neighbor_masks(costmap.get_data()))
+        costmap.set_value(loc, Items.OPEN)
+        assert np.all(costmap.get_neighbor_index() == compute_neighbor_masks(costmap.get_data()))
+    costmap.set_robot(Location(3, 3))
+    costmap.set_goal(Location(9, 9))
+    assert np.all(costmap.get_neighbor_index() == compute_neighbor_masks(costmap.get_data()))
+
+
+def test_gif_writer():
+    costmap = Costmap.create_map(rows=6, cols=8)
+    frames = []
+    for x in range(1, 5):
+        costmap.set_value(Location(x, 2), Items.VISITED)
+        frames.append(costmap.draw(show=False))
+
+    with tempfile.TemporaryDirectory() as directory:
+        buffered_path = os.path.join(directory, "buffered.gif")
+        with EasyGIFWriter(buffered_path, scale_factor=3) as gif_writer:
+            for frame in frames[:2]:
+                gif_writer.write(frame)
+        # Frames are not shared between writers
+        with EasyGIFWriter(buffered_path, scale_factor=3, hold_last_frame_time=0) as gif_writer:
+            gif_writer.write(frames[0])
+        assert len(imageio.mimread(buffered_path)) == 1
+
+        streamed_path = os.path.join(directory, "streamed.gif")
+        with EasyGIFWriter(streamed_path, frames_per_second=10, scale_factor=3, streaming=True) as gif_writer:
+            for frame in frames:
+                gif_writer.write(frame)
+
+        written = imageio.mimread(streamed_path)
+        assert len(written) == len(frames)
+        for frame, written_frame in zip(frames, written):
+            expected_frame = frame.repeat(3, axis=0).repeat(3, axis=1)
+            assert np.all(written_frame[..., :3] == expected_frame)
+
+        with Image.open(streamed_path) as gif:
+            gif.seek(0)
+            assert gif.info["duration"] == 100
+            gif.seek(len(frames) - 1)
+            assert gif.info["duration"] == 2000
+            assert gif.info["loop"] == 0
+
+        # Frames with color tables of different sizes keep their own colors
+        np.random.seed(7)
+        frames = []
+        for bits in range(1, 7):
+            palette = np.random.randint(0, 256, (2 ** bits, 3)).astype(np.uint8)
+            frames.append(palette[np.random.randint(0, 2 ** bits, (5, 7))])
+        with EasyGIFWriter(streamed_path, scale_factor=2, streaming=True) as gif_writer:
+            for frame in frames:
+                gif_writer.write(frame)
+        written = imageio.mimread(streamed_path)
+        assert len(written) == len(frames)
+        for frame, written_frame in zip(frames, written):
+            assert np.all(written_frame[..., :3] == frame.repeat(2, axis=0).repeat(2, axis=1))
+
+
+def test_save_load():
+    np.random.seed(19)
+    random.seed(19)
+    costmap = generate_random_costmap(37, 53, obstacle_percentage=.3)
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "map.costmap")
+        costmap.save(file_path)
+
+        loaded = Costmap.load(file_path)
+        assert isinstance(loaded.get_data(), np.memmap)
+        assert (loaded.rows, loaded.cols) == (costmap.rows, costmap.cols)
+        assert loaded.robot == costmap.robot
+        assert loaded.goal == costmap.goal
+        assert np.all(loaded.get_data() == costmap.get_data())
+
+        # Copy-on-write by default: the file keeps the saved grid
+        loaded.set_value(Location(0, 0), Items.VISITED)
+        assert np.all(Costmap.load(file_path, mode="r").get_data() == costmap.get_data())
+
+        shared = Costmap.load(file_path, mode="r+")
+        shared.set_value(Location(1, 0), Items.OBSTACLE)
+        shared.get_data().flush()
+        del shared
+        assert Costmap.load(file_path, mode="r").get_value(Location(1, 0)) == Items.OBSTACLE
+
+        not_a_costmap = os.path.join(directory, "other.bin")
+        with open(not_a_costmap, "wb") as other_file:
+            other_file.write(b"\0" * 128)
+        try:
+            Costmap.load(not_a_costmap)
+            assert False
+        except ValueError:
+            pass
+
+
+def test_tiled_costmap():
+    from algorithms.astar import AStar
+    from algorithms.breadth_first_search import BFS
+    from algorithms.depth_first_search import DFS
+
+    np.random.seed(23)
+    random.seed(23)
+    dense = generate_random_costmap(45, 70, obstacle_percentage=.2)
+    dense.set_robot(Location(3, 4))
+    dense.set_goal(Location(66, 40))
+    # An all-open region that never needs a tile
+    dense.get_data()[16:32, 16:32] = Items.OPEN
+    original = dense.get_data().copy()
+
+    for planner in (BFS, DFS, AStar):
+        dense_costmap = Costmap(dense.rows, dense.cols, dense.robot, dense.goal, original.copy())
+        tiled = TiledCostmap.from_costmap(dense_costmap, tile_size=16, cache_size=4)
+        assert tiled.get_value(Location(20, 20)) == Items.OPEN
+        assert tiled.get_open_neighbors(Location(5, 5)) == dense_costmap.get_open_neighbors(Location(5, 5))
+
+        paths = []
+        for costmap in (dense_costmap, tiled):
+            search = planner(costmap)
+            while True:
+                path = search.step()
+                if path:
+                    break
+            paths.append(path)
+        assert paths[0] == paths[1]
+        assert np.all(tiled.to_costmap().get_data() == dense_costmap.get_data())
+        assert tiled.stats.hits > 0
+        assert tiled.stats.misses > 0
+        assert tiled.stats.evictions > 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        tiled = TiledCostmap.create_map(40, 40, tile_size=8, cache_size=2, store=DirectoryTileStore(directory))
+        tiled.set_value(Location(10, 10), Items.OBSTACLE)
+        tiled.set_value(Location(-1, 0), Items.OBSTACLE)
+        for x in range(0, 40, 8):
+            tiled.get_value(Location(x, 30))
+        assert tiled.get_value(Location(10, 10)) == Items.OBSTACLE
+        assert tiled.get_value(Location(39, 0)) == Items.OBSTACLE
+        # Clearing a tile's last non-open cell drops it from the store
+        tiled.set_value(Location(10, 10), Items.OPEN)
+        tiled.flush()
+        assert sorted(os.listdir(directory)) == ["tile_0_0.npy", "tile_0_4.npy", "tile_4_4.npy"]
+        assert not os.path.exists(os.path.join(directory, "tile_1_1.npy"))
+
+
+def test_cost_layer():
+    costmap = Costmap.create_map(rows=12, cols=15)
+    assert costmap.get_cost_layer() is None
+    try:
+        costmap.set_cost_layer(np.ones((3, 3)))
+        assert False
+    except ValueError:
+        pass
+
+    ys, xs = np.mgrid[0:12, 0:15]
+    version = costmap.version
+    paint_costs(costmap, xs < 5, 3.0)
+    paint_costs(costmap, ys > 8, 1 + xs)
+    costs = costmap.get_cost_layer()
+    assert costmap.version > version
+    assert costs[0, 0] == 3.0 and costs[0, 10] == 1.0 and costs[10, 10] == 11.0
+
+    data = costmap.get_data()
+    data[[2, 6, 6], [7, 3, 12]] = Items.OBSTACLE
+    obstacles = np.argwhere(data == Items.OBSTACLE)
+    expected = np.sqrt(((np.stack([ys, xs], axis=-1)[:, :, None, :] - obstacles) ** 2).sum(axis=-1)).min(axis=-1)
+    assert np.allclose(obstacle_distance(data), expected)
+    limited = obstacle_distance(data, max_distance=2.5)
+    assert np.allclose(limited[expected <= 2.5], expected[expected <= 2.5])
+    assert np.all(np.isinf(limited[expected > 2.5]))
+
+    inflate_obstacles(costmap, robot_radius=1.5, falloff=2, falloff_cost=4)
+    assert np.all(np.isinf(costs[expected <= 1.5]))
+    assert costs[2, 10] == 1 + 4 * (1 - (3 - 1.5) / 2)
+    assert costs[0, 0] == 3.0
+
+    # The exact transform against brute force, including rows and columns without obstacles
+    np.random.seed(29)
+    for shape, percentage in (((9, 31), 0.02), ((31, 9), 0.3), ((1, 12), 0.2), ((20, 20), 0.0)):
+        data = np.where(np.random.rand(*shape) < percentage, Items.OBSTACLE, Items.OPEN)
+        obstacles = np.argwhere(data == Items.OBSTACLE)
+        distances = obstacle_distance(data)
+        if len(obstacles) == 0:
+            assert np.all(np.isinf(distances))
+            continue
+        ys, xs = np.mgrid[0:shape[0], 0:shape[1]]
+        expected = np.sqrt(((np.stack([ys, xs], axis=-1)[:, :, None, :] - obstacles) ** 2).sum(axis=-1)).min(axis=-1)
+        assert np.allclose(distances, expected)
+
+    # The robot and goal stay passable next to a wall
+    costmap = Costmap.create_map(rows=5, cols=5, robot=Location(0, 0), goal=Location(4, 4))
+    costmap.get_data()[3, 4] = Items.OBSTACLE
+    costmap.get_data()[0, 1] = Items.OBSTACLE
+    inflate_obstacles(costmap, robot_radius=1)
+    costs = costmap.get_cost_layer()
+    assert costs[4, 4] == 1 and costs[0, 0] == 1
+    assert np.isinf(costs[3, 3]) and np.isinf(costs[1, 1])
+
+
+def test_version_and_changes():
+    costmap = Costmap.create_map(rows=8, cols=8)
+    costmap.build_neighbor_index()
+    version = costmap.version
+    costmap.set_robot(Location(1, 1))
+    costmap.set_goal(Location(6, 6))
+    assert costmap.version == version + 2
+    assert costmap.changes_since(version) == [Location(1, 1), Location(6, 6)]
+
+    # Search markings leave the version alone
+    version = costmap.version
+    costmap.set_value(Location(3, 3), Items.VISITED)
+    assert costmap.version == version
+    costmap.set_value(Location(3, 3), Items.OBSTACLE)
+    costmap.set_value(Location(-1, 0), Items.OBSTACLE)
+    costmap.set_value(Location(3, 3), Items.OPEN)
+    assert costmap.version == version + 3
+    assert costmap.changes_since(version) == [Location(3, 3), Location(7, 0), Location(3, 3)]
+    assert costmap.changes_since(version + 2) == [Location(3, 3)]
+    assert costmap.changes_since(costmap.version) == []
+
+    with costmap.bulk_edit() as data:
+        data[2:5, 4] = Items.OBSTACLE
+    assert costmap.changes_since(version) is None
+    assert np.all(costmap.get_neighbor_index() == compute_neighbor_masks(costmap.get_data()))
+    version = costmap.version
+    paint_costs(costmap, np.ones((8, 8), dtype=bool), 2.0)
+    assert costmap.changes_since(version) is None
+
+
 if __name__ == '__main__':
     test_creation()
     test_set_values()
     test_set_robot_goal()
     test_get_open_neighbors()
+    test_neighbor_index()
+    test_gif_writer()
+    test_save_load()
+    test_tiled_costmap()
+    test_cost_layer()
+    test_version_and_changes()